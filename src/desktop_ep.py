@@ -6,6 +6,7 @@ import os
 import sys
 import time
 import traceback
+import multiprocessing
 
 
 # --- Logging setup FIRST, before any other imports ---
@@ -14,7 +15,10 @@ _log_path = os.path.join(
   os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else __file__),
     "subconscious_crash.log"
 )
-_debug_log = open(_log_path, "w", buffering=1, encoding="utf-8")
+# Frozen builds re-launch this executable (with --multiprocessing-fork) for
+# the indexer's spawned workers; those must not truncate the parent's log.
+_WORKER = "--multiprocessing-fork" in sys.argv
+_debug_log = open(_log_path, "a" if _WORKER else "w", buffering=1, encoding="utf-8")
 
 def _log(msg):
   """Write to both the console (if available) and the crash log."""
@@ -51,6 +55,9 @@ except Exception:
 
 
 if __name__ == "__main__":
+  # A spawned indexer worker in a frozen build: hand it to multiprocessing,
+  # which runs the worker and exits, before any app start-up.
+  multiprocessing.freeze_support()
   try:
     if "gui" not in sys.argv:
       sys.argv.insert(1, "gui")
@@ -1,7 +1,12 @@
 import os
 import asyncio
+import hashlib
+import inspect
 import logging
+from collections import OrderedDict
 from pydantic_ai import Agent
+from pydantic_ai.models import infer_model
+from pydantic_ai.providers import Provider, infer_provider_class
 from pydantic_ai.tools import DeferredToolRequests
 from pydantic_ai.models.openai import OpenAIChatModel
 from pydantic_ai.providers.ollama import OllamaProvider
@@ -29,7 +34,8 @@ def _tool_approval_required(ctx, tool_def, tool_args) -> bool:
   return bool(approval_config.get(operation, True))
 
 
-# Map provider display names (as stored in settings) to pydantic-ai prefixes and env-var names
+# Map provider display names (as stored in settings) to pydantic-ai prefixes and
+# the env-var read as a fallback when no api_key is stored for a model.
 _PROVIDER_MAP = {
   # Native pydantic-ai providers
   "openai":                           ("openai",      "OPENAI_API_KEY"),
@@ -38,9 +44,8 @@ _PROVIDER_MAP = {
   "groq":                             ("groq",        "GROQ_API_KEY"),
   "mistral":                          ("mistral",     "MISTRAL_API_KEY"),
   "xai":                              ("xai",         "XAI_API_KEY"),
-  # Bedrock credentials are passed directly to BedrockProvider in build_agent,
-  # so no env-var is set here (the stored api_key is a Bedrock bearer token,
-  # not an AWS_ACCESS_KEY_ID).
+  # Bedrock credentials are passed directly to BedrockProvider in build_agent
+  # (the stored api_key is a Bedrock bearer token, not an AWS_ACCESS_KEY_ID).
   "bedrock":                          ("bedrock",     None),
   "cerebras":                         ("cerebras",    "CEREBRAS_API_KEY"),
   "cohere":                           ("cohere",      "CO_API_KEY"),
@@ -84,31 +89,96 @@ def _provider_env_var(provider: str) -> Optional[str]:
   return _PROVIDER_MAP.get(provider.lower(), (None, None))[1]
 
 
+# Model-config fields that authenticate the provider. Their digest is part of
+# the model cache key so a changed key never reuses a stale client.
+_CREDENTIAL_FIELDS = ("api_key", "aws_access_key_id", "aws_secret_access_key", "aws_session_token")
+
+
+def _credential_fingerprint(model_cfg: dict) -> str:
+  """Short, non-reversible digest of a model config's credentials."""
+  raw = "\0".join((model_cfg.get(f) or "").strip() for f in _CREDENTIAL_FIELDS)
+  return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def _build_provider(name: str, api_key: Optional[str], base_url: str) -> Provider[Any]:
+  """Instantiate the pydantic-ai provider *name* with explicit credentials.
+
+  Only the keyword arguments the provider class accepts are passed, so
+  OpenAI-compatible providers get the stored ``base_url`` too.
+  """
+  provider_cls = infer_provider_class(name)
+  params = inspect.signature(provider_cls.__init__).parameters
+  kwargs: dict[str, Any] = {}
+  if api_key and "api_key" in params:
+    kwargs["api_key"] = api_key
+  if base_url and "base_url" in params:
+    kwargs["base_url"] = base_url
+  return provider_cls(**kwargs)
+
+
+def _lru_get(cache: OrderedDict, key, factory: Callable[[], Any], size: int) -> Any:
+  """Return ``cache[key]``, building it with *factory* on a miss (LRU-bounded)."""
+  try:
+    cache.move_to_end(key)
+    return cache[key]
+  except KeyError:
+    value = cache[key] = factory()
+    while len(cache) > size:
+      cache.popitem(last=False)
+    return value
+
+
 class AgentManager:
-  """Manages AI agents built from the encrypted model configs."""
+  """Manages AI agents built from the encrypted model configs.
+
+     Model instances (and with them the provider HTTP clients), toolsets and
+     agents are cached so warm chat turns reuse keep-alive connections instead
+     of rebuilding everything. The caches are dropped whenever the stored
+     secrets change.
+  """
+  # LRU bounds. Each cached model owns a provider HTTP client, so keep the
+  # working set small; agents also vary with the system prompt.
+  _MODEL_CACHE_SIZE = 16
+  _AGENT_CACHE_SIZE = 32
 
   def __init__(self, config: Config):
     self.config = config
+    self._models: OrderedDict = OrderedDict()
+    self._toolsets: OrderedDict = OrderedDict()
+    self._agents: OrderedDict = OrderedDict()
+    if config is not None:
+      # Stored credentials changed (Settings → Models, or data.enc replaced).
+      config.add_keyring_listener(self.invalidate)
+
+  def invalidate(self) -> None:
+    """Drop every cached model, toolset and agent. Runs whenever the keyring changes."""
+    self._models.clear()
+    self._toolsets.clear()
+    self._agents.clear()
+    logger.debug("Agent caches invalidated")
 
   # ------------------------------------------------------------------
   # Public helpers
   # ------------------------------------------------------------------
 
-  def set_env_for_model(self, model_cfg: dict) -> None:
+  @staticmethod
+  def resolve_api_key(model_cfg: dict) -> Optional[str]:
     """
-    Given one model-config dict (as stored in secrets["models"]),
-    set the appropriate environment variable so pydantic-ai can authenticate.
-    model_cfg keys: provider, model, api_key, (optional) system_prompt
+    Return the API key for one model-config dict (as stored in secrets["models"]):
+    the stored ``api_key``, else the provider's env-var if the user exported one.
+
+    The key is handed straight to the provider object; process environment is
+    never written, so concurrent turns with different keys cannot interfere.
     """
     provider = (model_cfg.get("provider") or "").strip()
-    api_key  = (model_cfg.get("api_key")  or "").strip()
-    env_var  = _provider_env_var(provider)
-
-    if env_var and api_key:
-      os.environ[env_var] = api_key
-      logger.debug(f"Set {env_var} for provider '{provider}'")
-    elif not api_key:
+    api_key = (model_cfg.get("api_key") or "").strip()
+    if api_key:
+      return api_key
+    env_var = _provider_env_var(provider)
+    api_key = (os.environ.get(env_var) or "").strip() if env_var else ""
+    if not api_key:
       logger.warning(f"No api_key stored for provider '{provider}' (model id={model_cfg.get('id')})")
+    return api_key or None
 
   def build_agent(
     self,
@@ -117,8 +187,8 @@ class AgentManager:
     ambient_context: Optional[str] = None,
   ) -> Agent:
     """
-    Construct a pydantic-ai Agent from a stored model config dict.
-    Ensures the matching env-var is set first.
+    Construct a pydantic-ai Agent from a stored model config dict, reusing
+    cached model instances, toolsets and agents where the inputs match.
 
     Args:
       model_cfg:       Provider/model/key dict as stored in secrets["models"].
@@ -131,8 +201,6 @@ class AgentManager:
                        None or empty the prompt is left unchanged. A valid Agent
                        is always returned regardless of this value.
     """
-    self.set_env_for_model(model_cfg)
-
     provider = (model_cfg.get("provider") or "").strip()
     raw_model = (model_cfg.get("model") or "").strip()
     system_prompt = (model_cfg.get("system_prompt") or "You are a helpful assistant.").strip()
@@ -140,6 +208,9 @@ class AgentManager:
       system_prompt = f"{system_prompt}\n\n{ambient_context}"
     base_url = (model_cfg.get("base_url") or "").strip()
 
+    if provider.lower() == "subconscious" and raw_model == "echo":
+      return EchoProvider()
+
     prefix = _provider_prefix(provider)
 
     # Build fully-qualified model string, e.g. "openai:gpt-4o"
@@ -152,38 +223,77 @@ class AgentManager:
 
     logger.debug(f"Building agent with model: {full_model_str}, tools: {len(tools or [])} attached")
 
+    model_key = (
+      provider.lower(), full_model_str, base_url,
+      (model_cfg.get("region") or "").strip(), _credential_fingerprint(model_cfg),
+    )
+    model_instance = _lru_get(
+      self._models, model_key,
+      lambda: self._build_model(provider, raw_model, full_model_str, base_url, model_cfg),
+      self._MODEL_CACHE_SIZE,
+    )
+
+    if tools:
+      # Gate tool calls for human-in-the-loop approval. Toolsets are shared by
+      # every agent built from the same set of enabled tools.
+      tools_key = frozenset(tools)
+      toolset = _lru_get(
+        self._toolsets, tools_key,
+        lambda: ApprovalRequiredToolset(
+          wrapped=FunctionToolset(tools),
+          approval_required_func=_tool_approval_required,
+        ),
+        self._AGENT_CACHE_SIZE,
+      )
+
+      def _tool_agent() -> Agent:
+        agent_kwargs: Any = dict(
+          model=model_instance,
+          system_prompt=system_prompt,
+          toolsets=[toolset],
+          deps_type=EngineContext,
+          output_type=[str, DeferredToolRequests],
+        )
+        return cast(Agent, Agent(**agent_kwargs))
+
+      return _lru_get(
+        self._agents, (model_key, system_prompt, tools_key), _tool_agent, self._AGENT_CACHE_SIZE
+      )
+
+    return _lru_get(
+      self._agents, (model_key, system_prompt, None),
+      lambda: Agent(model=model_instance, system_prompt=system_prompt),
+      self._AGENT_CACHE_SIZE,
+    )
+
+  def _build_model(
+    self,
+    provider: str,
+    raw_model: str,
+    full_model_str: str,
+    base_url: str,
+    model_cfg: dict,
+  ) -> Any:
+    """Construct the model instance (and its provider/HTTP client) for a config."""
     # For Ollama, use OpenAIChatModel with OllamaProvider to allow a custom base_url
-    model_instance: Any = full_model_str
     if provider.lower() in ["ollama", "lm studio", "custom"]:
       custom_base_url = (base_url or custom_endpoints(provider.lower())).rstrip("/")
       if not custom_base_url.endswith("/v1"):
         custom_base_url += "/v1"
-      model_instance = OpenAIChatModel(raw_model, provider=OllamaProvider(base_url=custom_base_url))
       logger.debug(f"Custom base_url: {custom_base_url}")
-    elif provider.lower() == "bedrock":
+      api_key = (model_cfg.get("api_key") or "").strip() or None
+      return OpenAIChatModel(
+        raw_model, provider=OllamaProvider(base_url=custom_base_url, api_key=api_key)
+      )
+    if provider.lower() == "bedrock":
       # Use BedrockConverseModel with an explicit BedrockProvider so the stored
       # credentials/region are passed directly rather than relying solely on the
       # ambient AWS credential chain.
-      model_instance = self._build_bedrock_model(raw_model, model_cfg)
-    elif provider.lower() == "subconscious" and raw_model == "echo":
-      return EchoProvider()
-
-    if tools:
-      # Gate tool calls for human-in-the-loop approval. The tools are wrapped
-      toolset = ApprovalRequiredToolset(
-        wrapped=FunctionToolset(tools),
-        approval_required_func=_tool_approval_required,
-      )
-      agent_kwargs: Any = dict(
-        model=model_instance,
-        system_prompt=system_prompt,
-        toolsets=[toolset],
-        deps_type=EngineContext,
-        output_type=[str, DeferredToolRequests],
-      )
-      return cast(Agent, Agent(**agent_kwargs))
-
-    return Agent(model=model_instance, system_prompt=system_prompt)  # type: ignore[return-value]
+      return self._build_bedrock_model(raw_model, model_cfg)
+    api_key = self.resolve_api_key(model_cfg)
+    return infer_model(
+      full_model_str, provider_factory=lambda name: _build_provider(name, api_key, base_url)
+    )
 
   @staticmethod
   def _bedrock_region(model_name: str, model_cfg: dict) -> Optional[str]:
@@ -239,8 +349,7 @@ class AgentManager:
 
   def get_best_model_cfg(self) -> Optional[dict]:
     """Return the first usable model config from encrypted storage, or None."""
-    self.config.read_keyring()
-    secrets = self.config.secrets or {}
+    secrets = self.config.cached_secrets() or {}
     models = secrets.get("models", {})
     for model_id, cfg in models.items():
       if cfg.get("model") and cfg.get("provider"):
@@ -253,15 +362,13 @@ class AgentManager:
         Includes the api_key — callers that expose these over the wire must
         strip it (see the /models API endpoint).
     """
-    self.config.read_keyring()
-    secrets = self.config.secrets or {}
+    secrets = self.config.cached_secrets() or {}
     models = secrets.get("models", {})
     return [{"id": model_id, **cfg} for model_id, cfg in models.items()]
 
   def get_model_cfg(self, model_id: str) -> Optional[dict]:
     """Return the stored config for *model_id* (``id`` + fields), or None if unknown."""
-    self.config.read_keyring()
-    secrets = self.config.secrets or {}
+    secrets = self.config.cached_secrets() or {}
     cfg = (secrets.get("models") or {}).get(model_id)
     return {"id": model_id, **cfg} if cfg else None
 
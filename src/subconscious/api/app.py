@@ -5,18 +5,25 @@
 """
 from __future__ import annotations
 
+import uuid
 import asyncio
+import contextlib
 import logging
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Optional, AsyncIterator, TYPE_CHECKING
-from fastapi import FastAPI, Depends, HTTPException, Header, WebSocket, WebSocketDisconnect, status
+from typing import Optional, AsyncIterator, Awaitable, Callable, TYPE_CHECKING
+from fastapi import FastAPI, Depends, HTTPException, Header, Query, WebSocket, WebSocketDisconnect, status
 
 from ..constants import VERSION
 from ..db.models import Workspace, Thread, Message
+from ..stream_events import (
+  TextDelta, ApprovalRequest, ApprovalResolved, coalesce_deltas,
+  DEFAULT_FLUSH_MS, DEFAULT_FLUSH_BYTES,
+)
 from .schemas import (
   ThreadDTO,
   MessageDTO,
+  SearchHitDTO,
   WorkspaceDTO,
   HealthResponse,
   ModelConfigDTO,
@@ -32,6 +39,48 @@ if TYPE_CHECKING:
 API_PREFIX = "/api/v1"
 logger = logging.getLogger("subconscious")
 
+# Chat turns one WebSocket connection may stream at once; further chat.send
+# frames wait for a free slot rather than being rejected.
+WS_MAX_CONCURRENT_CHATS = 8
+
+# Seconds a closing connection waits for its cancelled chat turns to save
+# their partial replies.
+_WS_CLOSE_GRACE = 5.0
+
+# Bounds for the per-connection chat.delta coalescing window a client may
+# request with ?flush_ms=&flush_bytes= (flush_ms=0 sends every delta as-is).
+_MAX_FLUSH_MS = 1000.0
+_MAX_FLUSH_BYTES = 65536
+
+
+def _delta_flush_settings(params) -> tuple[float, int]:
+  """ Resolve a connection's (flush_ms, flush_bytes) from its query params. """
+  def _num(key: str, default, cast, hi):
+    try:
+      return min(max(cast(params.get(key, default)), 0), hi)
+    except (TypeError, ValueError):
+      return default
+  flush_ms = _num("flush_ms", DEFAULT_FLUSH_MS, float, _MAX_FLUSH_MS)
+  flush_bytes = max(1, _num("flush_bytes", DEFAULT_FLUSH_BYTES, int, _MAX_FLUSH_BYTES))
+  return flush_ms, flush_bytes
+
+
+def _subscription_filters(params) -> dict:
+  """ EventBus subscription filters from query params or a `subscribe` frame.
+
+      ``types`` is a list or a comma-separated string of event types / ``prefix.*``
+      topics; ``workspace_uuid`` and ``thread_uuid`` scope events to one
+      workspace or thread. Missing keys mean "no filter".
+  """
+  types = params.get("types")
+  if isinstance(types, str):
+    types = [t for t in types.split(",") if t.strip()]
+  return {
+    "types": list(types) if types else None,
+    "workspace_uuid": params.get("workspace_uuid") or None,
+    "thread_uuid": params.get("thread_uuid") or None,
+  }
+
 # Keep these in sync with the formats configured in cli/__init__.py so the
 # uvicorn/FastAPI logs read identically to the rest of the application.
 _DEV_LOG_FORMAT = "[%(levelname)s|%(asctime)s.%(msecs)04d|%(filename)s|%(lineno)d] %(message)s"
@@ -102,6 +151,16 @@ def create_app(engine: Engine, token: str) -> FastAPI:
     async with engine.db.get_session() as session:
       yield session
 
+  async def get_write_db() -> AsyncIterator[AsyncSession]:
+    """ Like :func:`get_db` but on the engine's single writer connection.
+
+        Use for endpoints that commit. The session holds the writer turn for
+        the whole request, so such endpoints must not call engine methods that
+        write themselves.
+    """
+    async with engine.db.write_session() as session:
+      yield session
+
   ###############################################################
   # Helpers
   ###############################################################
@@ -176,6 +235,22 @@ def create_app(engine: Engine, token: str) -> FastAPI:
       for t in rows
     ]
 
+  @app.get(
+    f"{API_PREFIX}/workspaces/{{workspace_uuid}}/search",
+    response_model=list[SearchHitDTO], dependencies=[Depends(require_token)],
+  )
+  async def search_workspace(
+    workspace_uuid: str,
+    q: str = Query(..., min_length=1),
+    limit: int = Query(8, ge=1, le=100),
+    neighbours: int = Query(0, ge=0, le=5),
+    session: AsyncSession = Depends(get_db),
+  ) -> list[SearchHitDTO]:
+    """ Search the workspace's indexed files """
+    ws = await _workspace_by_uuid(session, workspace_uuid)
+    hits = await engine.search_workspace(ws.id, q, limit=limit, neighbours=neighbours)
+    return [SearchHitDTO(**hit.to_dict()) for hit in hits]
+
   @app.post(f"{API_PREFIX}/threads", response_model=ThreadDTO, dependencies=[Depends(require_token)])
   async def create_thread(req: CreateThreadRequest, session: AsyncSession = Depends(get_db)) -> ThreadDTO:
     """ Create thread """
@@ -186,12 +261,13 @@ def create_app(engine: Engine, token: str) -> FastAPI:
     )
 
     if req.title or req.description:
-      th = await session.get(Thread, thread.id)
-      if req.title:
-        th.title = req.title
-      if req.description:
-        th.description = req.description
-      await session.commit()
+      async with engine.db.write_session() as wsession:
+        th = await wsession.get(Thread, thread.id)
+        if req.title:
+          th.title = req.title
+        if req.description:
+          th.description = req.description
+        await wsession.commit()
 
     return ThreadDTO(
       created_at=thread.created_at, updated_at=thread.updated_at,
@@ -200,7 +276,7 @@ def create_app(engine: Engine, token: str) -> FastAPI:
     )
 
   @app.patch(f"{API_PREFIX}/threads/{{thread_uuid}}", response_model=ThreadDTO, dependencies=[Depends(require_token)])
-  async def update_thread(thread_uuid: str, req: UpdateThreadRequest, session: AsyncSession = Depends(get_db)) -> ThreadDTO:
+  async def update_thread(thread_uuid: str, req: UpdateThreadRequest, session: AsyncSession = Depends(get_write_db)) -> ThreadDTO:
     """ Update thread """
     th = await _thread_by_uuid(session, thread_uuid)
     if req.title is not None:
@@ -242,20 +318,85 @@ def create_app(engine: Engine, token: str) -> FastAPI:
       await ws.close(code=status.WS_1008_POLICY_VIOLATION)
       return
     await ws.accept()
-    queue = engine.events.subscribe()
+    queue = engine.events.subscribe(**_subscription_filters(ws.query_params))
+    flush_ms, flush_bytes = _delta_flush_settings(ws.query_params)
+
+    # Several tasks write to this socket at once (event pump + every running
+    # chat), so frames are serialised through one lock.
+    send_lock = asyncio.Lock()
+
+    async def send(frame: dict) -> None:
+      async with send_lock:
+        await ws.send_json({"v": 1, **frame})
+
+    # In-flight chat turns keyed by the client's correlation id. At most
+    # WS_MAX_CONCURRENT_CHATS stream at once; extra turns wait for a slot.
+    chats: dict[str, asyncio.Task] = {}
+    chat_slots = asyncio.Semaphore(WS_MAX_CONCURRENT_CHATS)
+    # Tool calls awaiting approval that were raised by this connection's
+    # chats; `approval.resolve` may only settle these.
+    approvals: set[str] = set()
+
+    async def run_chat(corr: str, frame: dict) -> None:
+      started = False
+      try:
+        async with chat_slots:
+          started = True
+          await _handle_chat_send(
+            send, engine, frame, flush_ms=flush_ms, flush_bytes=flush_bytes, approvals=approvals,
+          )
+      except asyncio.CancelledError:
+        # A turn cancelled while still queued never reached the handler.
+        if not started:
+          with contextlib.suppress(Exception):
+            await send({"type": "chat.done", "id": corr, "data": {"cancelled": True}})
+      finally:
+        chats.pop(corr, None)
+
+    # Reconnecting clients pass the last `seq` they saw and get only the gap,
+    # or an `events.resync` frame when the gap can't be filled. The live queue
+    # was subscribed first, so anything it shares with the replay is skipped.
+    replayed_to = 0
+    since = ws.query_params.get("since")
+    if since is not None and since.lstrip("-").isdigit():
+      missed = await engine.events.replay(int(since), queue)
+      if missed is None:
+        await send({"type": "events.resync", "data": {"seq": engine.events.last_seq}})
+      else:
+        for event in missed:
+          await send(event)
+        replayed_to = missed[-1]["seq"] if missed else int(since)
 
     async def pump_events() -> None:
       """Forward engine events to this client."""
       while True:
         event = await queue.get()
-        await ws.send_json({"v": 1, **event})
+        if event.get("seq", 0) > replayed_to:
+          await send(event)
 
     async def pump_commands() -> None:
-      """Handle commands sent by the client."""
+      """Handle commands sent by the client. Never blocks on a running chat."""
       while True:
         frame = await ws.receive_json()
-        if frame.get("type") == "chat.send":
-          await _handle_chat_send(ws, engine, frame)
+        kind = frame.get("type")
+        if kind == "chat.send":
+          corr = frame.get("id") or uuid.uuid4().hex
+          if corr in chats:
+            await send({"type": "chat.error", "id": corr, "data": {"error": "a chat with this id is already running"}})
+            continue
+          chats[corr] = asyncio.create_task(run_chat(corr, {**frame, "id": corr}))
+        elif kind == "chat.cancel":
+          task = chats.get(frame.get("id"))
+          if task is not None:
+            task.cancel()
+        elif kind == "subscribe":
+          engine.events.update_subscription(queue, **_subscription_filters(frame.get("data") or {}))
+          await send({"type": "subscribed", "id": frame.get("id"), "data": _subscription_filters(frame.get("data") or {})})
+        elif kind == "approval.resolve":
+          data = frame.get("data", {})
+          if data.get("tool_call_id") in approvals:
+            approvals.discard(data["tool_call_id"])
+            engine.resolve_approval(data["tool_call_id"], bool(data.get("approved")))
 
     pump_task = asyncio.create_task(pump_events())
     cmd_task = asyncio.create_task(pump_commands())
@@ -265,41 +406,69 @@ def create_app(engine: Engine, token: str) -> FastAPI:
       pass
     finally:
       engine.events.unsubscribe(queue)
-      for t in (pump_task, cmd_task):
+      running = [pump_task, cmd_task, *chats.values()]
+      for t in running:
         t.cancel()
+      # Let cancelled turns finish saving their partial replies, even when
+      # the handler itself is being cancelled (e.g. server shutdown).
+      settled = asyncio.ensure_future(asyncio.wait(running, timeout=_WS_CLOSE_GRACE))
+      interrupted: Optional[asyncio.CancelledError] = None
+      while not settled.done():
+        try:
+          await asyncio.shield(settled)
+        except asyncio.CancelledError as exc:
+          interrupted = exc
+      if interrupted is not None:
+        raise interrupted
 
   return app
 
 
-async def _handle_chat_send(ws: WebSocket, engine: Engine, frame: dict) -> None:
+async def _handle_chat_send(
+  send: Callable[[dict], Awaitable[None]],
+  engine: Engine,
+  frame: dict,
+  *,
+  flush_ms: float = DEFAULT_FLUSH_MS,
+  flush_bytes: int = DEFAULT_FLUSH_BYTES,
+  approvals: Optional[set[str]] = None,
+) -> None:
   """ Persist the user message, stream the assistant reply as `chat.delta` frames,
       persist the assistant message, then emit `chat.done`. The `message.created`
       events for both messages are published by engine.save_message and reach all
-      connected clients (including this one) via the event pump.
+      connected clients (including this one) via the event pump. Deltas are
+      coalesced per the connection's *flush_ms* / *flush_bytes* window.
+
+      With ``"auto_approve": false`` in the frame data, approval-gated tool
+      calls surface as `approval.request` frames and the turn waits for a
+      matching `approval.resolve`; their ids are added to *approvals*, the
+      set a connection checks before resolving. A `chat.cancel` ends the turn
+      early: the partial reply is kept and `chat.done` carries
+      ``"cancelled": true``.
   """
   corr = frame.get("id")
   data = frame.get("data", {})
   thread_uuid = data.get("thread_uuid")
   content = (data.get("content") or "").strip()
-  # Optional model config selection. When omitted, stream_chat falls back to the
+  # Optional model config selection. When omitted, stream_chat_events falls back to the
   # engine's best/default model. A supplied-but-unknown id is an error.
   model_id = data.get("model_id")
   if not thread_uuid or not content:
-    await ws.send_json({"v": 1, "type": "chat.error", "id": corr, "data": {"error": "thread_uuid and content required"}})
+    await send({"type": "chat.error", "id": corr, "data": {"error": "thread_uuid and content required"}})
     return
 
   model_cfg = None
   if model_id:
     model_cfg = engine.agent_manager.get_model_cfg(model_id)
     if model_cfg is None:
-      await ws.send_json({"v": 1, "type": "chat.error", "id": corr, "data": {"error": f"unknown model_id: {model_id}"}})
+      await send({"type": "chat.error", "id": corr, "data": {"error": f"unknown model_id: {model_id}"}})
       return
 
   # Resolve uuids → local ids
   async with engine.db.get_session() as session:
     th = await session.scalar(select(Thread).where(Thread.uuid == thread_uuid))
     if not th:
-      await ws.send_json({"v": 1, "type": "chat.error", "id": corr, "data": {"error": "thread not found"}})
+      await send({"type": "chat.error", "id": corr, "data": {"error": "thread not found"}})
       return
     thread_id, workspace_id = th.id, th.workspace_id
 
@@ -307,17 +476,40 @@ async def _handle_chat_send(ws: WebSocket, engine: Engine, frame: dict) -> None:
 
   reply_parts: list[str] = []
   try:
-    async for chunk in engine.stream_chat(
+    events = engine.stream_chat_events(
       content, thread_id, workspace_id=workspace_id, model_cfg=model_cfg,
-    ):
-      reply_parts.append(chunk)
-      await ws.send_json({"v": 1, "type": "chat.delta", "id": corr, "data": {"delta": chunk}})
+      auto_approve=None if data.get("auto_approve") is False else True,
+    )
+    async for event in coalesce_deltas(events, flush_ms=flush_ms, flush_bytes=flush_bytes):
+      if isinstance(event, TextDelta):
+        reply_parts.append(event.content)
+        await send({"type": "chat.delta", "id": corr, "data": {"delta": event.content}})
+      elif isinstance(event, ApprovalRequest):
+        if approvals is not None:
+          approvals.add(event.tool_call_id)
+        await send({"type": "approval.request", "id": corr, "data": {
+          "tool_call_id": event.tool_call_id, "tool_name": event.tool_name,
+          "args": event.args, "operation": event.operation,
+        }})
+      elif isinstance(event, ApprovalResolved):
+        if approvals is not None:
+          approvals.discard(event.tool_call_id)
+        await send({"type": "approval.resolved", "id": corr, "data": {
+          "tool_call_id": event.tool_call_id, "approved": event.approved,
+        }})
+  except asyncio.CancelledError:
+    partial = "".join(reply_parts)
+    if partial:
+      await engine.save_message(thread_id, "agent", partial)
+    with contextlib.suppress(Exception):  # the socket may already be gone
+      await send({"type": "chat.done", "id": corr, "data": {"cancelled": True}})
+    raise
   except Exception as exc:  # surface model/config errors to the client
     logger.exception("chat.send stream failed")
-    await ws.send_json({"v": 1, "type": "chat.error", "id": corr, "data": {"error": str(exc)}})
+    await send({"type": "chat.error", "id": corr, "data": {"error": str(exc)}})
     return
 
   full = "".join(reply_parts)
   if full:
     await engine.save_message(thread_id, "agent", full)
-  await ws.send_json({"v": 1, "type": "chat.done", "id": corr, "data": {}})
+  await send({"type": "chat.done", "id": corr, "data": {}})
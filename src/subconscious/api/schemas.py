@@ -33,6 +33,24 @@ class MessageDTO(BaseModel):
   created_at: Optional[datetime] = None
 
 
+class SearchHitDTO(BaseModel):
+  """ One workspace search result; lines are 1-based and inclusive. """
+  path: str
+  ordinal: int
+  start_line: Optional[int] = None
+  end_line: Optional[int] = None
+  match_start_line: Optional[int] = None
+  match_end_line: Optional[int] = None
+  score: float
+  bm25: Optional[float] = None
+  cosine: Optional[float] = None
+  snippet: str
+  content: str
+  context: Optional[str] = None
+  context_start_line: Optional[int] = None
+  context_end_line: Optional[int] = None
+
+
 class CreateThreadRequest(BaseModel):
   workspace_uuid: str
   title: Optional[str] = None
@@ -1,12 +1,15 @@
 import os
 import sys
+import copy
 import uuid
 import yaml
 import json
 import logging
 import pathlib
 import keyring
-from typing import Optional
+import tempfile
+import threading
+from typing import Callable, Optional
 from cryptography.fernet import Fernet
 from dataclasses import dataclass, field
 
@@ -37,6 +40,16 @@ LOGO = """
 ⠀⠀⠀⠀⠀⠈⠿⣿⡿⠿⠿⢷⣿⣿⣿⣿⣶⠿⠟⠋⠁⠀⠀⠀⠀⠀⠀⠀⠀⠀
 """
 
+def _default_secrets() -> dict:
+  """ Secrets layout used before anything has been written """
+  return {
+    "models": {},
+    "tools": {},
+    "mcp": {},
+    "_thread_tools": {}
+  }
+
+
 def get_default_data_dir() -> pathlib.Path:
   """ Returns the default data directory based on the OS. """
   if sys.platform == "win32":
@@ -61,6 +74,13 @@ class Config:
   secrets: Optional[dict] = None
   data_dir: pathlib.Path = field(default_factory=get_default_data_dir)
 
+  # Decrypted data.enc, shared by readers and refreshed only when the file's
+  # (mtime, inode, size) signature changes or write_keyring replaces it.
+  _secrets_cache: Optional[dict] = field(default=None, init=False, repr=False, compare=False)
+  _secrets_sig: Optional[tuple] = field(default=None, init=False, repr=False, compare=False)
+  _secrets_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+  _keyring_listeners: list = field(default_factory=list, init=False, repr=False, compare=False)
+
   def __post_init__(self):
     if self.dev:
       self.data_dir = get_default_data_dir()
@@ -98,30 +118,89 @@ class Config:
     """Returns the path to the SQLite database."""
     return f"sqlite+aiosqlite:///{self.data_dir / 'subconscious.db'}"
   
+  @property
+  def keyring_path(self) -> pathlib.Path:
+    """Returns the path to the encrypted secrets file."""
+    return pathlib.Path(self.data_dir) / "data.enc"
+
+  def add_keyring_listener(self, callback: Callable[[], None]) -> None:
+    """ Call *callback* whenever the stored secrets change (written here or on disk) """
+    self._keyring_listeners.append(callback)
+
+  def remove_keyring_listener(self, callback: Callable[[], None]) -> None:
+    if callback in self._keyring_listeners:
+      self._keyring_listeners.remove(callback)
+
   async def write_keyring(self) -> None:
-    """ Update the keyring with the new secrets """
+    """ Update the keyring with the new secrets
+
+        The file is replaced atomically (temp file + rename) so a concurrent
+        reader sees either the old or the new secrets, never a partial write.
+    """
     encrypted = CIPHER.encrypt(json.dumps(self.secrets).encode())
-    with open(f'{self.data_dir}/data.enc', 'wb') as f:
-      f.write(encrypted)
+    path = self.keyring_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".data.enc.", suffix=".tmp")
+    try:
+      with os.fdopen(fd, 'wb') as f:
+        f.write(encrypted)
+        f.flush()
+        os.fsync(f.fileno())
+      os.replace(tmp, path)
+    except BaseException:
+      if os.path.exists(tmp):
+        os.unlink(tmp)
+      raise
+    with self._secrets_lock:
+      self._secrets_cache = copy.deepcopy(self.secrets)
+      self._secrets_sig = self._keyring_signature()
+    self._notify_keyring_listeners()
 
   def read_keyring(self) -> None:
-    """ Read the keyring for the secrets """
-    # Check if the keyring file exists
-    if os.path.exists(f'{self.data_dir}/data.enc'):
-      with open(f'{self.data_dir}/data.enc', 'rb') as f:
-        encrypted = f.read()
-        decrypted = CIPHER.decrypt(encrypted).decode()
-    # Else set to none
-    else:
-      decrypted = None
-
-    # Return the decrypted settings or default values
-    self.secrets = json.loads(decrypted) if decrypted else {
-      "models": {},
-      "tools": {},
-      "mcp": {},
-      "_thread_tools": {}
-    }
+    """ Read the keyring for the secrets
+
+        ``self.secrets`` becomes a private copy the caller may edit and write
+        back; the decryption itself is served from the cache.
+    """
+    self.secrets = copy.deepcopy(self.cached_secrets())
+
+  def cached_secrets(self) -> dict:
+    """ Return the decrypted secrets without copying — treat as read-only
+
+        data.enc is only re-read (and decrypted) when its signature changed
+        since the last read, so hot paths can call this on every request.
+    """
+    changed = False
+    with self._secrets_lock:
+      sig = self._keyring_signature()
+      if self._secrets_cache is None or sig != self._secrets_sig:
+        changed = self._secrets_cache is not None
+        if sig is None:
+          self._secrets_cache = _default_secrets()
+        else:
+          decrypted = CIPHER.decrypt(self.keyring_path.read_bytes()).decode()
+          self._secrets_cache = json.loads(decrypted) if decrypted else _default_secrets()
+        self._secrets_sig = sig
+      secrets = self._secrets_cache
+    if changed:
+      logger.debug("Keyring changed on disk; secrets reloaded")
+      self._notify_keyring_listeners()
+    return secrets
+
+  def _keyring_signature(self) -> Optional[tuple]:
+    """ (mtime, inode, size) of data.enc, or None when it doesn't exist """
+    try:
+      st = os.stat(self.keyring_path)
+    except FileNotFoundError:
+      return None
+    return (st.st_mtime_ns, st.st_ino, st.st_size)
+
+  def _notify_keyring_listeners(self) -> None:
+    for callback in list(self._keyring_listeners):
+      try:
+        callback()
+      except Exception as exc:
+        logger.warning(f"Keyring listener failed: {exc}")
 
 
 def log_config(config: Config):
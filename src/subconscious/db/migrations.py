@@ -0,0 +1,260 @@
+""" Versioned schema migrations.
+
+    The schema version lives in SQLite's ``PRAGMA user_version`` header field,
+    so an up-to-date database starts with a single integer read and no table
+    probes. Each entry in ``MIGRATIONS`` upgrades the schema by one version and
+    is followed by the version bump on the same connection, so a crash
+    mid-upgrade resumes from the last completed step. The sqlite3 driver
+    autocommits DDL, so every step must be idempotent (``IF NOT EXISTS``,
+    column probes) and safe to re-run.
+
+    To change the schema: append a new ``async def _mNNN_<name>(conn)`` step to
+    ``MIGRATIONS``. Never edit or reorder a step that has shipped.
+"""
+from __future__ import annotations
+
+import uuid
+import logging
+from typing import Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from .models import Base, DOCUMENT_CHUNKS_FTS_DDL, fts5_available
+
+
+logger = logging.getLogger("subconscious")
+
+# Rows per executemany batch for data backfills.
+_BACKFILL_BATCH = 10_000
+
+
+async def _columns(conn: AsyncConnection, table: str) -> set[str]:
+  result = await conn.execute(text(f"PRAGMA table_info({table})"))
+  return {row[1] for row in result.fetchall()}
+
+
+async def _add_missing_columns(conn: AsyncConnection, table: str, columns: dict[str, str]) -> None:
+  """ ``ALTER TABLE ADD COLUMN`` for every *columns* entry not yet present. """
+  existing = await _columns(conn, table)
+  for name, ddl_type in columns.items():
+    if name not in existing:
+      await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl_type}"))
+
+
+async def _m001_baseline(conn: AsyncConnection) -> None:
+  """ Create every table, then add the columns that pre-versioning releases
+      introduced with ad-hoc ``ALTER``s (no-ops on a freshly created DB).
+  """
+  await conn.run_sync(Base.metadata.create_all)
+  await _add_missing_columns(conn, "threads", {
+    "updated_at": "DATETIME",
+    "default_model_id": "VARCHAR",
+    "tools_config": "TEXT",
+    "skills_config": "TEXT",
+    "approval_config": "TEXT",
+    "uuid": "VARCHAR",
+  })
+  await _add_missing_columns(conn, "messages", {"uuid": "VARCHAR"})
+  await _add_missing_columns(conn, "workspaces", {
+    "tools_config": "TEXT",
+    "skills_config": "TEXT",
+    "directories": "TEXT",
+    "approval_config": "TEXT",
+  })
+
+
+async def _m002_backfill_uuids(conn: AsyncConnection) -> None:
+  """ Backfill UUIDs for rows created before the uuid columns existed.
+
+      SQLite can't generate per-row UUIDs in pure SQL, so they are generated in
+      Python and written back with batched ``executemany`` calls.
+  """
+  for table in ("threads", "messages", "workspaces"):
+    rows = await conn.execute(
+      text(f"SELECT id FROM {table} WHERE uuid IS NULL OR uuid = ''")
+    )
+    ids = [row_id for (row_id,) in rows.fetchall()]
+    stmt = text(f"UPDATE {table} SET uuid = :u WHERE id = :id")
+    for start in range(0, len(ids), _BACKFILL_BATCH):
+      batch = ids[start:start + _BACKFILL_BATCH]
+      await conn.execute(stmt, [{"u": str(uuid.uuid4()), "id": row_id} for row_id in batch])
+    if ids:
+      logger.info(f"Backfilled {len(ids)} {table} UUIDs")
+
+
+async def _m003_hot_query_indexes(conn: AsyncConnection) -> None:
+  """ Composite indexes for the hot filter+order queries (thread history,
+      thread lists, settings, memory, todos, notes, contacts, indexing).
+
+      ``app_state`` gets a UNIQUE (tag, key) index, which the
+      ``update_setting`` upsert needs as its conflict target; duplicate tagged
+      rows left by older builds are collapsed to the newest one first.
+  """
+  await conn.execute(text(
+    "DELETE FROM app_state WHERE tag IS NOT NULL AND id NOT IN "
+    "(SELECT MAX(id) FROM app_state WHERE tag IS NOT NULL GROUP BY tag, key)"
+  ))
+  for ddl in (
+    "CREATE INDEX IF NOT EXISTS ix_workspaces_uuid ON workspaces (uuid)",
+    "CREATE INDEX IF NOT EXISTS ix_threads_workspace_updated ON threads (workspace_id, updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_messages_thread_created ON messages (thread_id, created_at, id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_app_state_tag_key ON app_state (tag, key)",
+    "CREATE INDEX IF NOT EXISTS ix_todo_items_workspace_status ON todo_items (workspace_id, status)",
+    "CREATE INDEX IF NOT EXISTS ix_workspace_memory_workspace_key ON workspace_memory (workspace_id, key)",
+    "CREATE INDEX IF NOT EXISTS ix_notes_workspace_updated ON notes (workspace_id, updated_at)",
+    "CREATE INDEX IF NOT EXISTS ix_contacts_workspace_name ON contacts (workspace_id, name)",
+    "CREATE INDEX IF NOT EXISTS ix_indexed_documents_workspace_path ON indexed_documents (workspace_id, path)",
+  ):
+    await conn.execute(text(ddl))
+
+
+async def _m004_thread_summaries(conn: AsyncConnection) -> None:
+  """ Rolling per-thread summaries used for history compaction. """
+  await conn.execute(text(
+    "CREATE TABLE IF NOT EXISTS thread_summaries ("
+    "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, "
+    "thread_id INTEGER NOT NULL UNIQUE REFERENCES threads (id), "
+    "content TEXT NOT NULL, "
+    "until_created_at DATETIME, "
+    "until_message_id INTEGER, "
+    "message_count INTEGER NOT NULL, "
+    "token_estimate INTEGER NOT NULL, "
+    "created_at DATETIME, "
+    "updated_at DATETIME)"
+  ))
+
+
+async def _m005_event_log(conn: AsyncConnection) -> None:
+  """ Persisted EventBus tail for ``?since=`` replay across restarts. """
+  await conn.execute(text(
+    "CREATE TABLE IF NOT EXISTS event_log ("
+    "seq INTEGER NOT NULL PRIMARY KEY, "
+    "type VARCHAR NOT NULL, "
+    "payload TEXT NOT NULL, "
+    "created_at DATETIME)"
+  ))
+
+
+async def _m006_document_inode(conn: AsyncConnection) -> None:
+  """ ``indexed_documents.inode`` for the stat-only unchanged-file check. """
+  await _add_missing_columns(conn, "indexed_documents", {"inode": "INTEGER"})
+
+
+async def _m007_document_chunks_fts(conn: AsyncConnection) -> None:
+  """ FTS5 index over ``document_chunks`` (plus sync triggers), filled from
+      the existing chunks. Skipped when SQLite lacks FTS5; search then falls
+      back to substring matching.
+  """
+  if not await conn.run_sync(fts5_available):
+    logger.warning("SQLite was built without FTS5; workspace search will use substring matching")
+    return
+  for ddl in DOCUMENT_CHUNKS_FTS_DDL:
+    await conn.execute(text(ddl))
+  await conn.execute(text("INSERT INTO document_chunks_fts (document_chunks_fts) VALUES ('rebuild')"))
+
+
+async def _m008_background_jobs(conn: AsyncConnection) -> None:
+  """ Checkpoints of unfinished resumable background jobs. """
+  await conn.execute(text(
+    "CREATE TABLE IF NOT EXISTS background_jobs ("
+    "id VARCHAR NOT NULL PRIMARY KEY, "
+    "type VARCHAR NOT NULL, "
+    "title VARCHAR NOT NULL, "
+    "status VARCHAR NOT NULL, "
+    "params TEXT NOT NULL, "
+    "checkpoint TEXT, "
+    "created_at DATETIME, "
+    "updated_at DATETIME)"
+  ))
+
+
+async def _m009_chunk_embedding_model(conn: AsyncConnection) -> None:
+  """ Record which embedder model produced each chunk vector.
+
+      Vectors stored before this have no known model, so they are cleared and
+      re-embedded by the configured embedder on the next full index run.
+  """
+  if "embedding_model" not in await _columns(conn, "document_chunks"):
+    await conn.execute(text("ALTER TABLE document_chunks ADD COLUMN embedding_model VARCHAR"))
+    await conn.execute(text("UPDATE document_chunks SET embedding = NULL WHERE embedding IS NOT NULL"))
+
+
+async def _m010_unique_document_paths(conn: AsyncConnection) -> None:
+  """ One ``indexed_documents`` row per (workspace, path).
+
+      Duplicates left by a watcher batch racing a full re-index are collapsed
+      to the newest row (with the older rows' chunks), and the index becomes
+      UNIQUE — the conflict target of the indexer's upsert.
+  """
+  stale = (
+    "SELECT id FROM indexed_documents WHERE id NOT IN "
+    "(SELECT MAX(id) FROM indexed_documents GROUP BY workspace_id, path)"
+  )
+  await conn.execute(text(f"DELETE FROM document_chunks WHERE document_id IN ({stale})"))
+  await conn.execute(text(f"DELETE FROM indexed_documents WHERE id IN ({stale})"))
+  await conn.execute(text("DROP INDEX IF EXISTS ix_indexed_documents_workspace_path"))
+  await conn.execute(text(
+    "CREATE UNIQUE INDEX IF NOT EXISTS ux_indexed_documents_workspace_path "
+    "ON indexed_documents (workspace_id, path)"
+  ))
+
+
+
+async def _m011_chunk_ordinal_index(conn: AsyncConnection) -> None:
+  """ ``document_chunks`` (document_id, ordinal) for neighbour expansion,
+      replacing the document_id index it makes redundant.
+  """
+  await conn.execute(text("DROP INDEX IF EXISTS ix_document_chunks_document_id"))
+  await conn.execute(text(
+    "CREATE INDEX IF NOT EXISTS ix_document_chunks_document_ordinal "
+    "ON document_chunks (document_id, ordinal)"
+  ))
+
+
+Migration = Callable[[AsyncConnection], Awaitable[None]]
+
+# Ordered upgrade steps; index i upgrades schema version i → i + 1.
+MIGRATIONS: list[Migration] = [
+  _m001_baseline,
+  _m002_backfill_uuids,
+  _m003_hot_query_indexes,
+  _m004_thread_summaries,
+  _m005_event_log,
+  _m006_document_inode,
+  _m007_document_chunks_fts,
+  _m008_background_jobs,
+  _m009_chunk_embedding_model,
+  _m010_unique_document_paths,
+  _m011_chunk_ordinal_index,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+async def get_schema_version(conn: AsyncConnection) -> int:
+  return int((await conn.execute(text("PRAGMA user_version"))).scalar() or 0)
+
+
+async def migrate(engine: AsyncEngine) -> int:
+  """ Bring the database up to ``SCHEMA_VERSION`` and return the final version.
+
+      A database already at the latest version costs one ``PRAGMA`` read.
+  """
+  async with engine.connect() as conn:
+    version = await get_schema_version(conn)
+  if version >= SCHEMA_VERSION:
+    if version > SCHEMA_VERSION:
+      logger.warning(
+        f"Database schema version {version} is newer than this build ({SCHEMA_VERSION})"
+      )
+    return version
+
+  for target in range(version + 1, SCHEMA_VERSION + 1):
+    step = MIGRATIONS[target - 1]
+    logger.info(f"Migrating database schema to version {target} ({step.__name__})")
+    async with engine.begin() as conn:
+      await step(conn)
+      # PRAGMA doesn't accept bound parameters; target is a trusted int.
+      await conn.execute(text(f"PRAGMA user_version = {int(target)}"))
+  return SCHEMA_VERSION
@@ -4,7 +4,7 @@ import bcrypt
 from datetime import datetime
 from sqlalchemy.ext.hybrid import hybrid_property
 from sqlalchemy.orm import declarative_base, relationship, mapped_column, Mapped
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, UniqueConstraint
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Text, UniqueConstraint, Index, DDL, event, text, LargeBinary
 
 
 Base = declarative_base()
@@ -38,6 +38,9 @@ class Networks(Base):
 
 class Workspace(Base):
   __tablename__ = 'workspaces'
+  __table_args__ = (
+    Index("ix_workspaces_uuid", "uuid"),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   name = Column(String, nullable=False)
@@ -56,6 +59,10 @@ class Workspace(Base):
 
 class Thread(Base):
   __tablename__ = 'threads'
+  __table_args__ = (
+    # list_threads: WHERE workspace_id = ? ORDER BY updated_at DESC
+    Index("ix_threads_workspace_updated", "workspace_id", "updated_at"),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   uuid = Column(String, default=lambda: str(uuid.uuid4()), unique=True)
@@ -75,6 +82,10 @@ class Thread(Base):
 
 class Message(Base):
   __tablename__ = 'messages'
+  __table_args__ = (
+    # Thread history: WHERE thread_id = ? ORDER BY created_at, id
+    Index("ix_messages_thread_created", "thread_id", "created_at", "id"),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   uuid = Column(String, default=lambda: str(uuid.uuid4()), unique=True)
@@ -86,12 +97,38 @@ class Message(Base):
   thread = relationship("Thread", back_populates="messages")
 
 
+class ThreadSummary(Base):
+  """
+  Rolling summary of a thread's older messages, replayed in place of those
+  messages once the thread outgrows the history window. The
+  ``until_created_at`` / ``until_message_id`` pair is the (created_at, id)
+  checkpoint of the newest message folded in, so compaction only ever
+  summarises messages newer than it.
+  """
+  __tablename__ = 'thread_summaries'
+
+  id = Column(Integer, primary_key=True, autoincrement=True)
+  thread_id = Column(Integer, ForeignKey('threads.id'), nullable=False, unique=True)
+  content = Column(Text, nullable=False, default='')
+  until_created_at = Column(DateTime, nullable=True)
+  until_message_id = Column(Integer, nullable=True)
+  message_count = Column(Integer, nullable=False, default=0)  # messages folded in so far
+  token_estimate = Column(Integer, nullable=False, default=0)
+  created_at = Column(DateTime, default=datetime.now)
+  updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+
 class AppState(Base):
   """ Store the state of the application, such as current workspace and thread
       Using a key value format to store arbitrary data
       Store default workspace
   """
   __tablename__ = 'app_state'
+  __table_args__ = (
+    # Settings lookups by (key, tag) and the update_setting upsert target.
+    # tag leads so tag-only scans (load_ui_state) can use it too.
+    Index("ux_app_state_tag_key", "tag", "key", unique=True),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   key = Column(String, nullable=False)
@@ -106,6 +143,9 @@ class TodoItem(Base):
   Priority values: 'low', 'normal', 'high', 'urgent'
   """
   __tablename__ = 'todo_items'
+  __table_args__ = (
+    Index("ix_todo_items_workspace_status", "workspace_id", "status"),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   workspace_id = Column(Integer, ForeignKey('workspaces.id'), nullable=False)
@@ -125,6 +165,9 @@ class WorkspaceMemory(Base):
   The agent can store and retrieve facts that should persist across threads.
   """
   __tablename__ = 'workspace_memory'
+  __table_args__ = (
+    Index("ix_workspace_memory_workspace_key", "workspace_id", "key"),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   workspace_id = Column(Integer, ForeignKey('workspaces.id'), nullable=False)
@@ -141,6 +184,9 @@ class Note(Base):
   Unlike memory these are human-readable documents, not key/value pairs.
   """
   __tablename__ = 'notes'
+  __table_args__ = (
+    Index("ix_notes_workspace_updated", "workspace_id", "updated_at"),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   workspace_id = Column(Integer, ForeignKey('workspaces.id'), nullable=False)
@@ -156,6 +202,9 @@ class Contact(Base):
   Simple contact book scoped to a workspace.
   """
   __tablename__ = 'contacts'
+  __table_args__ = (
+    Index("ix_contacts_workspace_name", "workspace_id", "name"),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   workspace_id = Column(Integer, ForeignKey('workspaces.id'), nullable=False)
@@ -224,10 +273,14 @@ class ToolRegistry(Base):
 class IndexedDocument(Base):
   """
   A file within a workspace's attached directories that has been ingested for
-  retrieval (RAG). Tracks size/mtime/hash so re-indexing can be incremental.
+  retrieval (RAG). Tracks size/mtime/inode/hash so re-indexing can be incremental.
   Status values: 'indexed', 'error'.
   """
   __tablename__ = 'indexed_documents'
+  __table_args__ = (
+    # Unique: the conflict target of the indexer's upsert (one row per file).
+    Index("ux_indexed_documents_workspace_path", "workspace_id", "path", unique=True),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
   workspace_id = Column(Integer, ForeignKey('workspaces.id'), nullable=False, index=True)
@@ -235,6 +288,7 @@ class IndexedDocument(Base):
   directory = Column(String, nullable=True)             # attached root directory this file came from
   size = Column(Integer, nullable=True)
   mtime = Column(Integer, nullable=True)                # int(st_mtime) for cheap change detection
+  inode = Column(Integer, nullable=True)                # st_ino; with size+mtime, proves a file unchanged without reading it
   content_hash = Column(String, nullable=True)          # sha256 for small files
   chunk_count = Column(Integer, nullable=False, default=0)
   status = Column(String, nullable=False, default='indexed')  # indexed, error
@@ -244,20 +298,89 @@ class IndexedDocument(Base):
 
 class DocumentChunk(Base):
   """
-  A chunk of an indexed document — the retrievable unit for RAG. The
-  ``embedding`` column is reserved for Phase 2 vector search (JSON-encoded
-  vector or external index reference); it is unused by the current keyword
-  retrieval path.
+  A chunk of an indexed document — the retrievable unit for RAG. When an
+  embedder is configured, ``embedding`` holds the chunk's normalised vector as
+  a compact float32/int8 blob (see ``subconscious.embeddings``) and
+  ``embedding_model`` the embedder model that produced it.
   """
   __tablename__ = 'document_chunks'
+  __table_args__ = (
+    # Per-document chunk lookups and expand_neighbours: WHERE document_id = ?
+    # AND ordinal BETWEEN ? AND ? ORDER BY document_id, ordinal
+    Index("ix_document_chunks_document_ordinal", "document_id", "ordinal"),
+  )
 
   id = Column(Integer, primary_key=True, autoincrement=True)
-  document_id = Column(Integer, ForeignKey('indexed_documents.id'), nullable=False, index=True)
+  document_id = Column(Integer, ForeignKey('indexed_documents.id'), nullable=False)
   workspace_id = Column(Integer, ForeignKey('workspaces.id'), nullable=False, index=True)
   ordinal = Column(Integer, nullable=False, default=0)  # position within the document
   content = Column(Text, nullable=False)
   start_line = Column(Integer, nullable=True)
   end_line = Column(Integer, nullable=True)
   token_estimate = Column(Integer, nullable=True)
-  embedding = Column(Text, nullable=True)               # Phase 2: vector store hook
+  # BLOB values; pre-existing databases declare the column TEXT, which SQLite
+  # stores blobs in unchanged.
+  embedding = Column(LargeBinary, nullable=True)
+  embedding_model = Column(String, nullable=True)
   created_at = Column(DateTime, default=datetime.now)
+
+
+# Full-text index over document_chunks.content: an external-content FTS5 table
+# (no second copy of the text) kept in sync by triggers. Created alongside the
+# table here and for existing databases by migration m007.
+DOCUMENT_CHUNKS_FTS_DDL = (
+  "CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5("
+  "content, content='document_chunks', content_rowid='id', tokenize='unicode61 remove_diacritics 2')",
+  "CREATE TRIGGER IF NOT EXISTS document_chunks_fts_ai AFTER INSERT ON document_chunks BEGIN "
+  "INSERT INTO document_chunks_fts (rowid, content) VALUES (new.id, new.content); END",
+  "CREATE TRIGGER IF NOT EXISTS document_chunks_fts_ad AFTER DELETE ON document_chunks BEGIN "
+  "INSERT INTO document_chunks_fts (document_chunks_fts, rowid, content) VALUES ('delete', old.id, old.content); END",
+  "CREATE TRIGGER IF NOT EXISTS document_chunks_fts_au AFTER UPDATE OF content ON document_chunks BEGIN "
+  "INSERT INTO document_chunks_fts (document_chunks_fts, rowid, content) VALUES ('delete', old.id, old.content); "
+  "INSERT INTO document_chunks_fts (rowid, content) VALUES (new.id, new.content); END",
+)
+
+
+def fts5_available(connection) -> bool:
+  """ Whether the linked SQLite was built with FTS5 """
+  return bool(connection.execute(text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")).scalar())
+
+
+for _ddl in DOCUMENT_CHUNKS_FTS_DDL:
+  event.listen(
+    DocumentChunk.__table__, "after_create",
+    DDL(_ddl).execute_if(callable_=lambda ddl, target, bind, **kw: fts5_available(bind)),
+  )
+
+
+class EventLog(Base):
+  """
+  Persisted tail of the in-process EventBus, so clients reconnecting after
+  an engine restart can replay what they missed by sequence number. Only
+  the most recent events are kept (see ``SQLiteEventStore``).
+  """
+  __tablename__ = 'event_log'
+
+  seq = Column(Integer, primary_key=True, autoincrement=False)
+  type = Column(String, nullable=False)
+  payload = Column(Text, nullable=False)                # the full event as JSON
+  created_at = Column(DateTime, default=datetime.now)
+
+
+class BackgroundJob(Base):
+  """
+  A resumable background job that has not finished yet: its parameters and
+  latest checkpoint, so it can be paused across restarts or resumed after the
+  engine was stopped (or killed) mid-run. Rows are deleted once the job
+  completes, fails or is cancelled (see ``JobManager``).
+  """
+  __tablename__ = 'background_jobs'
+
+  id = Column(String, primary_key=True)                 # Job.id (uuid4)
+  type = Column(String, nullable=False)                 # registered runner, e.g. "index"
+  title = Column(String, nullable=False, default='')
+  status = Column(String, nullable=False)               # "running" | "paused"
+  params = Column(Text, nullable=False, default='{}')   # JSON runner arguments
+  checkpoint = Column(Text, nullable=True)              # JSON progress marker
+  created_at = Column(DateTime, default=datetime.now)
+  updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
@@ -1,9 +1,11 @@
-import uuid
+import asyncio
 import logging
-from sqlalchemy import text, NullPool
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+from sqlalchemy import event, NullPool, AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 
-from .models import Base
+from .migrations import migrate
 from ..config import Config
 
 
@@ -11,79 +13,167 @@ logger = logging.getLogger("subconscious")
 
 
 class Database:
-  """ Database session manager. """
-  def __init__(self, config: Config):
-    """ Initialize the database engine and session maker. """
-    # NullPool disables connection pooling entirely. Each session opens and
-    # closes its own connection, so dispose() returns immediately and there
-    # is no background pool thread to hang on shutdown.
-    self.engine = create_async_engine(
-      config.db_path,
-      echo=False,
-      poolclass=NullPool,
-    )
+  """ Database session manager.
+
+      Production mode (``pooled=True``, the default) keeps a bounded pool of
+      read connections plus one dedicated writer connection. Every connection
+      runs in WAL mode so readers never block the writer and vice versa, and
+      all writes are serialised through an async FIFO queue so concurrent
+      writers wait their turn instead of failing with ``database is locked``.
+
+      ``pooled=False`` restores the legacy per-session ``NullPool`` behaviour.
+  """
+  # Read pool sizing. Reads are short (a handful of rows per request) so a
+  # small pool is plenty; extra callers wait up to _POOL_TIMEOUT for a slot.
+  _READ_POOL_SIZE = 4
+  _POOL_TIMEOUT = 30.0
+
+  # Connection pragmas. cache_size is negative → KiB rather than pages.
+  _MMAP_SIZE = 256 * 1024 * 1024       # 256 MiB memory-mapped I/O
+  _CACHE_SIZE_KIB = 64 * 1024          # 64 MiB page cache per connection
+  _BUSY_TIMEOUT_MS = 5000              # wait (not fail) on external writers
+
+  def __init__(self, config: Config, *, pooled: bool = True, read_pool_size: Optional[int] = None):
+    """ Initialize the database engines and session makers. """
+    self.pooled = pooled
+    if pooled:
+      # Readers: bounded pool with no overflow so the number of open SQLite
+      # handles (and aiosqlite worker threads) never exceeds the pool size.
+      self.engine = create_async_engine(
+        config.db_path,
+        echo=False,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=read_pool_size or self._READ_POOL_SIZE,
+        max_overflow=0,
+        pool_timeout=self._POOL_TIMEOUT,
+      )
+      # Writer: exactly one connection, fed by the write queue.
+      self.writer = create_async_engine(
+        config.db_path,
+        echo=False,
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=1,
+        max_overflow=0,
+        pool_timeout=self._POOL_TIMEOUT,
+      )
+      for eng in (self.engine, self.writer):
+        event.listen(eng.sync_engine, "connect", self._apply_pragmas)
+    else:
+      # NullPool disables connection pooling entirely. Each session opens and
+      # closes its own connection, so dispose() returns immediately and there
+      # is no background pool thread to hang on shutdown.
+      self.engine = create_async_engine(
+        config.db_path,
+        echo=False,
+        poolclass=NullPool,
+      )
+      self.writer = self.engine
+
     self.async_session = async_sessionmaker(
       self.engine, class_=AsyncSession, expire_on_commit=False
     )
+    self.write_async_session = async_sessionmaker(
+      self.writer, class_=AsyncSession, expire_on_commit=False
+    )
+
+    # Single-writer queue. Created lazily on first write so the Database can
+    # be constructed outside a running event loop.
+    self._write_queue: Optional[asyncio.Queue] = None
+    self._writer_task: Optional[asyncio.Task] = None
+
+  @classmethod
+  def _apply_pragmas(cls, dbapi_connection, connection_record) -> None:
+    """ Configure every new SQLite connection for concurrent WAL access. """
+    cursor = dbapi_connection.cursor()
+    try:
+      cursor.execute("PRAGMA journal_mode=WAL")
+      cursor.execute("PRAGMA synchronous=NORMAL")
+      cursor.execute(f"PRAGMA mmap_size={cls._MMAP_SIZE}")
+      cursor.execute(f"PRAGMA cache_size=-{cls._CACHE_SIZE_KIB}")
+      cursor.execute(f"PRAGMA busy_timeout={cls._BUSY_TIMEOUT_MS}")
+      cursor.execute("PRAGMA temp_store=MEMORY")
+    finally:
+      cursor.close()
 
   async def init_models(self):
-    """ Create tables if they don't exist and handle migrations. """
-    async with self.engine.begin() as conn:
-      await conn.run_sync(Base.metadata.create_all)
-    
-    # Column migrations – add columns that didn't exist in older DB versions
-    async with self.engine.begin() as conn:
-      # threads.updated_at
-      result = await conn.execute(text("PRAGMA table_info(threads)"))
-      columns = {row[1] for row in result.fetchall()}
-      if "updated_at" not in columns:
-        await conn.execute(text("ALTER TABLE threads ADD COLUMN updated_at DATETIME"))
-      if "default_model_id" not in columns:
-        await conn.execute(text("ALTER TABLE threads ADD COLUMN default_model_id VARCHAR"))
-      if "tools_config" not in columns:
-        await conn.execute(text("ALTER TABLE threads ADD COLUMN tools_config TEXT"))
-      if "skills_config" not in columns:
-        await conn.execute(text("ALTER TABLE threads ADD COLUMN skills_config TEXT"))
-      if "approval_config" not in columns:
-        await conn.execute(text("ALTER TABLE threads ADD COLUMN approval_config TEXT"))
-      if "uuid" not in columns:
-        await conn.execute(text("ALTER TABLE threads ADD COLUMN uuid VARCHAR"))
-
-      # messages.uuid – stable cross-peer identity for sync
-      result = await conn.execute(text("PRAGMA table_info(messages)"))
-      msg_columns = {row[1] for row in result.fetchall()}
-      if "uuid" not in msg_columns:
-        await conn.execute(text("ALTER TABLE messages ADD COLUMN uuid VARCHAR"))
-
-      # workspaces.tools_config / skills_config
-      result = await conn.execute(text("PRAGMA table_info(workspaces)"))
-      ws_columns = {row[1] for row in result.fetchall()}
-      if "tools_config" not in ws_columns:
-        await conn.execute(text("ALTER TABLE workspaces ADD COLUMN tools_config TEXT"))
-      if "skills_config" not in ws_columns:
-        await conn.execute(text("ALTER TABLE workspaces ADD COLUMN skills_config TEXT"))
-      if "directories" not in ws_columns:
-        await conn.execute(text("ALTER TABLE workspaces ADD COLUMN directories TEXT"))
-      if "approval_config" not in ws_columns:
-        await conn.execute(text("ALTER TABLE workspaces ADD COLUMN approval_config TEXT"))
-
-    # Backfill UUIDs for rows created before the uuid columns existed. SQLite
-    # can't generate per-row UUIDs in pure SQL, so do it in Python.
-    async with self.engine.begin() as conn:
-      for table in ("threads", "messages", "workspaces"):
-        rows = await conn.execute(
-          text(f"SELECT id FROM {table} WHERE uuid IS NULL OR uuid = ''")
-        )
-        for (row_id,) in rows.fetchall():
-          await conn.execute(
-            text(f"UPDATE {table} SET uuid = :u WHERE id = :id"),
-            {"u": str(uuid.uuid4()), "id": row_id},
-          )
+    """ Create tables if they don't exist and apply pending schema migrations. """
+    version = await migrate(self.writer)
+    logger.debug(f"Database schema version {version}")
 
   def get_session(self) -> AsyncSession:
-    """ Get a new async database session. """
+    """ Get a new async database session from the read pool.
+
+        Sessions that only read (or write rarely and outside hot paths) use
+        this. Hot write paths should prefer :meth:`write_session`.
+    """
     return self.async_session()
 
+  @asynccontextmanager
+  async def write_session(self) -> AsyncIterator[AsyncSession]:
+    """ Yield a session on the dedicated writer connection.
+
+        Callers queue for their turn in FIFO order; only one write session is
+        open at a time, so SQLite never sees two competing write transactions.
+        Must not be nested within another ``write_session`` in the same task.
+    """
+    if not self.pooled:
+      async with self.write_async_session() as session:
+        yield session
+      return
+
+    queue = self._ensure_writer()
+    loop = asyncio.get_running_loop()
+    granted: asyncio.Future = loop.create_future()
+    released = asyncio.Event()
+    await queue.put((granted, released))
+    try:
+      await granted
+      async with self.write_async_session() as session:
+        yield session
+    finally:
+      released.set()
+      if not granted.done():
+        granted.cancel()
+
+  def _ensure_writer(self) -> asyncio.Queue:
+    """ Start the writer task (once per event loop) and return its queue. """
+    if self._writer_task is None or self._writer_task.done():
+      self._write_queue = asyncio.Queue()
+      self._writer_task = asyncio.create_task(
+        self._writer_loop(self._write_queue), name="subconscious-db-writer"
+      )
+    assert self._write_queue is not None
+    return self._write_queue
+
+  @staticmethod
+  async def _writer_loop(queue: asyncio.Queue) -> None:
+    """ Grant the writer connection to queued callers one at a time. """
+    while True:
+      item = await queue.get()
+      if item is None:
+        return
+      granted, released = item
+      if granted.done():
+        # The caller gave up (cancelled) while waiting in the queue.
+        continue
+      granted.set_result(None)
+      await released.wait()
+
   async def close(self):
-    """ Close the database engine. """
+    """ Close the database engines.
+
+        The writer task is stopped first so no new write turns are granted,
+        then both pools are disposed. Pooled connections are idle at this
+        point, so disposal is a handful of quick closes.
+    """
+    task, self._writer_task = self._writer_task, None
+    if task is not None and not task.done():
+      task.cancel()
+      try:
+        await task
+      except asyncio.CancelledError:
+        pass
+    self._write_queue = None
     await self.engine.dispose()
+    if self.writer is not self.engine:
+      await self.writer.dispose()
@@ -20,12 +20,18 @@ from ..stream_events import tool_block_to_json
 from ..db.models import Workspace, Thread, AppState
 from ..shared.tool_config import ToolToggleTree, SkillToggleList
 from ..shared.messages import HumanMessage, AIMessage, ToolMessage, ApprovalMessage
-from ..stream_events import TextDelta, ToolCallStarted, ToolCallResult, ApprovalRequest, ApprovalResolved
+from ..stream_events import (
+  TextDelta, ToolCallStarted, ToolCallResult, ApprovalRequest, ApprovalResolved, AttachmentProgress,
+  coalesce_deltas,
+)
 
 
 # Logging config
 logger = logging.getLogger("subconscious")
 
+# Coalescing window (ms) for streamed narration text in the chat view.
+_UI_FLUSH_MS = 50.0
+
 
 def _db_message_to_ui(role: str, content: str, ts):
   """Map a persisted message row (user / assistant / tool) to its UI bubble."""
@@ -650,15 +656,14 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
   def subscribe_jobs():
     """Subscribe to the engine EventBus and mirror background job state into the
     UI so the notifications popup updates live as jobs progress."""
-    queue = engine.events.subscribe()
+    queue = engine.events.subscribe(["job.*"])
     set_jobs(engine.jobs.list())
 
     async def _consume():
       try:
         while True:
-          event = await queue.get()
-          if str(event.get("type", "")).startswith("job."):
-            set_jobs(engine.jobs.list())
+          await queue.get()
+          set_jobs(engine.jobs.list())
       except asyncio.CancelledError:
         pass
 
@@ -683,6 +688,16 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
     engine.jobs.clear_finished()
     set_jobs(engine.jobs.list())
 
+  def control_job(action: str, job_id: str):
+    """Cancel, pause or resume a background job from the jobs popup."""
+    async def handler(e=None):
+      if action == "resume":
+        engine.jobs.resume(job_id)
+      else:
+        await getattr(engine.jobs, action)(job_id)   # returns once the job has stopped
+      set_jobs(engine.jobs.list())
+    return handler
+
   async def handle_new_workspace(e):
     set_editing_workspace(None)
     set_workspace_mode("create")
@@ -862,13 +877,15 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
       current_text = ""
 
     try:
-      async for event in engine.stream_chat_events(
+      events = engine.stream_chat_events(
         content=content,
         thread_id=thread.id,
         workspace_id=workspace_id,
         attachments=attachments or [],
         model_cfg=selected_model_config or (model_configs[0] if model_configs else None),
-      ):
+      )
+      # Batch deltas so the chat view re-renders at most ~20x/s, not per token.
+      async for event in coalesce_deltas(events, flush_ms=_UI_FLUSH_MS):
         if isinstance(event, TextDelta):
           _ensure_text_placeholder()
           current_text += event.content
@@ -876,6 +893,14 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
           # overlays streaming_text onto the trailing (empty) AI bubble.
           set_streaming_text(current_text)
 
+        elif isinstance(event, AttachmentProgress):
+          # Attachments are read off the UI thread; show progress in the
+          # pending AI bubble until the prompt is ready (never persisted).
+          _ensure_text_placeholder()
+          set_streaming_text(
+            f"Preparing attachments… {event.done}/{event.total}" if event.done < event.total else ""
+          )
+
         elif isinstance(event, ToolCallStarted):
           # Capture args now; the matching result arrives as a later event.
           pending_args[event.tool_call_id] = event.args
@@ -1020,7 +1045,7 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
       asyncio.create_task(engine.set_thread_skills_config(selected_thread.id, config))
 
   async def handle_save_workspace(name, description, ws_id=None):
-    async with engine.db.get_session() as session:
+    async with engine.db.write_session() as session:
       if ws_id:
         ws = await session.get(Workspace, ws_id)
         if ws:
@@ -1042,7 +1067,7 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
       page.update()
 
     async def do_delete(e):
-      async with engine.db.get_session() as session:
+      async with engine.db.write_session() as session:
         ws = await session.get(Workspace, ws_id)
         if ws:
           await session.delete(ws)
@@ -1201,6 +1226,7 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
     running = status == "running"
     status_colours = {
       "running":   ft.Colors.PRIMARY,
+      "paused":    ft.Colors.AMBER,
       "completed": ft.Colors.GREEN,
       "failed":    ft.Colors.ERROR,
       "cancelled": ft.Colors.GREY,
@@ -1215,6 +1241,12 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
         spacing=8,
       ),
     ]
+    if j.get("cancellable") and status in ("running", "paused"):
+      toggle = ("pause", ft.Icons.PAUSE, "Pause") if running else ("resume", ft.Icons.PLAY_ARROW, "Resume")
+      body[0].controls += [
+        ft.IconButton(icon=toggle[1], tooltip=toggle[2], icon_size=16, on_click=control_job(toggle[0], j["id"])),
+        ft.IconButton(icon=ft.Icons.CLOSE, tooltip="Cancel", icon_size=16, on_click=control_job("cancel", j["id"])),
+      ]
     if running:
       body.append(ft.ProgressBar(value=None if indeterminate else j.get("progress", 0.0)))
     if j.get("message"):
@@ -55,7 +55,7 @@ async def add_contact(
     The saved contact record as a dict.
   """
   try:
-    async with ctx.deps.db.get_session() as session:
+    async with ctx.deps.db.write_session() as session:
       contact = Contact(
         workspace_id=ctx.deps.workspace_id,
         name=name.strip(),
@@ -154,7 +154,7 @@ async def update_contact(
     The updated contact dict or an error message.
   """
   try:
-    async with ctx.deps.db.get_session() as session:
+    async with ctx.deps.db.write_session() as session:
       contact = await session.get(Contact, contact_id)
       if not contact or contact.workspace_id != ctx.deps.workspace_id:
         return {"status": "error", "message": f"Contact #{contact_id} not found."}
@@ -184,7 +184,7 @@ async def delete_contact(
     Confirmation dict or error.
   """
   try:
-    async with ctx.deps.db.get_session() as session:
+    async with ctx.deps.db.write_session() as session:
       contact = await session.get(Contact, contact_id)
       if not contact or contact.workspace_id != ctx.deps.workspace_id:
         return {"status": "error", "message": f"Contact #{contact_id} not found."}
@@ -8,21 +8,25 @@ File reading uses a tiered strategy based on file size:
                            returned; use read_range() to fetch specific lines.
   > 10 MB  — RAG hint:    only metadata is returned; use search_in_file() to
                            search for relevant lines before reading a range.
+
+Documents (.docx/.xlsx/.pdf) are tiered on their extracted text, which is
+streamed page by page / row by row so only the returned prefix is kept, and
+served from the engine's extraction cache when one is available. read_range()
+and search_in_file() work on that extracted text too.
 """
 import re
 import os
-import docx
-import pypdf
 import logging
 import pathlib
 import asyncio
 import datetime
-import openpyxl
+import contextlib
 import send2trash
 import subprocess
 from pydantic_ai import RunContext
 
 from . import EngineContext
+from ..extraction import STRUCTURED_EXTS, iter_docx, iter_pdf, iter_text, iter_xlsx
 
 
 logger = logging.getLogger("subconscious")
@@ -38,6 +42,23 @@ def _resolve_path(raw: str) -> pathlib.Path:
   return pathlib.Path(raw).expanduser().resolve()
 
 
+def _extraction_cache(ctx: RunContext[EngineContext]):
+  """The engine's ExtractionCache, or None (e.g. no engine in tests)."""
+  return getattr(ctx.deps.engine, "extraction_cache", None)
+
+
+def _document_lines(p: pathlib.Path, cache=None):
+  """Lines of a document's extracted text, streamed."""
+  blocks = cache.iter_text(p) if cache is not None else iter_text(p)
+  tail = ""
+  for block in blocks:
+    lines = (tail + block).split("\n")
+    tail = lines.pop()
+    yield from lines
+  if tail:
+    yield tail
+
+
 async def read_file(ctx: RunContext[EngineContext], path: str, encoding: str = "utf-8") -> str:
   """
   Read and return the content of a file using an adaptive tiered strategy:
@@ -66,13 +87,13 @@ async def read_file(ctx: RunContext[EngineContext], path: str, encoding: str = "
 
     # ── Structured formats: always extract text first, then tier on result size ──
     if ext in (".docx", ".xlsx", ".pdf"):
+      cache = _extraction_cache(ctx)
       if ext == ".docx":
-        text = _read_docx(p)
+        text, char_count = _read_docx(p, _FULL_LOAD_LIMIT, cache)
       elif ext == ".xlsx":
-        text = _read_xlsx(p)
+        text, char_count = _read_xlsx(p, _FULL_LOAD_LIMIT, cache)
       else:
-        text = _read_pdf(p)
-      char_count = len(text)
+        text, char_count = _read_pdf(p, _FULL_LOAD_LIMIT, cache)
       if char_count <= _FULL_LOAD_LIMIT:
         return text
       elif char_count <= _CHUNKED_LIMIT:
@@ -173,43 +194,39 @@ def _build_skeleton(p: pathlib.Path, encoding: str = "utf-8") -> str:
     return f"[Error building skeleton: {exc}]"
 
 
-def _read_docx(path: pathlib.Path) -> str:
-  """Extract text from a .docx file using python-docx."""
+def _read_blocks(blocks, limit: int) -> tuple[str, int]:
+  """Keep the first *limit* characters of streamed *blocks*; count the rest."""
+  kept: list[str] = []
+  size = 0
+  for block in blocks:
+    if size < limit:
+      kept.append(block[:limit - size])
+    size += len(block)
+  return "".join(kept), size
+
+
+def _read_docx(path: pathlib.Path, limit: int = _CHUNKED_LIMIT, cache=None) -> tuple[str, int]:
+  """Extract text from a .docx file using python-docx: (first *limit* chars, total chars)."""
   try:
-    doc = docx.Document(path)
-    return "\n".join([para.text for para in doc.paragraphs])
+    return _read_blocks(cache.iter_text(path) if cache is not None else iter_docx(path), limit)
   except Exception as e:
-    return f"Error reading Word document: {e}"
+    return f"Error reading Word document: {e}", 0
 
 
-def _read_xlsx(path: pathlib.Path) -> str:
-  """Extract text/data from an .xlsx file using openpyxl."""
+def _read_xlsx(path: pathlib.Path, limit: int = _CHUNKED_LIMIT, cache=None) -> tuple[str, int]:
+  """Extract text/data from an .xlsx file using openpyxl: (first *limit* chars, total chars)."""
   try:
-    wb = openpyxl.load_workbook(path, data_only=True, read_only=True)
-    output = []
-    for sheet in wb.worksheets:
-      output.append(f"--- Sheet: {sheet.title} ---")
-      for row in sheet.iter_rows(values_only=True):
-        # Filter out empty rows
-        if any(cell is not None for cell in row):
-          output.append("\t".join([str(cell) if cell is not None else "" for cell in row]))
-    return "\n".join(output)
+    return _read_blocks(cache.iter_text(path) if cache is not None else iter_xlsx(path), limit)
   except Exception as e:
-    return f"Error reading Excel spreadsheet: {e}"
+    return f"Error reading Excel spreadsheet: {e}", 0
 
 
-def _read_pdf(path: pathlib.Path) -> str:
-  """Extract text from a .pdf file using pypdf."""
+def _read_pdf(path: pathlib.Path, limit: int = _CHUNKED_LIMIT, cache=None) -> tuple[str, int]:
+  """Extract text from a .pdf file using pypdf: (first *limit* chars, total chars)."""
   try:
-    reader = pypdf.PdfReader(path)
-    output = []
-    for i, page in enumerate(reader.pages):
-      text = page.extract_text()
-      if text:
-        output.append(f"--- Page {i+1} ---\n{text}")
-    return "\n".join(output)
+    return _read_blocks(cache.iter_text(path) if cache is not None else iter_pdf(path), limit)
   except Exception as e:
-    return f"Error reading PDF: {e}"
+    return f"Error reading PDF: {e}", 0
 
 
 async def read_range(
@@ -241,7 +258,10 @@ async def read_range(
     else:
       capped = False
 
-    lines = p.read_text(encoding=encoding, errors="replace").splitlines()
+    if p.suffix.lower() in STRUCTURED_EXTS:
+      lines = list(_document_lines(p, _extraction_cache(ctx)))
+    else:
+      lines = p.read_text(encoding=encoding, errors="replace").splitlines()
     total = len(lines)
     s = max(0, start_line - 1)
     e = min(total, end_line)
@@ -288,8 +308,12 @@ async def search_in_file(
       return f"Invalid regex pattern: {exc}"
 
     matches = []
-    with p.open("r", encoding="utf-8", errors="replace") as fh:
-      for lineno, line in enumerate(fh, 1):
+    with contextlib.ExitStack() as stack:
+      if p.suffix.lower() in STRUCTURED_EXTS:
+        lines = stack.enter_context(contextlib.closing(_document_lines(p, _extraction_cache(ctx))))
+      else:
+        lines = stack.enter_context(p.open("r", encoding="utf-8", errors="replace"))
+      for lineno, line in enumerate(lines, 1):
         if pattern.search(line):
           matches.append(f"{lineno:>6}: {line.rstrip()}")
           if len(matches) >= max_results:
@@ -25,7 +25,7 @@ async def remember(
     key:   Short identifier for the fact, e.g. 'user_name'.
     value: The value to store, e.g. 'Alice'.
   """
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     # Upsert: check existing first
     existing = await session.scalar(
       select(WorkspaceMemory).where(
@@ -91,7 +91,7 @@ async def forget(ctx: RunContext[EngineContext], key: str) -> str:
   Args:
     key: The key of the memory to remove.
   """
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     result = await session.execute(
       delete(WorkspaceMemory).where(
         WorkspaceMemory.workspace_id == ctx.deps.workspace_id,
@@ -110,7 +110,7 @@ async def forget_all(ctx: RunContext[EngineContext]) -> str:
   Clear all memory for the current workspace.
   This is irreversible — use with caution.
   """
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     result = await session.execute(
       delete(WorkspaceMemory).where(WorkspaceMemory.workspace_id == ctx.deps.workspace_id)
     )
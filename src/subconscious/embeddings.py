@@ -0,0 +1,152 @@
+""" Chunk embeddings for semantic workspace retrieval.
+
+    An ``Embedder`` turns chunk texts into vectors. Two backends ship:
+
+    - ``OllamaEmbedder`` calls a local Ollama server's ``/api/embed`` endpoint
+      (e.g. ``nomic-embed-text``), so nothing leaves the machine.
+    - ``HashingEmbedder`` is a deterministic feature-hashing embedder that runs
+      on the CPU with no model at all — the offline fallback and the backend
+      tests use.
+
+    Vectors are L2-normalised (cosine similarity becomes a dot product) and
+    stored in ``DocumentChunk.embedding`` as compact blobs: raw float32, or
+    int8 with a float32 scale (4x smaller, ~1% cosine error). Floats in blobs
+    are little-endian on every platform.
+
+    The backend is chosen by ``SUBCONSCIOUS_EMBEDDINGS`` (``off`` — the
+    default — ``ollama`` or ``hash``); see :func:`embedder_from_env`.
+"""
+from __future__ import annotations
+
+import os
+import math
+import struct
+import hashlib
+import logging
+from array import array
+from typing import Optional, Protocol, Sequence
+
+import httpx
+
+
+logger = logging.getLogger("subconscious")
+
+
+class Embedder(Protocol):
+  """Anything that embeds a batch of texts."""
+  model: str
+
+  async def embed(self, texts: Sequence[str]) -> list[list[float]]: ...
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class OllamaEmbedder:
+  """Embeddings from a local Ollama server."""
+
+  DEFAULT_MODEL = "nomic-embed-text"
+  DEFAULT_URL = "http://localhost:11434"
+  _TIMEOUT = 60.0
+
+  def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None):
+    self.model = model or self.DEFAULT_MODEL
+    # Accept the OpenAI-compatible ".../v1" URL used for chat models too.
+    self.base_url = (base_url or self.DEFAULT_URL).rstrip("/").removesuffix("/v1")
+    self._client: Optional[httpx.AsyncClient] = None
+
+  async def embed(self, texts: Sequence[str]) -> list[list[float]]:
+    if not texts:
+      return []
+    if self._client is None:
+      self._client = httpx.AsyncClient(base_url=self.base_url, timeout=self._TIMEOUT)
+    response = await self._client.post("/api/embed", json={"model": self.model, "input": list(texts)})
+    response.raise_for_status()
+    return [normalize(v) for v in response.json()["embeddings"]]
+
+  async def aclose(self) -> None:
+    if self._client is not None:
+      await self._client.aclose()
+      self._client = None
+
+
+class HashingEmbedder:
+  """Deterministic bag-of-words feature hashing (signed, with bigrams)."""
+
+  def __init__(self, dim: int = 256):
+    self.dim = dim
+    self.model = f"hash-{dim}"
+
+  async def embed(self, texts: Sequence[str]) -> list[list[float]]:
+    return [self.embed_one(t) for t in texts]
+
+  def embed_one(self, text: str) -> list[float]:
+    vec = [0.0] * self.dim
+    words = [w for w in "".join(c.lower() if c.isalnum() else " " for c in text).split()]
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+      h = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+      vec[h % self.dim] += 1.0 if (h >> 63) & 1 else -1.0
+    return normalize(vec)
+
+
+def embedder_from_env() -> Optional[Embedder]:
+  """ The configured embedder, or None when embeddings are off.
+
+      ``SUBCONSCIOUS_EMBEDDINGS``: ``off`` (default) | ``ollama`` | ``hash``;
+      ``SUBCONSCIOUS_EMBED_MODEL`` / ``SUBCONSCIOUS_EMBED_URL`` for Ollama.
+  """
+  backend = os.environ.get("SUBCONSCIOUS_EMBEDDINGS", "off").strip().lower()
+  if backend == "ollama":
+    return OllamaEmbedder(os.environ.get("SUBCONSCIOUS_EMBED_MODEL"), os.environ.get("SUBCONSCIOUS_EMBED_URL"))
+  if backend == "hash":
+    return HashingEmbedder()
+  if backend not in ("", "off"):
+    logger.warning(f"Unknown SUBCONSCIOUS_EMBEDDINGS backend '{backend}'; embeddings disabled")
+  return None
+
+
+# ---------------------------------------------------------------------------
+# Vector encoding
+# ---------------------------------------------------------------------------
+
+FLOAT32 = "f32"
+INT8 = "i8"
+
+# One-byte tag at the start of every blob.
+_TAGS = {FLOAT32: b"f", INT8: b"q"}
+
+
+def normalize(vec: Sequence[float]) -> list[float]:
+  norm = math.sqrt(sum(x * x for x in vec))
+  return [x / norm for x in vec] if norm else list(vec)
+
+
+def encode_vector(vec: Sequence[float], dtype: str = INT8) -> bytes:
+  """ ``b"f" + float32[dim]`` or ``b"q" + float32 scale + int8[dim]`` (little-endian) """
+  if dtype == FLOAT32:
+    return _TAGS[FLOAT32] + struct.pack(f"<{len(vec)}f", *vec)
+  scale = max((abs(x) for x in vec), default=0.0) / 127.0 or 1.0
+  return _TAGS[INT8] + struct.pack("<f", scale) + array("b", (round(x / scale) for x in vec)).tobytes()
+
+
+def blob_dtype(blob: bytes) -> str:
+  """ Encoding of an embedding blob (:data:`FLOAT32` or :data:`INT8`) """
+  return INT8 if blob[:1] == _TAGS[INT8] else FLOAT32
+
+
+def decode_vector(blob: bytes) -> list[float]:
+  """ Inverse of :func:`encode_vector` (int8 values are rescaled) """
+  tag, body = blob[:1], blob[1:]
+  if tag == _TAGS[FLOAT32]:
+    return list(struct.unpack(f"<{len(body) // 4}f", body))
+  if tag == _TAGS[INT8]:
+    (scale,) = struct.unpack_from("<f", body)
+    return [v * scale for v in array("b", body[4:])]
+  raise ValueError(f"Unknown embedding blob tag {tag!r}")
+
+
+def embedding_dtype() -> str:
+  """ ``SUBCONSCIOUS_EMBED_DTYPE``: ``i8`` (default) or ``f32`` """
+  dtype = os.environ.get("SUBCONSCIOUS_EMBED_DTYPE", INT8).strip().lower()
+  return dtype if dtype in _TAGS else INT8
@@ -9,11 +9,9 @@ import zipfile
 import asyncio
 import logging
 import pathlib
-import docx as _docx
-import pypdf as _pypdf
-import openpyxl as _openpyxl
 from datetime import datetime
-from sqlalchemy import select
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import select, tuple_
 from packaging.version import Version
 from typing import AsyncIterator, Optional
 from sqlalchemy import update as sql_update
@@ -29,21 +27,31 @@ from pydantic_ai.tools import DeferredToolRequests, DeferredToolResults
 from .config import Config
 from .api import APIService
 from .events import EventBus
-from .jobs import JobManager
+from .event_store import SQLiteEventStore
+from .jobs import Job, JobManager
 from .indexing import WorkspaceIndexer
+from .watcher import WorkspaceWatcher
+from .retrieval import ChunkHit, content_query, retrieve
+from .embeddings import embedder_from_env
+from .vector_index import VectorStore
+from .extraction import STRUCTURED_EXTS, cache_for, extract_text
+from .history import (
+  HistoryPolicy, HistoryWindow, HISTORY_ROLES, OMITTED_NOTE, SUMMARY_PREFIX,
+  SUMMARY_SYSTEM_PROMPT, ThreadCompactor, estimate_tokens,
+)
 from .constants import VERSION
 from .db.session import Database
 from .agent import AgentManager, EchoProvider
 from .system_info import SystemInformationService
 from .stream_events import (
-  TextDelta, ToolCallStarted, ToolCallResult, ApprovalRequest, ApprovalResolved, StreamEvent,
+  TextDelta, ToolCallStarted, ToolCallResult, ApprovalRequest, ApprovalResolved,
+  AttachmentProgress, StreamEvent,
 )
 from .tools import classify_operation
 from .desktop_tools import ToolRegistry, EngineContext
 from .db.models import (
   Workspace, Thread, Message, AppState, Networks,
   SkillRegistry, ToolRegistry as ToolRegistryModel,
-  IndexedDocument, DocumentChunk,
 )
 
 
@@ -60,8 +68,31 @@ class Engine:
   # Could be an issue for slow systems where nothing is wrong but response takes very long
   _DEFAULT_STREAM_TIMEOUT = 90.0
 
+  # Default bounds on the history replayed each chat turn. Either limit can be
+  # overridden per model config or via SUBCONSCIOUS_HISTORY_* env vars.
+  _DEFAULT_HISTORY_MESSAGES = 200
+  _DEFAULT_HISTORY_TOKENS = 32_000
+  _DEFAULT_HISTORY_POLICY = HistoryPolicy.SUMMARY
+  _HISTORY_PAGE_SIZE = 64
+  # Under the summary policy, compaction runs once this many estimated tokens
+  # have fallen out of the window without being folded into the summary.
+  _DEFAULT_COMPACT_THRESHOLD = 4_000
+
   # In-memory cache of the `share_system_context` privacy toggle. Seeded at
   _share_system_context: bool = True
+  # In-memory cache of the `workspace_context` toggle (off by default): when
+  # on, chat turns are prefixed with the workspace chunks most relevant to the
+  # user's message — only hits scoring at least the minimums below.
+  _workspace_context: bool = False
+  _WORKSPACE_CONTEXT_HITS = 4
+  _WORKSPACE_CONTEXT_NEIGHBOURS = 1
+  _WORKSPACE_CONTEXT_MIN_BM25 = 1.0
+  _WORKSPACE_CONTEXT_MIN_COSINE = 0.5
+  _WORKSPACE_CONTEXT_TIMEOUT = 0.5   # seconds a turn may spend on workspace retrieval
+
+  # Attachments are read and parsed on a small thread pool, this many at once.
+  _ATTACHMENT_WORKERS = 4
+  _attachment_executor: Optional[ThreadPoolExecutor] = None
 
   # The system information service, created during start_engine by
   system_info: Optional["SystemInformationService"] = None
@@ -80,6 +111,10 @@ class Engine:
     self._approval_inbox: dict = {}
     # Background job registry (indexing, etc.) with EventBus fan-out for the UI.
     self.jobs = JobManager(self.events)
+    # Thread ids with a history-compaction job in flight (one per thread).
+    self._compacting: set[int] = set()
+    # Live indexing of attached directories (system setting "index_watch").
+    self._index_watch = False
 
   def register_setting_callback(self, key: str, callback) -> None:
     """ Register an async callback to be invoked when *key* is updated via update_setting """
@@ -103,11 +138,13 @@ class Engine:
         "position": [ "x", "y" ],
         "size": [ "width", "height" ],
         "maximized": [ False, True ],
-        "share_system_context": [ "true", "false" ]
+        "share_system_context": [ "true", "false" ],
+        "index_watch": [ "false", "true" ],
+        "workspace_context": [ "false", "true" ]
       }
       
       # Create or skip config
-      async with self.db.get_session() as session:
+      async with self.db.write_session() as session:
         for key, value in system_settings.items():
           exists = await session.scalar(
             select(AppState).where(AppState.key == key, AppState.tag == "system")
@@ -127,6 +164,7 @@ class Engine:
     # Seed the in-memory privacy toggle from the (now-ensured) stored value and
     # register the callback that keeps it fresh on later updates (Req 7.5).
     await self._seed_share_system_context()
+    await self._seed_workspace_context()
 
   async def _seed_share_system_context(self) -> None:
     """ Seed the _share_system_context cache from AppState and register the
@@ -149,6 +187,19 @@ class Engine:
     """ Setting callback: refresh the in-memory share_system_context cache """
     self._share_system_context = value == "true"
 
+  async def _seed_workspace_context(self) -> None:
+    """ Seed the _workspace_context cache from AppState and follow updates """
+    try:
+      self._workspace_context = await self.get_setting("workspace_context", tag="system") == "true"
+    except Exception as exc:
+      logger.warning(f"Failed to seed workspace_context; using default (False): {exc}")
+      self._workspace_context = False
+    self.register_setting_callback("workspace_context", self._on_workspace_context_changed)
+
+  async def _on_workspace_context_changed(self, key: str, value: str, tag: str) -> None:
+    """ Setting callback: refresh the in-memory workspace_context cache """
+    self._workspace_context = value == "true"
+
   async def _collect_info(self) -> None:
     """ Initiates the hardware information collection service """
     try:
@@ -175,7 +226,7 @@ class Engine:
 
   async def init_system(self):
     """ Initialize system components (DB, Default Workspace) """
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       # Find current network inside app_state
       self.current_network = await session.scalar(
         select(AppState).where(AppState.key == "current_network")
@@ -249,6 +300,11 @@ class Engine:
     self.db = Database(config)
     await self.db.init_models()
 
+    # Persist the event log so clients can replay missed events (?since=)
+    # across engine restarts.
+    self.event_store = SQLiteEventStore(self.db)
+    await self.events.attach_store(self.event_store)
+
     # Init the default settings
     await self.init_settings()
 
@@ -268,7 +324,28 @@ class Engine:
     self.tool_registry = ToolRegistry()
 
     # Workspace directory indexer (RAG ingestion) — runs work as background jobs.
-    self.indexer = WorkspaceIndexer(self.db, self.jobs)
+    # With embeddings enabled, chunks are also embedded and searched by vector.
+    self.embedder = embedder_from_env()
+    self.vectors = VectorStore(
+      self.db, self.config.data_dir / "vectors", model=getattr(self.embedder, "model", None),
+    )
+    # Extracted document text, shared by the indexer, attachments and file tools.
+    self.extraction_cache = cache_for(self.config.data_dir / "extracted")
+    self.indexer = WorkspaceIndexer(
+      self.db, self.jobs, embedder=self.embedder, on_change=self.vectors.invalidate,
+      extraction_cache=self.extraction_cache,
+    )
+    self.watcher = WorkspaceWatcher(self.indexer)
+    await self._seed_index_watch()
+
+    # Indexing jobs checkpoint to the database: resume any a previous run left
+    # unfinished (paused ones stay paused).
+    self.jobs.db = self.db
+    self.jobs.register("index", self._run_index_job)
+    await self.jobs.restore()
+
+    # Rolling thread summariser for long chats — also runs as background jobs.
+    self.compactor = ThreadCompactor(self.db, self.jobs)
 
     # Start the API background service
     self.api_service = APIService(self, self.config, preferred_port=8771)
@@ -305,7 +382,7 @@ class Engine:
     Otherwise create a new Thread in the given workspace with a
     placeholder title derived from the first message.
     """
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       if thread_id:
         thread = await session.get(Thread, thread_id)
         if thread:
@@ -344,7 +421,7 @@ class Engine:
 
   async def save_message(self, thread_id: int, role: str, content: str) -> Message:
     """Persist a single message and return the ORM object. Also bumps the thread's updated_at."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       msg = Message(thread_id=thread_id, role=role, content=content)
       session.add(msg)
       # Bump the parent thread's updated_at so the list stays sorted by recent activity
@@ -357,6 +434,8 @@ class Engine:
       await session.refresh(msg)
       thread = await session.get(Thread, thread_id)
       thread_uuid = thread.uuid if thread else None
+      workspace = await session.get(Workspace, thread.workspace_id) if thread else None
+      workspace_uuid = workspace.uuid if workspace else None
 
     # Notify connected clients (VS Code extension, etc.) of the new message.
     await self.events.publish({
@@ -364,6 +443,7 @@ class Engine:
       "data": {
         "uuid": msg.uuid,
         "thread_uuid": thread_uuid,
+        "workspace_uuid": workspace_uuid,
         "role": role,
         "content": content,
         "created_at": msg.created_at.isoformat() if msg.created_at else None,
@@ -381,12 +461,123 @@ class Engine:
       )
       return list(result.all())
 
-  def _build_history(self, db_messages: list[Message]) -> list[ModelMessage]:
+  async def load_history_window(
+    self,
+    thread_id: int,
+    *,
+    max_messages: Optional[int] = None,
+    token_budget: Optional[int] = None,
+    before: Optional[tuple[datetime, int]] = None,
+    skip_latest: int = 0,
+  ) -> HistoryWindow:
+    """
+    Return the newest replayable messages of a thread that fit within
+    *max_messages* rows and *token_budget* estimated tokens (None = unbounded).
+
+    Rows are read newest-first in pages using a keyset cursor on
+    ``(created_at, id)``, so only the window itself is ever loaded. *before*
+    resumes from a previous window's ``cursor``; *skip_latest* ignores the
+    newest N rows (e.g. the user message that was just persisted). The newest
+    eligible message is always included even if it alone exceeds the budget.
+    """
+    window = HistoryWindow()
+    newest_first: list[Message] = []
+    cursor = before
+    exhausted = False
+    async with self.db.get_session() as session:
+      while not exhausted:
+        stmt = (
+          select(Message)
+          .where(Message.thread_id == thread_id, Message.role.in_(HISTORY_ROLES))
+          .order_by(Message.created_at.desc(), Message.id.desc())
+          .limit(self._HISTORY_PAGE_SIZE)
+        )
+        if cursor is not None:
+          stmt = stmt.where(tuple_(Message.created_at, Message.id) < tuple_(*cursor))
+        page = list((await session.scalars(stmt)).all())
+        exhausted = len(page) < self._HISTORY_PAGE_SIZE
+        for msg in page:
+          cursor = (msg.created_at, msg.id)
+          if skip_latest > 0:
+            skip_latest -= 1
+            continue
+          cost = estimate_tokens(msg.content)
+          over_count = max_messages is not None and len(newest_first) >= max_messages
+          over_budget = (
+            token_budget is not None and newest_first and window.tokens + cost > token_budget
+          )
+          if over_count or over_budget:
+            window.truncated = True
+            exhausted = True
+            break
+          newest_first.append(msg)
+          window.tokens += cost
+
+    messages = newest_first[::-1]
+    if window.truncated:
+      # A window must not open on an orphaned assistant reply.
+      while messages and messages[0].role != "user":
+        window.tokens -= estimate_tokens(messages.pop(0).content)
+    window.messages = messages
+    if messages:
+      window.cursor = (messages[0].created_at, messages[0].id)
+    return window
+
+  def _resolve_history_limits(self, model_cfg: Optional[dict]) -> dict:
+    """Resolve the history window bounds and overflow policy for a turn.
+
+    Precedence per setting: ``model_cfg`` (``history_max_messages``,
+    ``history_token_budget``, ``history_compact_threshold``,
+    ``history_policy``) → the matching ``SUBCONSCIOUS_HISTORY_*`` env var →
+    the class default. A value of 0 disables that bound; unparseable values
+    fall back to the default.
+    """
+    cfg = model_cfg or {}
+
+    def _int_setting(key: str, env: str, default: int) -> Optional[int]:
+      raw = cfg.get(key)
+      if raw in (None, ""):
+        raw = os.environ.get(env)
+      try:
+        val = int(raw) if raw not in (None, "") else default
+      except (TypeError, ValueError):
+        val = default
+      return val if val > 0 else None
+
+    policy = (cfg.get("history_policy") or os.environ.get("SUBCONSCIOUS_HISTORY_POLICY") or "").strip().lower()
+    return {
+      "max_messages": _int_setting(
+        "history_max_messages", "SUBCONSCIOUS_HISTORY_MAX_MESSAGES", self._DEFAULT_HISTORY_MESSAGES
+      ),
+      "token_budget": _int_setting(
+        "history_token_budget", "SUBCONSCIOUS_HISTORY_TOKEN_BUDGET", self._DEFAULT_HISTORY_TOKENS
+      ),
+      "compact_threshold": _int_setting(
+        "history_compact_threshold", "SUBCONSCIOUS_HISTORY_COMPACT_THRESHOLD",
+        self._DEFAULT_COMPACT_THRESHOLD,
+      ),
+      "policy": policy if policy in HistoryPolicy.ALL else self._DEFAULT_HISTORY_POLICY,
+    }
+
+  def _build_history(
+    self,
+    db_messages: list[Message],
+    truncated: bool = False,
+    policy: str = HistoryPolicy.DROP,
+    summary: Optional[str] = None,
+  ) -> list[ModelMessage]:
     """
     Convert stored Message rows into the pydantic-ai message history format
-    so the LLM has full conversation context.
+    so the LLM has the conversation context. When the rows are a *truncated*
+    window, *policy* decides how the omitted older turns are represented:
+    the thread's rolling *summary* under SUMMARY (falling back to the
+    omission note until one exists), the note under NOTE, nothing under DROP.
     """
     history: list[ModelMessage] = []
+    if truncated and policy == HistoryPolicy.SUMMARY and summary:
+      history.append(ModelRequest(parts=[UserPromptPart(content=SUMMARY_PREFIX + summary)]))
+    elif truncated and policy in (HistoryPolicy.NOTE, HistoryPolicy.SUMMARY):
+      history.append(ModelRequest(parts=[UserPromptPart(content=OMITTED_NOTE)]))
     for msg in db_messages:
       content_str = str(msg.content)
       if msg.role == "user":
@@ -409,18 +600,47 @@ class Engine:
     Stream a *structured* AI response for *content* given the thread history.
 
     """
-    # Load history (excluding the message we're about to send – it was just saved)
-    db_messages = await self.load_thread_messages(thread_id)
-    # Drop the last message (the user message we just persisted) so it's only
-    # included as the explicit new prompt, not duplicated in history.
-    history = self._build_history(db_messages[:-1])
-
     # Resolve model config
     if model_cfg is None:
       model_cfg = self.agent_manager.get_best_model_cfg()
     if model_cfg is None:
       raise ValueError("No model configured. Add a model in Settings → Models.")
 
+    # Load the newest slice of history that fits the configured window. The
+    # newest row (the user message we just persisted) is skipped so it's only
+    # included as the explicit new prompt, not duplicated in history.
+    # Under the summary policy the rolling summary's tokens come out of the
+    # same budget, and a compaction job is queued once enough turns have
+    # slid out of the window unsummarised.
+    limits = self._resolve_history_limits(model_cfg)
+    compactor = getattr(self, "compactor", None)
+    summary = None
+    token_budget = limits["token_budget"]
+    if limits["policy"] == HistoryPolicy.SUMMARY and compactor is not None:
+      summary = await compactor.get_summary(thread_id)
+      if summary is not None and token_budget is not None:
+        token_budget = max(1, token_budget - summary.token_estimate)
+    window = await self.load_history_window(
+      thread_id,
+      max_messages=limits["max_messages"],
+      token_budget=token_budget,
+      skip_latest=1,
+    )
+    history = self._build_history(
+      window.messages, window.truncated, limits["policy"],
+      summary=summary.content if summary is not None else None,
+    )
+    if (
+      compactor is not None
+      and limits["policy"] == HistoryPolicy.SUMMARY
+      and window.truncated
+      and window.cursor is not None
+      and thread_id not in self._compacting
+      and await compactor.pending_tokens(thread_id, summary, window.cursor)
+      >= (limits["compact_threshold"] or 0)
+    ):
+      self.compact_thread(thread_id, model_cfg, window.cursor)
+
     # Resolve tools
     if enabled_tools is not None:
       tools = self.tool_registry.get_tools(enabled_tools)
@@ -452,8 +672,15 @@ class Engine:
       approval_config=await self.resolve_approval_config(workspace_id, thread_id),
     )
 
-    # Build an attachment context block and prepend it to the user prompt
-    prompt = self._build_prompt_with_attachments(content, attachments or [])
+    # Build an attachment context block and prepend it to the user prompt.
+    # Attachments are read on a worker pool; progress is streamed meanwhile.
+    prompt = content
+    if attachments:
+      sections: list = []
+      async for progress in self._render_attachments(attachments, sections):
+        yield progress
+      prompt = self._build_prompt_with_attachments(content, sections)
+    prompt = await self._add_workspace_context(workspace_id, content, prompt)
 
     # Stream with an inactivity timeout. `asyncio.timeout` bounds the wait for
     # the stream to start (connection + first token); the deadline is then
@@ -634,10 +861,46 @@ class Engine:
       val = self._DEFAULT_STREAM_TIMEOUT
     return val if val > 0 else self._DEFAULT_STREAM_TIMEOUT
 
-  def _build_prompt_with_attachments(self, content: str, attachments: list[dict]) -> str:
+  async def _render_attachments(self, attachments: list[dict], sections: list) -> AsyncIterator[AttachmentProgress]:
+    """
+    Render *attachments* into *sections* (in attachment order) on the
+    attachment worker pool, several at a time, yielding an
+    ``AttachmentProgress`` before starting and as each one finishes.
+
+    Stats, reads and PDF/DOCX/XLSX parsing all happen on the pool, so a large
+    attachment never blocks the event loop (the desktop UI or API clients).
+    """
+    total = len(attachments)
+    sections[:] = [None] * total
+    yield AttachmentProgress(done=0, total=total)
+
+    loop = asyncio.get_running_loop()
+    pool = self._attachment_pool()
+
+    async def render(i: int, a: dict) -> str:
+      sections[i] = await loop.run_in_executor(pool, self._render_attachment, a)
+      return a.get("name", a.get("path", ""))
+
+    tasks = [asyncio.ensure_future(render(i, a)) for i, a in enumerate(attachments)]
+    try:
+      for done, next_done in enumerate(asyncio.as_completed(tasks), 1):
+        yield AttachmentProgress(done=done, total=total, name=await next_done)
+    finally:
+      for task in tasks:
+        task.cancel()
+
+  def _attachment_pool(self) -> ThreadPoolExecutor:
+    """ Lazily create the bounded pool attachments are rendered on """
+    if self._attachment_executor is None:
+      self._attachment_executor = ThreadPoolExecutor(
+        max_workers=self._ATTACHMENT_WORKERS, thread_name_prefix="attachments",
+      )
+    return self._attachment_executor
+
+  def _render_attachment(self, a: dict) -> Optional[str]:
     """
-    Given a list of attachment dicts (each with 'path', 'type', 'name') build a
-    context preamble that inlines file contents or directory listings using a
+    Render one attachment dict (with 'path', 'type', 'name') as a prompt
+    section that inlines its file contents or directory listing, using a
     tiered strategy based on file size:
 
       < 2 MB   — Full load: entire file text is inlined.
@@ -646,115 +909,99 @@ class Engine:
       > 10 MB  — RAG hint: only metadata is inlined; the model should use
                  search_in_file() then read_range() to access content.
 
-    Directories are always listed one level deep.
-    The original user message is appended at the end.
+    Directories are always listed one level deep. Blocking; runs on the
+    attachment pool (see :meth:`_render_attachments`).
     """
     _FULL_LIMIT    =  2_000_000   #  2 MB
     _CHUNKED_LIMIT = 10_000_000   # 10 MB
 
-    if not attachments:
-      return content
-
-    sections: list[str] = []
-    for a in attachments:
-      path = a.get("path", "")
-      kind = a.get("type", "file")
-      name = a.get("name", path)
-
-      if kind == "file":
-        try:
-          p = pathlib.Path(path)
-          if not p.exists() or not p.is_file():
-            sections.append(f"### File: {name}\n[File not found: {path}]")
-            continue
+    path = a.get("path", "")
+    kind = a.get("type", "file")
+    name = a.get("name", path)
 
-          size_bytes = p.stat().st_size
-          ext = p.suffix.lower()
-
-          # Structured formats: extract text then apply size tiers
-          if ext == ".docx":
-            doc = _docx.Document(p)
-            text = "\n".join(para.text for para in doc.paragraphs)
-          elif ext == ".xlsx":
-            wb = _openpyxl.load_workbook(p, data_only=True, read_only=True)
-            rows = []
-            for sheet in wb.worksheets:
-              rows.append(f"--- Sheet: {sheet.title} ---")
-              for row in sheet.iter_rows(values_only=True):
-                if any(cell is not None for cell in row):
-                  rows.append("\t".join(str(c) if c is not None else "" for c in row))
-            text = "\n".join(rows)
-          elif ext == ".pdf":
-            reader = _pypdf.PdfReader(p)
-            pages = []
-            for i, page in enumerate(reader.pages):
-              t = page.extract_text()
-              if t:
-                pages.append(f"--- Page {i+1} ---\n{t}")
-            text = "\n".join(pages)
+    if kind == "file":
+      try:
+        p = pathlib.Path(path)
+        if not p.exists() or not p.is_file():
+          return f"### File: {name}\n[File not found: {path}]"
+
+        size_bytes = p.stat().st_size
+        ext = p.suffix.lower()
+
+        # Structured formats: extract text (cached across sends) then apply size tiers
+        if ext in STRUCTURED_EXTS:
+          cache = getattr(self, "extraction_cache", None)
+          text = cache.extract_text(p) if cache is not None else extract_text(p)
+        else:
+          # Plain text
+          raw = p.read_bytes()
+          text = raw.decode("utf-8", errors="replace")
+
+        char_count = len(text)
+
+        if char_count <= _FULL_LIMIT:
+          return f"### File: {name}\n```\n{text}\n```"
+
+        elif char_count <= _CHUNKED_LIMIT:
+          # Skeleton: structural lines + head + tail
+          lines = text.splitlines()
+          total = len(lines)
+          if ext == ".py":
+            pat = re.compile(r"^\s*(class |def |async def |@|\bimport |\bfrom )")
+          elif ext in (".md", ".markdown", ".rst"):
+            pat = re.compile(r"^(#{1,6} |={3,}|-{3,})")
           else:
-            # Plain text
-            raw = p.read_bytes()
-            text = raw.decode("utf-8", errors="replace")
-
-          char_count = len(text)
-
-          if char_count <= _FULL_LIMIT:
-            sections.append(f"### File: {name}\n```\n{text}\n```")
-
-          elif char_count <= _CHUNKED_LIMIT:
-            # Skeleton: structural lines + head + tail
-            lines = text.splitlines()
-            total = len(lines)
-            if ext == ".py":
-              pat = re.compile(r"^\s*(class |def |async def |@|\bimport |\bfrom )")
-            elif ext in (".md", ".markdown", ".rst"):
-              pat = re.compile(r"^(#{1,6} |={3,}|-{3,})")
-            else:
-              pat = re.compile(r"^\s*(class |def |function |public |private |export |import |from )")
-
-            skeleton = [f"{i+1:>6}: {l}" for i, l in enumerate(lines) if pat.match(l)]
-            head = [f"{i+1:>6}: {lines[i]}" for i in range(min(20, total))]
-            tail = [f"{i+1:>6}: {lines[i]}" for i in range(max(0, total - 20), total)]
-            body = (
-              f"[SKELETON — {name} is {size_bytes:,} bytes ({total:,} lines). "
-              f"Use read_range() for specific lines.]\n\n"
-              "── First 20 lines ──\n" + "\n".join(head) + "\n\n"
-              f"── Structural lines ({len(skeleton)} found) ──\n" + "\n".join(skeleton) + "\n\n"
-              "── Last 20 lines ──\n" + "\n".join(tail)
-            )
-            sections.append(f"### File: {name}\n{body}")
+            pat = re.compile(r"^\s*(class |def |function |public |private |export |import |from )")
+
+          skeleton = [f"{i+1:>6}: {l}" for i, l in enumerate(lines) if pat.match(l)]
+          head = [f"{i+1:>6}: {lines[i]}" for i in range(min(20, total))]
+          tail = [f"{i+1:>6}: {lines[i]}" for i in range(max(0, total - 20), total)]
+          body = (
+            f"[SKELETON — {name} is {size_bytes:,} bytes ({total:,} lines). "
+            f"Use read_range() for specific lines.]\n\n"
+            "── First 20 lines ──\n" + "\n".join(head) + "\n\n"
+            f"── Structural lines ({len(skeleton)} found) ──\n" + "\n".join(skeleton) + "\n\n"
+            "── Last 20 lines ──\n" + "\n".join(tail)
+          )
+          return f"### File: {name}\n{body}"
+
+        else:
+          return (
+            f"### File: {name}\n"
+            f"[RAG MODE — file is {size_bytes:,} bytes (> 10 MB). "
+            f"Use search_in_file(path='{path}', query='...') to find relevant lines, "
+            f"then read_range(path='{path}', start_line=N, end_line=M) to read them.]"
+          )
 
-          else:
-            sections.append(
-              f"### File: {name}\n"
-              f"[RAG MODE — file is {size_bytes:,} bytes (> 10 MB). "
-              f"Use search_in_file(path='{path}', query='...') to find relevant lines, "
-              f"then read_range(path='{path}', start_line=N, end_line=M) to read them.]"
-            )
-
-        except Exception as exc:
-          sections.append(f"### File: {name}\n[Error reading file: {exc}]")
-
-      elif kind == "folder":
-        try:
-          p = pathlib.Path(path)
-          if not p.exists() or not p.is_dir():
-            sections.append(f"### Folder: {name}\n[Directory not found: {path}]")
-            continue
-          entries = []
-          for child in sorted(p.iterdir()):
-            prefix = "📁 " if child.is_dir() else "📄 "
-            try:
-              size = f"  ({child.stat().st_size:,} B)" if child.is_file() else ""
-            except OSError:
-              size = ""
-            entries.append(f"  {prefix}{child.name}{size}")
-          listing = "\n".join(entries) if entries else "  (empty)"
-          sections.append(f"### Folder: {name} ({path})\n{listing}")
-        except Exception as exc:
-          sections.append(f"### Folder: {name}\n[Error listing directory: {exc}]")
+      except Exception as exc:
+        return f"### File: {name}\n[Error reading file: {exc}]"
+
+    elif kind == "folder":
+      try:
+        p = pathlib.Path(path)
+        if not p.exists() or not p.is_dir():
+          return f"### Folder: {name}\n[Directory not found: {path}]"
+        entries = []
+        for child in sorted(p.iterdir()):
+          prefix = "📁 " if child.is_dir() else "📄 "
+          try:
+            size = f"  ({child.stat().st_size:,} B)" if child.is_file() else ""
+          except OSError:
+            size = ""
+          entries.append(f"  {prefix}{child.name}{size}")
+        listing = "\n".join(entries) if entries else "  (empty)"
+        return f"### Folder: {name} ({path})\n{listing}"
+      except Exception as exc:
+        return f"### Folder: {name}\n[Error listing directory: {exc}]"
 
+    return None
+
+  @staticmethod
+  def _build_prompt_with_attachments(content: str, sections: list) -> str:
+    """ Prefix *content* with the rendered attachment *sections* """
+    sections = [section for section in sections if section]
+    if not sections:
+      return content
     preamble = (
       "The user has attached the following files and folders. "
       "Use this content to answer their question.\n\n"
@@ -763,9 +1010,58 @@ class Engine:
     )
     return preamble + content
 
+  async def _add_workspace_context(self, workspace_id: Optional[int], query: str, prompt: str) -> str:
+    """Prepend the workspace excerpts most relevant to *query* to *prompt*.
+
+    Searches the message's content words only, and keeps hits whose BM25 or
+    cosine score clears ``_WORKSPACE_CONTEXT_MIN_BM25``/``_MIN_COSINE``, so
+    small talk pulls nothing in. Runs on every turn, so it is bounded by
+    ``_WORKSPACE_CONTEXT_TIMEOUT`` and never builds a vector index (BM25 only
+    until one is loaded). A disabled setting, a failure or a timeout leaves
+    *prompt* unchanged.
+    """
+    terms = content_query(query)
+    if not self._workspace_context or not workspace_id or not terms:
+      return prompt
+    try:
+      async with asyncio.timeout(self._WORKSPACE_CONTEXT_TIMEOUT):
+        hits = await self.search_workspace(
+          workspace_id, terms,
+          limit=self._WORKSPACE_CONTEXT_HITS, neighbours=self._WORKSPACE_CONTEXT_NEIGHBOURS,
+          build_index=False,
+        )
+    except Exception as exc:
+      logger.warning(f"Workspace retrieval failed; continuing without it: {exc!r}")
+      return prompt
+    hits = [
+      hit for hit in hits
+      if (hit.bm25 or 0.0) >= self._WORKSPACE_CONTEXT_MIN_BM25
+      or (hit.cosine or 0.0) >= self._WORKSPACE_CONTEXT_MIN_COSINE
+    ]
+    return self._build_prompt_with_workspace_context(prompt, hits)
+
+  @staticmethod
+  def _build_prompt_with_workspace_context(prompt: str, hits: list[ChunkHit]) -> str:
+    """ Prefix *prompt* with excerpts of the retrieved workspace chunks """
+    if not hits:
+      return prompt
+    sections = []
+    for hit in hits:
+      start = hit.context_start_line or hit.start_line
+      end = hit.context_end_line or hit.end_line
+      where = f" (lines {start}–{end})" if start is not None else ""
+      sections.append(f"### Excerpt: {hit.path}{where}\n```\n{hit.context or hit.content}\n```")
+    preamble = (
+      "Excerpts from the workspace's indexed files that may be relevant. "
+      "Use read_range() on the file for more context.\n\n"
+      + "\n\n".join(sections)
+      + "\n\n---\n\n"
+    )
+    return preamble + prompt
+
   async def update_thread_title(self, thread_id: int, title: str) -> None:
     """Update the thread title (called after the first exchange if desired)."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       thread = await session.get(Thread, thread_id)
       if thread:
         thread.title = title  # type: ignore[assignment]
@@ -789,7 +1085,7 @@ class Engine:
     Pass 'default' when the user has selected the first/default model so that
     future changes to the model list don't lock the thread to a stale ID.
     """
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       await session.execute(
         sql_update(Thread)
         .where(Thread.id == thread_id)
@@ -837,11 +1133,13 @@ class Engine:
 
   async def set_workspace_directories(self, workspace_id: int, directories: list) -> None:
     """Persist the list of directory paths attached to a workspace."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       ws = await session.get(Workspace, workspace_id)
       if ws:
         ws.directories = json.dumps(directories)
         await session.commit()
+    if self._index_watch:
+      self.watcher.watch(workspace_id, directories)
 
   # ------------------------------------------------------------------
   # Retrieval (RAG) — directory indexing + search
@@ -850,60 +1148,135 @@ class Engine:
   def reindex_workspace(self, workspace_id: int, workspace_name: str = "workspace") -> Optional[str]:
     """Kick off (as a background job) an incremental re-index of a workspace's
     attached directories. Returns the job id, or None when nothing to index.
+
+    The job can be cancelled, paused and resumed through ``self.jobs`` and
+    resumes from its checkpoint after a restart. A workspace already being
+    indexed keeps its job (a paused one is resumed).
     """
-    indexer = getattr(self, "indexer", None)
-    if indexer is None:
+    if getattr(self, "indexer", None) is None:
       return None
+    job = self.jobs.find("index", workspace_id=workspace_id)
+    if job is not None:
+      self.jobs.resume(job.id)
+      return job.id
+    job = self.jobs.start(
+      "index", f"Indexing {workspace_name}",
+      {"workspace_id": workspace_id, "workspace_name": workspace_name},
+    )
+    return job.id
 
-    job = self.jobs.create("index", f"Indexing {workspace_name}")
+  async def _run_index_job(self, job: Job) -> str:
+    """ Runner for "index" jobs (see :meth:`reindex_workspace`) """
+    workspace_id = job.params["workspace_id"]
+    workspace_name = job.params.get("workspace_name", "workspace")
+    try:
+      directories = await self.get_workspace_directories(workspace_id)
+      # Run even with no directories: the indexer prunes documents whose
+      # source directory was detached.
+      await self.indexer.reindex(workspace_id, directories, job)
+    except Exception as exc:
+      logger.error(f"Workspace indexing failed ({workspace_id}): {exc}")
+      await self.show_notification("Indexing failed", str(exc))
+      raise
+    await self.show_notification(
+      "Indexing complete", f"{workspace_name}: {job.message or 'done'}"
+    )
+    return job.message or "Indexing complete"
 
-    async def _run():
-      try:
-        directories = await self.get_workspace_directories(workspace_id)
-        # Run even with no directories: the indexer prunes documents whose
-        # source directory was detached.
-        await indexer.reindex(workspace_id, directories, job)
-        self.jobs.complete(job, job.message or "Indexing complete")
-        await self.show_notification(
-          "Indexing complete", f"{workspace_name}: {job.message or 'done'}"
-        )
-      except Exception as exc:
-        logger.error(f"Workspace indexing failed ({workspace_id}): {exc}")
-        self.jobs.fail(job, str(exc))
-        await self.show_notification("Indexing failed", str(exc))
+  async def _seed_index_watch(self) -> None:
+    """ Start live indexing if the ``index_watch`` setting is on and follow
+        later changes to it. """
+    self.register_setting_callback("index_watch", self._on_index_watch_changed)
+    try:
+      enabled = await self.get_setting("index_watch", tag="system") == "true"
+    except Exception as exc:
+      logger.warning(f"Failed to read index_watch; leaving live indexing off: {exc}")
+      return
+    if enabled:
+      await self.set_index_watch(True)
 
-    asyncio.create_task(_run())
-    return job.id
+  async def _on_index_watch_changed(self, key: str, value: str, tag: str) -> None:
+    """ Setting callback: toggle live indexing """
+    await self.set_index_watch(value == "true")
+
+  async def set_index_watch(self, enabled: bool) -> None:
+    """Turn live indexing of every workspace's attached directories on or off.
+    While on, changes are indexed within seconds of happening (see WorkspaceWatcher).
+    """
+    self._index_watch = enabled
+    if not enabled:
+      await self.watcher.close()
+      return
+    async with self.db.get_session() as session:
+      rows = (await session.execute(select(Workspace.id, Workspace.directories))).all()
+    for workspace_id, raw in rows:
+      directories = self._parse_json_list(raw)
+      if directories:
+        self.watcher.watch(workspace_id, directories)
 
-  async def search_workspace(self, workspace_id: int, query: str, limit: int = 8) -> list[dict]:
+  # ------------------------------------------------------------------
+  # History compaction — rolling per-thread summaries
+  # ------------------------------------------------------------------
+
+  def compact_thread(
+    self,
+    thread_id: int,
+    model_cfg: dict,
+    until: tuple[datetime, int],
+  ) -> Optional[str]:
+    """Kick off (as a background job) folding a thread's messages older than
+    *until* into its rolling summary. Returns the job id, or None when no
+    compaction is possible or one is already running for the thread.
+    """
+    compactor = getattr(self, "compactor", None)
+    if (
+      compactor is None
+      or thread_id in self._compacting
+      or self.jobs.find("compact", thread_id=thread_id) is not None
+    ):
+      return None
+    agent = self.agent_manager.build_agent({**model_cfg, "system_prompt": SUMMARY_SYSTEM_PROMPT})
+    if isinstance(agent, EchoProvider):
+      return None
+    timeout_s = self._resolve_stream_timeout(model_cfg)
+
+    async def _summarise(prompt: str) -> str:
+      async with asyncio.timeout(timeout_s):
+        result = await agent.run(prompt)
+      return str(result.output)
+
+    async def _run(job: Job) -> str:
+      # Marked only while the task runs, so a job cancelled before it starts
+      # (or paused and later resumed) can't leave the thread stuck.
+      self._compacting.add(thread_id)
+      try:
+        await compactor.compact(thread_id, until, _summarise, job)
+      finally:
+        self._compacting.discard(thread_id)
+      return job.message or "History summarised"
+
+    return self.jobs.start(
+      "compact", "Summarising conversation history", {"thread_id": thread_id}, run=_run,
+    ).id
+
+  async def search_workspace(
+    self, workspace_id: int, query: str, limit: int = 8, neighbours: int = 0,
+    build_index: bool = True,
+  ) -> list[ChunkHit]:
     """Retrieve the most relevant indexed chunks for *query* within a workspace.
 
-    Baseline keyword retrieval over the chunk store. Phase 2 replaces this with
-    a vector similarity query once ``DocumentChunk.embedding`` is populated.
+    BM25-ranked full-text search over the chunk store (see ``retrieval``):
+    words, "quoted phrases" and prefix* terms, each hit with a snippet and the
+    line range of the match. With an embedder configured the BM25 hits are
+    fused with cosine-similarity hits from the workspace's vector index.
+    *neighbours* > 0 adds that many surrounding chunks as each hit's context;
+    with *build_index* off a missing or stale vector index is skipped, not rebuilt.
     """
-    if not query or not query.strip() or not workspace_id:
-      return []
-    like = f"%{query.strip()}%"
-    async with self.db.get_session() as session:
-      rows = await session.scalars(
-        select(DocumentChunk)
-        .where(
-          DocumentChunk.workspace_id == workspace_id,
-          DocumentChunk.content.like(like),
-        )
-        .limit(limit)
-      )
-      chunks = rows.all()
-      results: list[dict] = []
-      for c in chunks:
-        doc = await session.get(IndexedDocument, c.document_id)
-        results.append({
-          "path": doc.path if doc else "",
-          "start_line": c.start_line,
-          "end_line": c.end_line,
-          "content": c.content,
-        })
-      return results
+    return await retrieve(
+      self.db, workspace_id, query, limit=limit, neighbours=neighbours,
+      embedder=getattr(self, "embedder", None), vectors=getattr(self, "vectors", None),
+      build_index=build_index,
+    )
 
   async def get_workspace_tools_config(self, workspace_id: int) -> dict:
     """Return the persisted tools_config for a workspace ({} if unset)."""
@@ -915,7 +1288,7 @@ class Engine:
 
   async def set_workspace_tools_config(self, workspace_id: int, config: dict) -> None:
     """Persist the tools_config for a workspace."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       ws = await session.get(Workspace, workspace_id)
       if ws:
         ws.tools_config = json.dumps(config)
@@ -931,7 +1304,7 @@ class Engine:
 
   async def set_workspace_skills_config(self, workspace_id: int, config: dict) -> None:
     """Persist the skills_config for a workspace."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       ws = await session.get(Workspace, workspace_id)
       if ws:
         ws.skills_config = json.dumps(config)
@@ -949,7 +1322,7 @@ class Engine:
 
   async def set_thread_tools_config(self, thread_id: int, config: dict) -> None:
     """Persist a thread-level tools_config override."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       th = await session.get(Thread, thread_id)
       if th:
         th.tools_config = json.dumps(config)
@@ -967,7 +1340,7 @@ class Engine:
 
   async def set_thread_skills_config(self, thread_id: int, config: dict) -> None:
     """Persist a thread-level skills_config override."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       th = await session.get(Thread, thread_id)
       if th:
         th.skills_config = json.dumps(config)
@@ -1029,7 +1402,7 @@ class Engine:
 
   async def set_workspace_approval_config(self, workspace_id: int, config: dict) -> None:
     """Persist the approval policy for a workspace."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       ws = await session.get(Workspace, workspace_id)
       if ws:
         ws.approval_config = json.dumps(self._normalize_approval_config(config))
@@ -1047,7 +1420,7 @@ class Engine:
 
   async def set_thread_approval_config(self, thread_id: int, config: dict) -> None:
     """Persist a thread-level approval override."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       th = await session.get(Thread, thread_id)
       if th:
         th.approval_config = json.dumps(self._normalize_approval_config(config))
@@ -1137,6 +1510,36 @@ class Engine:
       except asyncio.CancelledError:
         pass
     
+    if hasattr(self, 'watcher'):
+      await self.watcher.close()
+
+    # Running jobs keep their checkpoints and resume on the next start.
+    if hasattr(self, 'jobs'):
+      await self.jobs.close()
+
+    if hasattr(self, 'indexer'):
+      self.indexer.close()
+
+    if hasattr(self, 'vectors'):
+      self.vectors.close()
+
+    if self._attachment_executor is not None:
+      self._attachment_executor.shutdown(wait=False, cancel_futures=True)
+      self._attachment_executor = None
+
+    aclose = getattr(getattr(self, 'embedder', None), 'aclose', None)
+    if aclose is not None:
+      try:
+        await aclose()
+      except Exception as exc:
+        logger.debug(f"Engine stop_engine: embedder close failed: {exc}")
+
+    if hasattr(self, 'event_store'):
+      try:
+        await asyncio.wait_for(self.event_store.close(self.events.last_seq), timeout=1.0)
+      except asyncio.TimeoutError:
+        logger.warning("Engine stop_engine: event_store.close() timed out.")
+
     if hasattr(self, 'db'):
       try:
         await asyncio.wait_for(self.db.close(), timeout=1.0)
@@ -1162,7 +1565,7 @@ class Engine:
 
   async def update_setting(self, key: str, value: str, tag: str = "system"):
     """ Update a setting in the database and notify any registered UI callbacks. """
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       insert_values = {
         "key": key,
         "tag": tag,
@@ -1203,7 +1606,7 @@ class Engine:
 
   async def save_ui_state(self, key: str, value: str) -> None:
     """Upsert a UI state entry in app_state (tag='ui_state')."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       existing = await session.scalar(
         select(AppState).where(AppState.key == key, AppState.tag == "ui_state")
       )
@@ -1341,7 +1744,7 @@ class Engine:
     #   logger.error(f"Skill install error for {skill_uuid}: {exc}")
     #   status = "error"
 
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       row = await session.scalar(
         select(SkillRegistry).where(SkillRegistry.uuid == skill_uuid)
       )
@@ -1372,7 +1775,7 @@ class Engine:
 
   async def delete_skill_config(self, skill_uuid: str) -> None:
     """Remove a skill from the registry and delete its installed package files."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       row = await session.scalar(
         select(SkillRegistry).where(SkillRegistry.uuid == skill_uuid)
       )
@@ -1425,7 +1828,7 @@ class Engine:
       if env_var:
         os.environ[env_var] = api_key
 
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       row = await session.scalar(
         select(ToolRegistryModel).where(ToolRegistryModel.uuid == tool_uuid)
       )
@@ -1459,7 +1862,7 @@ class Engine:
     self.config.secrets.get("tools", {}).pop(tool_uuid, None)
     await self.config.write_keyring()
 
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       row = await session.scalar(
         select(ToolRegistryModel).where(ToolRegistryModel.uuid == tool_uuid)
       )
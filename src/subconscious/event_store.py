@@ -0,0 +1,151 @@
+""" SQLite persistence for the EventBus replay log.
+
+    Events are buffered in memory and written in batches shortly after they
+    are published, so the hot publish path never waits on the database. Only
+    the newest ``keep`` events are retained; older rows are pruned on flush.
+
+    Because the newest batch can be lost in a crash, the store also keeps a
+    sequence high-water mark in ``app_state``: the bus reserves ``seq`` numbers
+    in blocks (:meth:`SQLiteEventStore.reserve`) before handing them out, and a
+    clean :meth:`SQLiteEventStore.close` records exactly where it stopped. After
+    a crash the bus resumes past the reservation instead of re-issuing numbers
+    that may already have gone to clients.
+"""
+from __future__ import annotations
+
+import json
+import asyncio
+import logging
+from typing import Any, Optional
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from .db.models import AppState, EventLog
+
+
+logger = logging.getLogger("subconscious")
+
+
+class SQLiteEventStore:
+  """ ``EventStore`` backed by the ``event_log`` table """
+
+  _KEEP = 10_000          # events retained for replay
+  _FLUSH_DELAY = 0.25     # seconds to batch events before writing
+  _TAG = "event_log"      # app_state tag of the high-water mark rows
+
+  def __init__(self, db, keep: Optional[int] = None):
+    self.db = db
+    self.keep = keep or self._KEEP
+    self._pending: list[dict[str, Any]] = []
+    self._flush_task: Optional[asyncio.Task] = None
+    self._writing = False   # the flush task is past its delay and mid-write
+    self._closed = False
+
+  def append(self, event: dict[str, Any]) -> None:
+    """ Queue *event* for the next batched write """
+    self._pending.append(event)
+    if self._flush_task is None or self._flush_task.done():
+      self._flush_task = asyncio.create_task(self._flush_later())
+
+  async def _flush_later(self) -> None:
+    await asyncio.sleep(self._FLUSH_DELAY)
+    self._writing = True
+    try:
+      await self.flush()
+    finally:
+      self._writing = False
+
+  async def flush(self) -> None:
+    """ Write every queued event and prune rows beyond the retention window """
+    if not self._pending:
+      return
+    batch, self._pending = self._pending, []
+    rows = [
+      {"seq": e["seq"], "type": str(e.get("type", "")), "payload": json.dumps(e, default=str)}
+      for e in batch
+    ]
+    try:
+      async with self.db.write_session() as session:
+        await session.execute(insert(EventLog), rows)
+        await session.execute(delete(EventLog).where(EventLog.seq <= batch[-1]["seq"] - self.keep))
+        await session.commit()
+    except Exception as exc:  # losing replay history must never break publishing
+      logger.warning(f"Event log flush failed ({len(rows)} events): {exc}")
+
+  async def close(self, seq: Optional[int] = None) -> None:
+    """ Flush anything still buffered (call before the database closes).
+
+        *seq* is the last sequence number the bus handed out; recording it
+        marks the shutdown as clean, so the next run carries on right after it.
+    """
+    self._closed = True     # a late reservation must not clear the stop mark
+    task, self._flush_task = self._flush_task, None
+    if task is not None and not task.done():
+      if not self._writing:
+        task.cancel()           # still waiting out the delay: nothing taken yet
+      await asyncio.wait([task])  # a batch already taken must reach the table
+    await self.flush()
+    if seq is not None:
+      try:
+        async with self.db.write_session() as session:
+          await session.execute(self._mark("seq_stopped", seq))
+          await session.commit()
+      except Exception as exc:
+        logger.warning(f"Event log stop mark failed: {exc}")
+
+  async def reserve(self, seq: int) -> int:
+    """ Persist *seq* as the highest number the bus may hand out, and return it.
+
+        Also clears the clean-stop mark: from here on an unflushed batch can
+        be lost, so a restart must not reuse anything up to *seq*.
+    """
+    if self._closed:
+      return seq
+    try:
+      async with self.db.write_session() as session:
+        await session.execute(self._mark("seq_reserved", seq))
+        await session.execute(
+          delete(AppState).where(AppState.tag == self._TAG, AppState.key == "seq_stopped")
+        )
+        await session.commit()
+    except Exception as exc:  # as with flush, this must never break publishing
+
+      logger.warning(f"Event log seq reservation failed: {exc}")
+    return seq
+
+  async def high_water(self) -> tuple[int, bool]:
+    """ The persisted high-water mark, and whether the last run stopped cleanly
+        (in which case it is the exact last seq rather than a reservation).
+    """
+    async with self.db.get_session() as session:
+      marks = dict((await session.execute(
+        select(AppState.key, AppState.value).where(AppState.tag == self._TAG)
+      )).all())
+    if "seq_stopped" in marks:
+      return int(marks["seq_stopped"]), True
+    return int(marks.get("seq_reserved") or 0), False
+
+  def _mark(self, key: str, seq: int):
+    stmt = sqlite_insert(AppState).values(key=key, tag=self._TAG, value=str(seq))
+    return stmt.on_conflict_do_update(
+      index_elements=[AppState.tag, AppState.key],
+      set_={"value": stmt.excluded.value},
+    )
+
+  async def last_seq(self) -> int:
+    async with self.db.get_session() as session:
+      return int(await session.scalar(select(func.max(EventLog.seq))) or 0)
+
+  async def floor(self) -> int:
+    """ Replay from the table is complete for any ``since`` >= this value """
+    async with self.db.get_session() as session:
+      oldest = await session.scalar(select(func.min(EventLog.seq)))
+    return int(oldest) - 1 if oldest is not None else await self.last_seq()
+
+  async def since(self, seq: int) -> list[dict[str, Any]]:
+    async with self.db.get_session() as session:
+      payloads = (await session.scalars(
+        select(EventLog.payload).where(EventLog.seq > seq).order_by(EventLog.seq)
+      )).all()
+    return [json.loads(p) for p in payloads]
@@ -5,45 +5,270 @@
     future sync module — can subscribe to receive them. Living in its own module
     keeps it free of engine/api imports so either side can depend on it without a
     circular import.
+
+    Every event is stamped with a monotonically increasing ``seq`` and kept in a
+    bounded ring buffer (optionally mirrored to an :class:`EventStore`), so a
+    subscriber that reconnects — or notices a gap in ``seq`` — can ask for just
+    the events it missed with :meth:`EventBus.replay`.
+
+    Subscribers may narrow what they receive to event-type topics (exact types
+    like ``"message.created"`` or prefixes like ``"job.*"``) and to a
+    ``workspace_uuid`` / ``thread_uuid``. Subscriptions are indexed by topic so
+    publishing only visits the subscribers whose topics match.
 """
 from __future__ import annotations
 
 import asyncio
 import logging
-from typing import Any
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Iterable, Optional, Protocol
 
 
 # Loggin setup
 logger = logging.getLogger("subconscious")
 
 
+class EventStore(Protocol):
+  """ Durable backing for the replay log (see ``event_store.SQLiteEventStore``) """
+  def append(self, event: dict[str, Any]) -> None: ...
+  async def last_seq(self) -> int: ...
+  async def reserve(self, seq: int) -> int: ...
+  async def high_water(self) -> tuple[int, bool]: ...
+  async def floor(self) -> int: ...
+  async def since(self, seq: int) -> list[dict[str, Any]]: ...
+
+
+# Topic key that matches every event type.
+ALL_TOPICS = "*"
+
+
+def _topic_keys(event_type: str) -> list[str]:
+  """ Index keys an event of *event_type* is delivered under:
+      ``*``, the exact type, and a ``<prefix>.*`` key per dotted prefix.
+  """
+  keys = [ALL_TOPICS, event_type]
+  parts = event_type.split(".")
+  keys.extend(".".join(parts[:i]) + ".*" for i in range(1, len(parts)))
+  return keys
+
+
+def _normalize_topics(types: Optional[Iterable[str]]) -> frozenset[str]:
+  """ Canonical topic keys for a subscription (``"job"`` → ``"job.*"``) """
+  if not types:
+    return frozenset({ALL_TOPICS})
+  topics = set()
+  for t in types:
+    t = (t or "").strip()
+    if not t or t == ALL_TOPICS:
+      return frozenset({ALL_TOPICS})
+    topics.add(t if "." in t else f"{t}.*")
+  return frozenset(topics)
+
+
+@dataclass
+class Subscription:
+  """ A subscriber's queue plus the filters applied before delivery.
+
+      Scope filters only reject events that carry the field with a different
+      value; events without it (e.g. ``job.*``) pass. ``thread.*`` events
+      carry their thread's id as ``uuid``, which counts as its ``thread_uuid``.
+  """
+  queue: asyncio.Queue
+  topics: frozenset[str]
+  workspace_uuid: Optional[str] = None
+  thread_uuid: Optional[str] = None
+
+  def accepts(self, event: dict[str, Any]) -> bool:
+    """ Whether *event* passes the topic and scope filters """
+    if ALL_TOPICS not in self.topics and not self.topics.intersection(_topic_keys(str(event.get("type", "")))):
+      return False
+    return self._in_scope(event)
+
+  def _in_scope(self, event: dict[str, Any]) -> bool:
+    data = event.get("data") or {}
+    if not isinstance(data, dict):
+      return True
+    thread = data.get("thread_uuid")
+    if thread is None and str(event.get("type", "")).startswith("thread."):
+      thread = data.get("uuid")
+    for value, wanted in ((data.get("workspace_uuid"), self.workspace_uuid), (thread, self.thread_uuid)):
+      if wanted is not None and value is not None and value != wanted:
+        return False
+    return True
+
+
 class EventBus:
   """ Fan-out async event bus backed by per-subscriber queues """
-  def __init__(self, max_queue: int = 1000) -> None:
+
+  # Event types that are transient state snapshots rather than history. They
+  # are sequenced like everything else but not kept for replay.
+  _UNLOGGED_PREFIXES = ("job.",)
+
+  # With a store attached, seq numbers are reserved this many at a time
+  # before being handed out (see SQLiteEventStore.reserve).
+  _SEQ_BLOCK = 1000
+
+  def __init__(self, max_queue: int = 1000, history: int = 1024) -> None:
     self._max_queue = max_queue
-    self._subscribers: set[asyncio.Queue] = set()
+    self._subscribers: dict[asyncio.Queue, Subscription] = {}
+    self._by_topic: dict[str, set[asyncio.Queue]] = {}
+    self._seq = 0
+    self._log: deque[dict[str, Any]] = deque(maxlen=history)
+    # Replay from the ring is complete for any `since` >= _floor (the seq of
+    # the newest event that has been evicted).
+    self._floor = 0
+    self._store: Optional[EventStore] = None
+    self._reserved = 0                          # highest seq persisted as reserved
+    self._reserving: Optional[asyncio.Task] = None
+    # Replay must not vouch for anything below this: after a crash, the
+    # numbers up to it may have gone to events that never reached the store.
+    self._lost_below = 0
+
+  async def attach_store(self, store: EventStore) -> None:
+    """ Mirror the log to *store* and continue its sequence numbering.
+
+        After a clean stop numbering carries on from where it stopped; after
+        a crash it resumes past the last reservation, so no seq a client may
+        already have seen is issued again for a different event.
+    """
+    self._store = store
+    last = await store.last_seq()
+    mark, clean = await store.high_water()
+    start = max(last, mark)
+    if start > self._seq:
+      self._seq = start
+      self._floor = max(self._floor, start)
+    if not clean and mark > last:
+      self._lost_below = self._seq
+    self._reserved = await store.reserve(self._seq + self._SEQ_BLOCK)
+
+  def subscribe(
+    self,
+    types: Optional[Iterable[str]] = None,
+    *,
+    workspace_uuid: Optional[str] = None,
+    thread_uuid: Optional[str] = None,
+  ) -> asyncio.Queue:
+    """ Register a new subscriber and return its queue.
 
-  def subscribe(self) -> asyncio.Queue:
-    """ Register a new subscriber and return its queue """
+        With no arguments every event is delivered. *types* limits delivery to
+        exact event types and/or ``"<prefix>.*"`` topics; *workspace_uuid* and
+        *thread_uuid* drop events scoped to other workspaces/threads.
+    """
     q: asyncio.Queue = asyncio.Queue(maxsize=self._max_queue)
-    self._subscribers.add(q)
+    self._index(Subscription(q, _normalize_topics(types), workspace_uuid, thread_uuid))
     return q
 
+  def update_subscription(
+    self,
+    q: asyncio.Queue,
+    types: Optional[Iterable[str]] = None,
+    *,
+    workspace_uuid: Optional[str] = None,
+    thread_uuid: Optional[str] = None,
+  ) -> None:
+    """ Replace the filters of an existing subscriber (same arguments as subscribe) """
+    if q not in self._subscribers:
+      return
+    self._unindex(q)
+    self._index(Subscription(q, _normalize_topics(types), workspace_uuid, thread_uuid))
+
   def unsubscribe(self, q: asyncio.Queue) -> None:
     """ Remove a subscriber's queue """
-    self._subscribers.discard(q)
+    if q in self._subscribers:
+      self._unindex(q)
+
+  def has_subscribers(self, event_type: str) -> bool:
+    """ Whether any subscriber's topics match *event_type* (scope filters aside) """
+    return any(self._by_topic.get(key) for key in _topic_keys(event_type))
+
+  def _index(self, sub: Subscription) -> None:
+    self._subscribers[sub.queue] = sub
+    for topic in sub.topics:
+      self._by_topic.setdefault(topic, set()).add(sub.queue)
+
+  def _unindex(self, q: asyncio.Queue) -> None:
+    sub = self._subscribers.pop(q)
+    for topic in sub.topics:
+      queues = self._by_topic.get(topic)
+      if queues is not None:
+        queues.discard(q)
+        if not queues:
+          del self._by_topic[topic]
 
   async def publish(self, event: dict[str, Any]) -> None:
     """ Deliver *event* to every current subscriber. Never blocks the publisher:
         if a subscriber's queue is full the event is dropped for that subscriber
-        (a slow/closed client must not stall engine writes).
+        (a slow/closed client must not stall engine writes). Subscribers see the
+        resulting gap in ``seq`` and can fill it with :meth:`replay`.
     """
-    for q in list(self._subscribers):
+    if self._store is not None:
+      while self._seq >= self._reserved:
+        self._reserved = max(self._reserved, await asyncio.shield(self._reserve_ahead()))
+      if self._reserved - self._seq <= self._SEQ_BLOCK // 2:
+        self._reserve_ahead()
+    self._seq += 1
+    event = {**event, "seq": self._seq}
+    if not str(event.get("type", "")).startswith(self._UNLOGGED_PREFIXES):
+      if len(self._log) == self._log.maxlen:
+        self._floor = self._log[0]["seq"]
+      self._log.append(event)
+      if self._store is not None:
+        self._store.append(event)
+    matched: set[asyncio.Queue] = set()
+    for key in _topic_keys(str(event.get("type", ""))):
+      queues = self._by_topic.get(key)
+      if queues:
+        matched.update(queues)
+    for q in matched:
+      if not self._subscribers[q]._in_scope(event):
+        continue
       try:
         q.put_nowait(event)
       except asyncio.QueueFull:
         logger.warning("EventBus subscriber queue full; dropping event %s", event.get("type"))
 
+  def _reserve_ahead(self) -> asyncio.Task:
+    """ Start (or join) persisting the next block of seq numbers """
+    if self._reserving is None or self._reserving.done():
+      self._reserving = asyncio.create_task(self._store.reserve(self._seq + self._SEQ_BLOCK))
+      self._reserving.add_done_callback(self._reserved_to)
+    return self._reserving
+
+  def _reserved_to(self, task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is None:
+      self._reserved = max(self._reserved, task.result())
+
+  async def replay(self, since: int, q: Optional[asyncio.Queue] = None) -> Optional[list[dict[str, Any]]]:
+    """ Return the logged events with ``seq > since``, oldest first, limited
+        to those subscriber *q*'s filters accept when given.
+
+        Returns None when the gap can no longer be filled (it reaches past
+        everything retained, *since* is from a previous, unpersisted run, or
+        it falls in numbers a crash may have lost);
+        the caller must then resync from the REST endpoints.
+    """
+    if since > self._seq or since < self._lost_below:
+      return None
+    if since >= self._floor:
+      events = [e for e in self._log if e["seq"] > since]
+    elif self._store is None or since < await self._store.floor():
+      return None
+    else:
+      older = await self._store.since(since)
+      # Merge with the ring, which also holds events not yet flushed to the store.
+      merged = {e["seq"]: e for e in older}
+      merged.update((e["seq"], e) for e in self._log if e["seq"] > since)
+      events = [merged[seq] for seq in sorted(merged)]
+    sub = self._subscribers.get(q) if q is not None else None
+    return [e for e in events if sub.accepts(e)] if sub is not None else events
+
+  @property
+  def last_seq(self) -> int:
+    """ Sequence number of the most recently published event """
+    return self._seq
+
   @property
   def subscriber_count(self) -> int:
     return len(self._subscribers)
@@ -0,0 +1,261 @@
+""" Streaming text extraction for documents.
+
+    Each extractor is a generator that yields the document's text in blocks —
+    a PDF page, a few hundred spreadsheet rows, a run of paragraphs, a slice
+    of a text file — so callers can chunk, tier or truncate as they go and
+    never hold the whole extracted text (next to the parser's own objects) in
+    memory at once. ``"".join(iter_text(path))`` is exactly the text the
+    previous whole-document readers returned.
+
+    Parsers are imported lazily: pypdf, openpyxl and python-docx are only
+    loaded by the extractor that needs them.
+
+    ``ExtractionCache`` keeps extracted document text on disk, keyed by the
+    file's path, size and mtime, so the indexer, chat attachments and the
+    filesystem tools parse a given PDF/DOCX/XLSX once rather than on every
+    use. It is bounded by size and evicts least recently used entries.
+"""
+from __future__ import annotations
+
+import os
+import uuid
+import hashlib
+import logging
+import pathlib
+from typing import Iterator, Optional
+
+
+logger = logging.getLogger("subconscious")
+
+
+STRUCTURED_EXTS = {".pdf", ".docx", ".xlsx"}
+
+_TEXT_BLOCK_CHARS = 1 << 16     # characters per block when reading plain text
+_XLSX_BLOCK_ROWS = 500          # spreadsheet rows per block
+_DOCX_BLOCK_PARAGRAPHS = 200    # Word paragraphs per block
+
+
+def iter_pdf(path: pathlib.Path) -> Iterator[str]:
+  """ One block per page with text: ``--- Page N ---`` then the page text """
+  import pypdf
+  reader = pypdf.PdfReader(path)
+  sep = ""
+  for i, page in enumerate(reader.pages):
+    text = page.extract_text()
+    if text:
+      yield f"{sep}--- Page {i + 1} ---\n{text}"
+      sep = "\n"
+
+
+def iter_xlsx(path: pathlib.Path) -> Iterator[str]:
+  """ Sheet headers and tab-separated non-empty rows, in blocks of rows """
+  import openpyxl
+  wb = openpyxl.load_workbook(path, data_only=True, read_only=True)
+  try:
+    sep = ""
+    for sheet in wb.worksheets:
+      rows = [f"--- Sheet: {sheet.title} ---"]
+      for row in sheet.iter_rows(values_only=True):
+        if any(cell is not None for cell in row):
+          rows.append("\t".join(str(c) if c is not None else "" for c in row))
+          if len(rows) >= _XLSX_BLOCK_ROWS:
+            yield sep + "\n".join(rows)
+            sep, rows = "\n", []
+      if rows:
+        yield sep + "\n".join(rows)
+        sep = "\n"
+  finally:
+    wb.close()   # read-only workbooks keep the file open until closed
+
+
+def iter_docx(path: pathlib.Path) -> Iterator[str]:
+  """ Paragraph text, one line per paragraph, in blocks of paragraphs """
+  import docx
+  paragraphs = docx.Document(path).paragraphs
+  for i in range(0, len(paragraphs), _DOCX_BLOCK_PARAGRAPHS):
+    block = "\n".join(p.text for p in paragraphs[i:i + _DOCX_BLOCK_PARAGRAPHS])
+    yield block if i == 0 else "\n" + block
+
+
+def iter_plain(path: pathlib.Path, encoding: str = "utf-8", errors: str = "replace") -> Iterator[str]:
+  """ A text file in fixed-size blocks (newlines untranslated) """
+  with open(path, "r", encoding=encoding, errors=errors, newline="") as f:
+    for block in iter(lambda: f.read(_TEXT_BLOCK_CHARS), ""):
+      yield block
+
+
+def iter_text(path: pathlib.Path) -> Iterator[str]:
+  """ Blocks of extracted text for any supported file, chosen by extension """
+  path = pathlib.Path(path)
+  ext = path.suffix.lower()
+  if ext == ".pdf":
+    return iter_pdf(path)
+  if ext == ".xlsx":
+    return iter_xlsx(path)
+  if ext == ".docx":
+    return iter_docx(path)
+  return iter_plain(path)
+
+
+def extract_text(path: pathlib.Path) -> str:
+  """ The whole extracted text of *path* """
+  return "".join(iter_text(path))
+
+
+# ---------------------------------------------------------------------------
+# Extracted-text cache
+# ---------------------------------------------------------------------------
+
+class ExtractionCache:
+  """On-disk cache of extracted document text with LRU size-bounded eviction.
+
+  Entries are ``<directory>/<key[:2]>/<key>.txt`` where the key hashes the
+  resolved path, size, mtime and ``FORMAT`` (bump it when an extractor's
+  output changes). A hit bumps the entry's mtime, which is the LRU order.
+  Several processes may share a directory: entries are written to a temp file
+  and renamed into place, and each instance re-scans the directory to evict
+  after writing an eighth of the budget.
+  """
+
+  FORMAT = 1
+  DEFAULT_MAX_MB = 512
+
+  def __init__(self, directory: pathlib.Path, max_bytes: Optional[int] = None):
+    self.directory = pathlib.Path(directory)
+    self.max_bytes = self._resolve_max_bytes(max_bytes)
+    self._written = 0
+    self.hits = 0
+    self.misses = 0
+
+  @classmethod
+  def _resolve_max_bytes(cls, max_bytes: Optional[int]) -> int:
+    """ Explicit arg → ``SUBCONSCIOUS_EXTRACT_CACHE_MB`` → ``DEFAULT_MAX_MB`` """
+    if max_bytes is None:
+      try:
+        max_bytes = int(float(os.environ.get("SUBCONSCIOUS_EXTRACT_CACHE_MB", "")) * 1_000_000)
+      except ValueError:
+        max_bytes = cls.DEFAULT_MAX_MB * 1_000_000
+    return max(0, max_bytes)
+
+  # ------------------------------------------------------------------
+  # Public
+  # ------------------------------------------------------------------
+
+  def iter_text(self, path: pathlib.Path) -> Iterator[str]:
+    """ Like :func:`iter_text`, served from (and filling) the cache for documents """
+    path = pathlib.Path(path)
+    if path.suffix.lower() not in STRUCTURED_EXTS or not self.max_bytes:
+      yield from iter_text(path)
+      return
+    entry = self._entry(path)
+    try:
+      blocks = iter_plain(entry)
+      first = next(blocks, "")
+    except OSError:
+      pass
+    else:
+      self.hits += 1
+      self._touch(entry)
+      yield first
+      yield from blocks
+      return
+
+    self.misses += 1
+    tmp = entry.with_name(f"{entry.stem}.{uuid.uuid4().hex}.tmp")
+    try:
+      entry.parent.mkdir(parents=True, exist_ok=True)
+      out = open(tmp, "w", encoding="utf-8", newline="")
+    except OSError as exc:
+      logger.debug(f"Extraction cache unavailable ({exc}); extracting {path.name} uncached")
+      yield from iter_text(path)
+      return
+    complete = False
+    try:
+      with out:
+        for block in iter_text(path):
+          out.write(block)
+          yield block
+      complete = True
+    finally:
+      # Only a fully extracted document is cached (not one abandoned part-way).
+      try:
+        if complete:
+          os.replace(tmp, entry)
+          self._wrote(entry.stat().st_size)
+        else:
+          os.unlink(tmp)
+      except OSError:
+        pass
+
+  def extract_text(self, path: pathlib.Path) -> str:
+    return "".join(self.iter_text(path))
+
+  def evict(self) -> int:
+    """ Delete least recently used entries until the cache fits in 90% of
+    its budget. Returns how many bytes were freed. """
+    self._written = 0
+    entries = []
+    total = 0
+    try:
+      for sub in os.scandir(self.directory):
+        if not sub.is_dir():
+          continue
+        for f in os.scandir(sub.path):
+          try:
+            st = f.stat()
+          except OSError:
+            continue
+          entries.append((st.st_mtime, st.st_size, f.path))
+          total += st.st_size
+    except OSError:
+      return 0
+    if total <= self.max_bytes:
+      return 0
+    freed = 0
+    target = total - int(self.max_bytes * 0.9)
+    for _, size, name in sorted(entries):
+      if freed >= target:
+        break
+      try:
+        os.unlink(name)
+        freed += size
+      except OSError:
+        continue
+    logger.debug(f"Extraction cache: evicted {freed:,} bytes")
+    return freed
+
+  # ------------------------------------------------------------------
+  # Internals
+  # ------------------------------------------------------------------
+
+  def _entry(self, path: pathlib.Path) -> pathlib.Path:
+    st = path.stat()
+    key = hashlib.sha256(
+      f"{self.FORMAT}\0{path.resolve()}\0{st.st_size}\0{st.st_mtime_ns}".encode()
+    ).hexdigest()
+    return self.directory / key[:2] / f"{key}.txt"
+
+  @staticmethod
+  def _touch(entry: pathlib.Path) -> None:
+    try:
+      os.utime(entry)
+    except OSError:
+      pass
+
+  def _wrote(self, size: int) -> None:
+    self._written += size
+    if self._written >= self.max_bytes // 8:
+      self.evict()
+
+
+_caches: dict[str, ExtractionCache] = {}
+
+
+def cache_for(directory) -> ExtractionCache:
+  """ The process-wide :class:`ExtractionCache` for *directory* (one instance
+  per process, so its eviction accounting sees every write). """
+  key = os.fspath(directory)
+  cache = _caches.get(key)
+  if cache is None:
+    cache = _caches[key] = ExtractionCache(pathlib.Path(key))
+  return cache
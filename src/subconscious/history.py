@@ -0,0 +1,217 @@
+""" Bounded conversation-history windows for chat turns.
+
+    A chat turn only replays the newest slice of a thread to the model: at most
+    ``max_messages`` rows and at most ``token_budget`` estimated tokens. Rows
+    are read newest-first with a keyset cursor on ``(created_at, id)`` so the
+    cost of a turn stays flat no matter how long the thread grows.
+
+    What happens to the turns that fall outside the window is governed by a
+    ``HistoryPolicy``. Under ``SUMMARY`` the older turns are folded into a
+    rolling, persisted ``ThreadSummary`` by ``ThreadCompactor``, which runs as
+    a background job and only ever summarises messages newer than the
+    summary's checkpoint.
+"""
+from __future__ import annotations
+
+import logging
+from datetime import datetime
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import func, select, tuple_
+
+from .jobs import Job, JobManager
+from .db.models import Message, ThreadSummary
+
+
+logger = logging.getLogger("subconscious")
+
+
+class HistoryPolicy:
+  """What to do with turns that fall outside the history window."""
+  DROP = "drop"   # silently omit older turns
+  NOTE = "note"   # prepend a short note telling the model older turns exist
+  SUMMARY = "summary"  # prepend the thread's rolling summary (note until one exists)
+
+  ALL = (DROP, NOTE, SUMMARY)
+
+
+# Roles replayed to the model; everything else (tool rows, etc.) is display-only.
+HISTORY_ROLES = ("user", "assistant", "agent")
+
+OMITTED_NOTE = (
+  "[Earlier messages in this conversation were omitted to fit the context "
+  "window. Ask the user if you need details from them.]"
+)
+
+
+SUMMARY_PREFIX = "[Summary of the earlier part of this conversation]\n"
+
+SUMMARY_SYSTEM_PROMPT = (
+  "You maintain a running summary of a conversation between a user and an AI "
+  "assistant. Merge the new messages into the current summary. Keep facts, "
+  "decisions, names, numbers, open questions and the user's stated "
+  "preferences; drop pleasantries and repetition. Write plain prose of at "
+  "most 400 words and output only the summary."
+)
+
+
+def estimate_tokens(text: Optional[str]) -> int:
+  """Cheap token estimate (~4 chars per token), matching the indexer's."""
+  return max(1, len(text or "") // 4)
+
+
+@dataclass
+class HistoryWindow:
+  """The newest slice of a thread selected for a chat turn.
+
+  ``messages`` are in chronological order. ``truncated`` is True when older
+  messages exist beyond the window, and ``cursor`` is the ``(created_at, id)``
+  key of the oldest included row — pass it back as ``before`` to page further.
+  """
+  messages: list = field(default_factory=list)
+  truncated: bool = False
+  tokens: int = 0
+  cursor: Optional[tuple[datetime, int]] = None
+
+
+def build_summary_prompt(previous: str, messages: list, max_chars: int) -> str:
+  """Render the summariser prompt for folding *messages* into *previous*."""
+  lines = []
+  for msg in messages:
+    speaker = "User" if msg.role == "user" else "Assistant"
+    lines.append(f"{speaker}: {str(msg.content)[:max_chars]}")
+  parts = [f"Current summary:\n{previous or '(none yet)'}", "New messages:\n" + "\n\n".join(lines)]
+  return "\n\n".join(parts)
+
+
+# A summariser turns a prompt from ``build_summary_prompt`` into summary text.
+Summariser = Callable[[str], Awaitable[str]]
+
+
+class ThreadCompactor:
+  """Folds a thread's older messages into its rolling ``ThreadSummary`` row."""
+
+  _SEGMENT_TOKENS = 6_000   # new-message tokens folded in per summariser call
+  _PAGE_SIZE = 200
+
+  def __init__(self, db, jobs: JobManager):
+    self.db = db
+    self.jobs = jobs
+
+  # ------------------------------------------------------------------
+  # Public
+  # ------------------------------------------------------------------
+
+  async def get_summary(self, thread_id: int) -> Optional[ThreadSummary]:
+    """Return the thread's summary row, or None before its first compaction."""
+    async with self.db.get_session() as session:
+      return await session.scalar(
+        select(ThreadSummary).where(ThreadSummary.thread_id == thread_id)
+      )
+
+  async def pending_tokens(
+    self,
+    thread_id: int,
+    summary: Optional[ThreadSummary],
+    until: tuple[datetime, int],
+  ) -> int:
+    """Estimated tokens of messages after *summary*'s checkpoint and before *until*."""
+    stmt = select(func.coalesce(func.sum(func.length(Message.content)), 0)).where(
+      *self._range(thread_id, summary, until)
+    )
+    async with self.db.get_session() as session:
+      chars = await session.scalar(stmt)
+    return int(chars or 0) // 4
+
+  async def compact(
+    self,
+    thread_id: int,
+    until: tuple[datetime, int],
+    summarise: Summariser,
+    job: Job,
+  ) -> Optional[ThreadSummary]:
+    """Fold every message after the checkpoint and strictly before *until*
+    into the summary, one bounded segment at a time.
+
+    The checkpoint is persisted after each segment, so an interrupted run
+    resumes where it stopped instead of re-summarising.
+    """
+    summary = await self.get_summary(thread_id)
+    content = summary.content if summary else ""
+    count = summary.message_count if summary else 0
+    folded = 0
+    while True:
+      segment = await self._next_segment(thread_id, summary, until)
+      if not segment:
+        break
+      prompt = build_summary_prompt(content, segment, self._SEGMENT_TOKENS * 4)
+      content = (await summarise(prompt)).strip() or content
+      count += len(segment)
+      folded += len(segment)
+      summary = await self._save(thread_id, content, segment[-1], count)
+      self.jobs.update(job, current=folded, message=f"Summarised {folded} messages")
+    logger.debug(f"Compacted thread {thread_id}: {folded} new messages folded in")
+    return summary
+
+  # ------------------------------------------------------------------
+  # Internals
+  # ------------------------------------------------------------------
+
+  @staticmethod
+  def _range(thread_id: int, summary: Optional[ThreadSummary], until: tuple[datetime, int]) -> list:
+    """WHERE clauses selecting the not-yet-summarised rows before *until*."""
+    clauses = [
+      Message.thread_id == thread_id,
+      Message.role.in_(HISTORY_ROLES),
+      tuple_(Message.created_at, Message.id) < tuple_(*until),
+    ]
+    if summary is not None and summary.until_message_id is not None:
+      clauses.append(
+        tuple_(Message.created_at, Message.id)
+        > tuple_(summary.until_created_at, summary.until_message_id)
+      )
+    return clauses
+
+  async def _next_segment(
+    self,
+    thread_id: int,
+    summary: Optional[ThreadSummary],
+    until: tuple[datetime, int],
+  ) -> list[Message]:
+    """Oldest unsummarised rows, up to roughly ``_SEGMENT_TOKENS``."""
+    stmt = (
+      select(Message)
+      .where(*self._range(thread_id, summary, until))
+      .order_by(Message.created_at, Message.id)
+      .limit(self._PAGE_SIZE)
+    )
+    async with self.db.get_session() as session:
+      rows = list((await session.scalars(stmt)).all())
+
+    segment: list[Message] = []
+    tokens = 0
+    for row in rows:
+      cost = estimate_tokens(row.content)
+      if segment and tokens + cost > self._SEGMENT_TOKENS:
+        break
+      segment.append(row)
+      tokens += cost
+    return segment
+
+  async def _save(self, thread_id: int, content: str, last: Message, count: int) -> ThreadSummary:
+    """Upsert the summary row with a checkpoint at *last*."""
+    async with self.db.write_session() as session:
+      summary = await session.scalar(
+        select(ThreadSummary).where(ThreadSummary.thread_id == thread_id)
+      )
+      if summary is None:
+        summary = ThreadSummary(thread_id=thread_id)
+        session.add(summary)
+      summary.content = content
+      summary.until_created_at = last.created_at
+      summary.until_message_id = last.id
+      summary.message_count = count
+      summary.token_estimate = estimate_tokens(content)
+      await session.commit()
+      return summary
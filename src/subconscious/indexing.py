@@ -1,25 +1,57 @@
 """ Workspace directory indexing for retrieval (RAG Phase 1 + storage).
 
     Walks the directories attached to a workspace, extracts text from supported
-    files, splits it into overlapping chunks and persists them to the
+    files, splits it into chunks at structural boundaries (headings, top-level
+    definitions, paragraphs; overlapping windows when there are none) and
+    persists them to the
     ``indexed_documents`` / ``document_chunks`` tables. Indexing is incremental:
-    a file is only re-chunked when its size+mtime (and, for smaller files, a
-    content hash) has changed since the last run.
-
-    This is the ingestion + storage layer. Embeddings/vector search (Phase 2)
-    slot in at the marked extension point: populate ``DocumentChunk.embedding``
-    during ``_index_file`` and swap ``Engine.search_workspace`` to do a vector
-    similarity query instead of the current keyword match.
+    existing rows are loaded once per run, a file whose size, mtime and inode
+    all match its row is skipped without being opened, and one whose stat
+    changed but content hash didn't only has its stat fields refreshed.
+
+    A run is a staged pipeline so the event loop (UI and API) stays responsive:
+    a directory walk in a worker thread, hashing/extraction/chunking in a
+    process pool (``SUBCONSCIOUS_INDEX_WORKERS`` processes, default one per
+    spare core), and a single writer task that persists results in batches.
+    Files over ``_STREAM_BYTES`` are instead streamed: extracted block by
+    block (see ``extraction``) in a thread and committed a batch of chunks at
+    a time, so memory stays bounded and their first chunks are searchable
+    early. Such a document is marked ``indexing`` until its last batch lands.
+
+    Runs over the same workspace (a full re-index job, a watcher batch) take
+    turns on a per-workspace lock, and document rows are upserted on their
+    unique (workspace, path), so a file is never indexed into two rows.
+
+    With an ``Embedder`` configured, changed chunks are also embedded on their
+    way to the writer and stored as compact vector blobs; chunks left without
+    one (e.g. the embedding server was down) are back-filled at the end of the
+    next full run, as are chunks embedded by a different model than the
+    configured one. ``on_change`` is told which workspace's chunks changed so
+    derived indexes (the vector index) can be rebuilt.
+
+    A full run processes changed files in path order and checkpoints the path
+    up to which every file is persisted on its job, so a paused or killed run
+    resumes past it (see ``JobManager``) instead of starting over.
 """
 from __future__ import annotations
 
+import os
+import re
+import bisect
+import asyncio
 import hashlib
 import logging
 import pathlib
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
 
-from sqlalchemy import select, delete
+from sqlalchemy import select, delete, update, insert, bindparam, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from .jobs import Job, JobManager
+from .extraction import STRUCTURED_EXTS, ExtractionCache, cache_for, iter_text
+from .embeddings import Embedder, embedding_dtype, encode_vector
 from .db.models import IndexedDocument, DocumentChunk
 
 
@@ -33,175 +65,675 @@ _PLAIN_EXTS = {
   ".css", ".scss", ".java", ".c", ".cc", ".cpp", ".h", ".hpp", ".go", ".rs",
   ".rb", ".php", ".sh", ".bat", ".ps1", ".sql", ".xml", ".log", ".tex",
 }
-_STRUCTURED_EXTS = {".pdf", ".docx", ".xlsx"}
+_STRUCTURED_EXTS = STRUCTURED_EXTS
 
-_CHUNK_CHARS = 1500          # target characters per chunk
-_CHUNK_OVERLAP = 200         # overlap between consecutive chunks
+_CHUNK_CHARS = 1500          # maximum characters per chunk
+_CHUNK_MIN = 500             # never cut at a structural boundary before this many characters
+_CHUNK_OVERLAP = 200         # overlap between chunks cut mid-structure
+_STREAM_BUFFER = 1 << 18     # characters of extracted text buffered before chunking
 _MAX_FILE_BYTES = 20_000_000  # skip files larger than 20 MB
+_STREAM_BYTES = 2_000_000     # stream (rather than pool-extract) files larger than 2 MB
 _HASH_LIMIT = 5_000_000       # only content-hash files up to 5 MB; larger rely on size+mtime
+_WRITE_BATCH = 64             # documents persisted per write transaction
+_DELETE_BATCH = 500           # ids/paths per IN (…) clause
+_EMBED_BATCH = 32             # chunk texts per embedding request when back-filling
+
+
+# Extensions chunked at top-level definitions rather than prose headings.
+_CODE_EXTS = {
+  ".py", ".js", ".ts", ".tsx", ".jsx", ".java", ".c", ".cc", ".cpp", ".h", ".hpp",
+  ".go", ".rs", ".rb", ".php", ".sh", ".ps1", ".sql", ".css", ".scss",
+}
+
+# Preferred chunk starts: the line after each match's newline. Headings also
+# cover the page/sheet markers written by the PDF and XLSX extractors. (A
+# leading literal "\n" lets the regex engine skip ahead instead of testing
+# every offset, as a MULTILINE "^" would.)
+_HEADINGS = re.compile(r"\n(?=#{1,6}[ \t]|\\(?:part|chapter|section|subsection)\b|--- (?:Page|Sheet) )")
+_DEFINITIONS = re.compile(
+  r"\n(?=@|(?:async[ \t]+)?def |class |function |export |func |type |interface |module "
+  r"|(?:pub(?:\([a-z]+\))?[ \t]+)?(?:fn|struct|enum|impl|trait|mod) "
+  r"|(?:public|private|protected|static|abstract|final)[ \t])"
+)
+_PARAGRAPHS = re.compile(r"\n[ \t]*\n(?=[ \t]*\S)")
+_NON_SPACE = re.compile(r"\S")
+
+
+class _FileEntry(NamedTuple):
+  """A file found by the directory walk, with the stat fields indexing needs."""
+  root: str
+  path: str
+  size: int
+  mtime: int
+  inode: int
+
+
+class _Frontier:
+  """The furthest of *paths* (in processing order) up to which every path has
+  been persisted, as files complete out of order across pipeline lanes."""
+
+  def __init__(self, paths: list):
+    self._paths = paths
+    self._index = {path: i for i, path in enumerate(paths)}
+    self._done = [False] * len(paths)
+    self._next = 0
+
+  def advance(self, paths: Iterable[str]) -> Optional[str]:
+    """Mark *paths* done; return the new frontier path if it moved."""
+    for path in paths:
+      i = self._index.get(path)
+      if i is not None:
+        self._done[i] = True
+    start = self._next
+    while self._next < len(self._done) and self._done[self._next]:
+      self._next += 1
+    return self._paths[self._next - 1] if self._next > start else None
+
+
+class _KnownDoc(NamedTuple):
+  """The stored state of an already indexed document."""
+  id: int
+  size: Optional[int]
+  mtime: Optional[int]
+  inode: Optional[int]
+  content_hash: Optional[str]
+  status: str
+
+
+def _prepare_file(path: str, size: int, known_hash: Optional[str], cache_dir: Optional[str] = None) -> Optional[tuple]:
+  """Hash, extract and chunk one file. Runs in a pool worker process.
+
+  Returns ``(content_hash, chunks)``, or None when the content hash equals
+  *known_hash* (the file was touched but its content is unchanged). Documents
+  are extracted through the ``ExtractionCache`` in *cache_dir* when given.
+  """
+  p = pathlib.Path(path)
+  content_hash = WorkspaceIndexer._hash_file(p) if size <= _HASH_LIMIT else None
+  if known_hash is not None and content_hash == known_hash:
+    return None
+  blocks = cache_for(cache_dir).iter_text(p) if cache_dir else iter_text(p)
+  chunks = WorkspaceIndexer._iter_chunks(blocks, p.suffix.lower())
+  return content_hash, [chunk for batch in chunks for chunk in batch]
 
 
 class WorkspaceIndexer:
   """Ingests workspace directories into the chunk store."""
 
-  def __init__(self, db, jobs: JobManager):
+  def __init__(
+    self,
+    db,
+    jobs: JobManager,
+    workers: Optional[int] = None,
+    *,
+    embedder: Optional[Embedder] = None,
+    on_change: Optional[Callable[[int], None]] = None,
+    extraction_cache: Optional[ExtractionCache] = None,
+  ):
     self.db = db
     self.jobs = jobs
+    self.workers = self._resolve_workers(workers)
+    self.extraction_cache = extraction_cache
+    self.embedder = embedder
+    self.embedding_dtype = embedding_dtype()
+    self.embedding_model: Optional[str] = getattr(embedder, "model", None)
+    self.on_change = on_change
+    self._executor: Optional[Executor] = None
+    self._locks: dict[int, asyncio.Lock] = {}
+
+  @staticmethod
+  def _resolve_workers(workers: Optional[int]) -> int:
+    """Worker processes for extraction: explicit arg → ``SUBCONSCIOUS_INDEX_WORKERS``
+    → one per core, leaving a core for the UI. ``0`` extracts in threads instead.
+    """
+    if workers is None:
+      try:
+        workers = int(os.environ.get("SUBCONSCIOUS_INDEX_WORKERS", ""))
+      except ValueError:
+        workers = max(1, (os.cpu_count() or 2) - 1)
+    return max(0, workers)
+
+  def _lock(self, workspace_id: int) -> asyncio.Lock:
+    """Held by every run over a workspace, so a watcher batch waits for a full
+    re-index (and vice versa) instead of both inserting rows for a new file."""
+    return self._locks.setdefault(workspace_id, asyncio.Lock())
+
+  def close(self) -> None:
+    """Shut down the extraction pool (pending work is cancelled)."""
+    if self._executor is not None:
+      self._executor.shutdown(wait=False, cancel_futures=True)
+      self._executor = None
 
   # ------------------------------------------------------------------
   # Public
   # ------------------------------------------------------------------
 
-  async def reindex(self, workspace_id: int, directories: list, job: Job) -> None:
-    """Incrementally (re)index every indexable file under *directories*."""
-    files: list[tuple[str, pathlib.Path]] = []
-    for d in directories:
-      root = pathlib.Path(d)
-      if not root.exists() or not root.is_dir():
-        continue
-      for p in root.rglob("*"):
-        if p.is_file() and self._is_indexable(p):
-          files.append((str(root), p))
-
-    self.jobs.update(job, total=len(files), current=0, message=f"Found {len(files)} files")
-
-    seen_paths: set[str] = set()
-    indexed = 0
-    for i, (root, p) in enumerate(files):
-      seen_paths.add(str(p))
-      try:
-        if await self._index_file(workspace_id, root, p):
-          indexed += 1
-      except Exception as exc:  # never let one bad file kill the whole run
-        logger.warning(f"Indexing error for {p}: {exc}")
-        await self._mark_error(workspace_id, str(p), str(exc))
-      self.jobs.update(job, current=i + 1, message=p.name)
-
-    # Drop documents whose files were removed or whose directory was detached.
-    await self._prune(workspace_id, seen_paths)
-    job.message = f"Indexed {indexed} of {len(files)} files"
+  async def reindex(self, workspace_id: int, directories: list, job: Optional[Job] = None) -> None:
+    """Incrementally (re)index every indexable file under *directories*.
+
+    With a *job*, changed files are indexed in path order and the path up to
+    which all of them are persisted is checkpointed as ``job.checkpoint["path"]``;
+    a job resumed with that checkpoint skips the files up to it. (Files at or
+    before it that change in between are picked up by the next full run.)
+    """
+    async with self._lock(workspace_id):
+      files = await asyncio.to_thread(self._walk, directories)
+      known = await self._load_known(workspace_id)
+      pending = sorted(
+        (entry for entry in files if not self._unchanged(entry, known.get(entry.path))),
+        key=lambda entry: entry.path,
+      )
+      after = (job.checkpoint or {}).get("path") if job is not None else None
+      skipped = bisect.bisect_right(pending, after, key=lambda entry: entry.path) if after else 0
+      pending = pending[skipped:]
+      self._progress(
+        job, total=len(files), current=len(files) - len(pending),
+        message=f"Found {len(files)} files ({len(pending)} new or changed"
+                + (f", resuming after {skipped} done)" if skipped else ")"),
+      )
+      indexed = await self._index_entries(workspace_id, pending, known, job, checkpoint=job is not None)
+
+      # Drop documents whose files were removed or whose directory was detached.
+      seen = {entry.path for entry in files}
+      pruned = await self._prune([doc.id for path, doc in known.items() if path not in seen])
+      embedded = await self._embed_missing(workspace_id)
+      if indexed or pruned or embedded:
+        self._changed(workspace_id)
+      if job is not None:
+        job.message = f"Indexed {indexed} of {len(files)} files"
+
+  async def index_paths(self, workspace_id: int, directories: list, paths: set, job: Optional[Job] = None) -> int:
+    """Re-index only *paths* (files or directories, e.g. from a filesystem
+    watcher) that lie under the attached *directories*. Existing paths are
+    (re)indexed if changed; missing ones are pruned with everything beneath
+    them. Returns how many documents were (re)indexed.
+    """
+    async with self._lock(workspace_id):
+      roots = [os.path.abspath(d) for d in directories]
+      entries, missing = await asyncio.to_thread(self._stat_paths, roots, paths)
+      known = await self._load_known(workspace_id, [entry.path for entry in entries], missing)
+      pending = [entry for entry in entries if not self._unchanged(entry, known.get(entry.path))]
+      self._progress(job, total=len(pending), current=0, message=f"{len(pending)} changed files")
+      indexed = await self._index_entries(workspace_id, pending, known, job)
+
+      gone = tuple(path + os.sep for path in missing)
+      pruned = await self._prune([doc.id for path, doc in known.items() if path in missing or path.startswith(gone)])
+      if indexed or pruned:
+        self._changed(workspace_id)
+      return indexed
 
   # ------------------------------------------------------------------
-  # Internals
+  # Pipeline stages
   # ------------------------------------------------------------------
 
-  @staticmethod
-  def _is_indexable(p: pathlib.Path) -> bool:
-    ext = p.suffix.lower()
-    if ext not in _PLAIN_EXTS and ext not in _STRUCTURED_EXTS:
-      return False
-    try:
-      return p.stat().st_size <= _MAX_FILE_BYTES
-    except OSError:
-      return False
-
-  async def _index_file(self, workspace_id: int, root: str, p: pathlib.Path) -> bool:
-    """Index a single file. Returns True when (re)chunked, False when skipped."""
-    stat = p.stat()
-    size = stat.st_size
-    mtime = int(stat.st_mtime)
-    path_str = str(p)
+  async def _index_entries(
+    self, workspace_id: int, pending: list, known: dict, job: Optional[Job], checkpoint: bool = False,
+  ) -> int:
+    """Extract *pending* files in the pool and persist them through the
+    single batched writer. Returns how many documents were (re)indexed.
+    With *checkpoint*, the *job*'s checkpoint follows the persisted files.
+    """
+    frontier = _Frontier([entry.path for entry in pending]) if checkpoint and job is not None else None
+
+    async def persisted(paths: list) -> None:
+      if frontier is not None and (path := frontier.advance(paths)) is not None:
+        await self.jobs.checkpoint(job, path=path)
+
+    results: asyncio.Queue = asyncio.Queue(maxsize=_WRITE_BATCH * 2)
+    writer = asyncio.create_task(self._write_results(workspace_id, results, persisted))
+    entries = iter(pending)
+    done = job.current if job is not None else 0
+    streamed = 0
+
+    async def lane() -> None:
+      nonlocal done, streamed
+      # Lanes share one iterator, so each file is taken exactly once.
+      for entry in entries:
+        doc = known.get(entry.path)
+        doc_id = doc.id if doc else None
+        try:
+          known_hash = self._known_hash(entry, doc)
+          if known_hash is not None and entry.size > _HASH_LIMIT:
+            prepared = None     # too large to hash: trust the matching size+mtime
+          elif entry.size > _STREAM_BYTES:
+            started = await self._start_streaming(workspace_id, entry, doc_id, known_hash)
+            if started is not None:
+              doc_id, content_hash = started     # a failure from here on updates this row
+              if await self._index_streaming(workspace_id, entry, doc_id, content_hash):
+                streamed += 1
+              # Done either way: a failure is already recorded on the row, and a
+              # stat-only refresh must not overwrite it as unchanged.
+              done += 1
+              self._progress(job, current=done, message=pathlib.Path(entry.path).name)
+              await persisted([entry.path])
+              continue
+            prepared = None
+          else:
+            prepared = await self._prepare(entry, known_hash)
+          if prepared is not None:
+            prepared = (*prepared, await self._embed_chunks(prepared[1]))
+          await results.put((entry, doc_id, prepared, None))
+        except asyncio.CancelledError:
+          raise                   # cancelled/paused: stop, don't record as a file error
+        except Exception as exc:  # never let one bad file kill the whole run
+          logger.warning(f"Indexing error for {entry.path}: {exc}")
+          await results.put((entry, doc_id, None, str(exc)))
+        done += 1
+        self._progress(job, current=done, message=pathlib.Path(entry.path).name)
 
-    async with self.db.get_session() as session:
-      existing = await session.scalar(
-        select(IndexedDocument).where(
-          IndexedDocument.workspace_id == workspace_id,
-          IndexedDocument.path == path_str,
+    try:
+      # Two lanes per worker keeps the pool busy while results are handed off.
+      await asyncio.gather(*(lane() for _ in range(max(1, min(self.workers * 2, len(pending))))))
+    finally:
+      await results.put(None)
+      indexed = await writer
+    return indexed + streamed
+
+  def _progress(self, job: Optional[Job], **fields) -> None:
+    if job is not None:
+      self.jobs.update(job, **fields)
+
+  def _changed(self, workspace_id: int) -> None:
+    if self.on_change is not None:
+      self.on_change(workspace_id)
+
+  async def _embed_chunks(self, chunks: list) -> Optional[list]:
+    """Embedding blobs for *chunks*, or None when embeddings are off or the
+    embedder failed (those chunks are back-filled by a later full run)."""
+    if self.embedder is None or not chunks:
+      return None
+    try:
+      vectors = await self.embedder.embed([content for content, _, _ in chunks])
+    except Exception as exc:
+      logger.debug(f"Embedding failed, storing chunks without vectors: {exc}")
+      return None
+    return [encode_vector(v, self.embedding_dtype) for v in vectors]
+
+  async def _embed_missing(self, workspace_id: int) -> int:
+    """Embed the workspace's chunks that have no vector yet, or one from another
+    embedder model (it can't be ranked against this model's). Returns how many."""
+    if self.embedder is None:
+      return 0
+    embedded = 0
+    after = 0
+    while True:
+      async with self.db.get_session() as session:
+        rows = (await session.execute(
+          select(DocumentChunk.id, DocumentChunk.content)
+          .where(
+            DocumentChunk.workspace_id == workspace_id,
+            or_(DocumentChunk.embedding.is_(None), DocumentChunk.embedding_model.is_distinct_from(self.embedding_model)),
+            DocumentChunk.id > after,
+          )
+          .order_by(DocumentChunk.id).limit(_EMBED_BATCH)
+        )).all()
+      if not rows:
+        return embedded
+      after = rows[-1].id
+      try:
+        vectors = await self.embedder.embed([row.content for row in rows])
+      except Exception as exc:
+        logger.warning(f"Embedding back-fill stopped for workspace {workspace_id}: {exc}")
+        return embedded
+      async with self.db.write_session() as session:
+        await session.execute(
+          update(DocumentChunk.__table__).where(DocumentChunk.id == bindparam("b_id"))
+          .values(embedding=bindparam("embedding"), embedding_model=self.embedding_model),
+          [{"b_id": row.id, "embedding": encode_vector(v, self.embedding_dtype)} for row, v in zip(rows, vectors)],
         )
-      )
-
-      content_hash = self._hash_file(p) if size <= _HASH_LIMIT else None
+        await session.commit()
+      embedded += len(rows)
 
-      # Unchanged since last index → skip.
-      if existing and existing.status == "indexed" and existing.mtime == mtime and existing.size == size:
-        if content_hash is None or existing.content_hash == content_hash:
-          return False
+  @classmethod
+  def _walk(cls, directories: list) -> list[_FileEntry]:
+    """Collect indexable files under *directories*. Runs in a worker thread."""
+    files: list[_FileEntry] = []
+    for d in directories:
+      root = pathlib.Path(d)
+      if not root.is_dir():
+        continue
+      stack = [str(root)]
+      while stack:
+        try:
+          with os.scandir(stack.pop()) as it:
+            for entry in it:
+              try:
+                if entry.is_dir(follow_symlinks=False):
+                  stack.append(entry.path)
+                elif entry.is_file() and cls._is_indexable(entry.name):
+                  st = entry.stat()
+                  if st.st_size <= _MAX_FILE_BYTES:
+                    files.append(_FileEntry(str(root), entry.path, st.st_size, int(st.st_mtime), st.st_ino))
+              except OSError:
+                continue
+        except OSError:
+          continue
+    return files
+
+  @classmethod
+  def _stat_paths(cls, roots: list, paths: set) -> tuple[list[_FileEntry], set]:
+    """Split *paths* into indexable file entries (directories are walked) and
+    paths that no longer exist. Paths outside every root are ignored.
+    Runs in a worker thread.
+    """
+    entries: list[_FileEntry] = []
+    missing: set[str] = set()
+    for path in paths:
+      path = os.path.abspath(path)
+      root = next((r for r in roots if path == r or path.startswith(r + os.sep)), None)
+      if root is None:
+        continue
+      try:
+        st = os.stat(path)
+      except FileNotFoundError:
+        missing.add(path)
+        continue
+      except OSError:
+        continue
+      if os.path.isdir(path):
+        entries.extend(entry._replace(root=root) for entry in cls._walk([path]))
+      elif os.path.isfile(path) and cls._is_indexable(path) and st.st_size <= _MAX_FILE_BYTES:
+        entries.append(_FileEntry(root, path, st.st_size, int(st.st_mtime), st.st_ino))
+    return entries, missing
+
+  async def _load_known(
+    self, workspace_id: int, paths: Optional[list] = None, prefixes: Iterable[str] = (),
+  ) -> dict[str, _KnownDoc]:
+    """Stored state of the workspace's documents, keyed by path: all of them
+    (one query), or just *paths* and anything at or under *prefixes*.
+    """
+    columns = select(
+      IndexedDocument.path, IndexedDocument.id, IndexedDocument.size, IndexedDocument.mtime,
+      IndexedDocument.inode, IndexedDocument.content_hash, IndexedDocument.status,
+    ).where(IndexedDocument.workspace_id == workspace_id)
+    if paths is None:
+      queries = [columns]
+    else:
+      queries = [
+        columns.where(IndexedDocument.path.in_(paths[i:i + _DELETE_BATCH]))
+        for i in range(0, len(paths), _DELETE_BATCH)
+      ]
+      queries += [
+        columns.where(or_(IndexedDocument.path == prefix, IndexedDocument.path.startswith(prefix + os.sep, autoescape=True)))
+        for prefix in prefixes
+      ]
+    known: dict[str, _KnownDoc] = {}
+    async with self.db.get_session() as session:
+      for query in queries:
+        rows = await session.execute(query)
+        known.update((path, _KnownDoc(*rest)) for path, *rest in rows.all())
+    return known
 
-      text = self._extract_text(p)
-      chunks = self._chunk_text(text)
+  @staticmethod
+  def _unchanged(entry: _FileEntry, doc: Optional[_KnownDoc]) -> bool:
+    """Fast path: size, mtime and inode all match an indexed row."""
+    return (
+      doc is not None and doc.status == "indexed" and doc.inode is not None
+      and doc.size == entry.size and doc.mtime == entry.mtime and doc.inode == entry.inode
+    )
 
-      if existing:
-        doc = existing
-        # Remove stale chunks before re-inserting.
+  @staticmethod
+  def _known_hash(entry: _FileEntry, doc: Optional[_KnownDoc]) -> Optional[str]:
+    """The stored hash to confirm a changed file against before re-extracting
+    it ("" when none is kept), or None when it must be re-extracted.
+    """
+    if doc and doc.status == "indexed" and doc.mtime == entry.mtime and doc.size == entry.size:
+      # Same size+mtime but a different (or unrecorded) inode: the file may
+      # have been replaced, so confirm with a content hash where we keep one.
+      return doc.content_hash or ""
+    return None
+
+  async def _prepare(self, entry: _FileEntry, known_hash: Optional[str]) -> Optional[tuple]:
+    """Extract a new or changed file off-loop. Returns ``(content_hash, chunks)``,
+    or None when its content hash equals *known_hash*.
+    """
+    cache_dir = str(self.extraction_cache.directory) if self.extraction_cache is not None else None
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(self._pool(), _prepare_file, entry.path, entry.size, known_hash, cache_dir)
+
+  async def _start_streaming(
+    self, workspace_id: int, entry: _FileEntry, doc_id: Optional[int], known_hash: Optional[str],
+  ) -> Optional[tuple[int, Optional[str]]]:
+    """Hash a large file and reset (or create) its document row as
+    ``indexing``. Returns ``(doc_id, content_hash)``, or None when its content
+    hash equals *known_hash* (only the stat fields need refreshing).
+    """
+    path = pathlib.Path(entry.path)
+    content_hash = await asyncio.to_thread(self._hash_file, path) if entry.size <= _HASH_LIMIT else None
+    if known_hash is not None and content_hash == known_hash:
+      return None
+
+    async with self.db.write_session() as session:
+      if doc_id:
+        await session.execute(delete(DocumentChunk).where(DocumentChunk.document_id == doc_id))
         await session.execute(
-          delete(DocumentChunk).where(DocumentChunk.document_id == doc.id)
+          update(IndexedDocument).where(IndexedDocument.id == doc_id)
+          .values(directory=entry.root, chunk_count=0, status="indexing", error=None)
         )
-        doc.size = size
-        doc.mtime = mtime
-        doc.content_hash = content_hash
-        doc.directory = root
-        doc.chunk_count = len(chunks)
-        doc.status = "indexed"
-        doc.error = None
       else:
-        doc = IndexedDocument(
-          workspace_id=workspace_id,
-          path=path_str,
-          directory=root,
-          size=size,
-          mtime=mtime,
-          content_hash=content_hash,
-          chunk_count=len(chunks),
-          status="indexed",
-        )
-        session.add(doc)
-        await session.flush()  # assign doc.id
-
-      for ordinal, (content, start_line, end_line) in enumerate(chunks):
-        session.add(
-          DocumentChunk(
-            document_id=doc.id,
-            workspace_id=workspace_id,
-            ordinal=ordinal,
-            content=content,
-            start_line=start_line,
-            end_line=end_line,
-            token_estimate=max(1, len(content) // 4),
-            # Phase 2 extension point: compute and store an embedding here.
-            embedding=None,
+        reset = {"directory": entry.root, "chunk_count": 0, "status": "indexing", "error": None}
+        doc_id = (await session.execute(
+          sqlite_insert(IndexedDocument).values(workspace_id=workspace_id, path=entry.path, **reset)
+          .on_conflict_do_update(index_elements=[IndexedDocument.workspace_id, IndexedDocument.path], set_=reset)
+          .returning(IndexedDocument.id)
+        )).scalar_one()
+        await session.execute(delete(DocumentChunk).where(DocumentChunk.document_id == doc_id))
+      await session.commit()
+    return doc_id, content_hash
+
+  async def _index_streaming(
+    self, workspace_id: int, entry: _FileEntry, doc_id: int, content_hash: Optional[str],
+  ) -> bool:
+    """Extract, chunk and persist a large file into its row (see
+    :meth:`_start_streaming`) incrementally, one transaction per batch of
+    chunks. Returns True once indexed; failures are recorded on the row.
+    Cancelled mid-file, the row stays ``indexing`` and is redone next run.
+    """
+    path = pathlib.Path(entry.path)
+    count = 0
+    blocks = self.extraction_cache.iter_text(path) if self.extraction_cache is not None else iter_text(path)
+    batches = self._iter_chunks(blocks, path.suffix.lower())
+    step: Optional[asyncio.Future] = None
+    try:
+      while True:
+        # Shielded so a cancellation doesn't abandon the generator mid-next()
+        # in its worker thread; it must finish before the generator is closed.
+        step = asyncio.ensure_future(asyncio.to_thread(next, batches, None))
+        chunks = await asyncio.shield(step)
+        if chunks is None:
+          break
+        blobs = await self._embed_chunks(chunks)
+        async with self.db.write_session() as session:
+          await session.execute(
+            insert(DocumentChunk.__table__), self._chunk_rows(
+              workspace_id, doc_id, chunks, blobs, count, self.embedding_model,
+            ),
           )
-        )
+          count += len(chunks)
+          await session.execute(update(IndexedDocument).where(IndexedDocument.id == doc_id).values(chunk_count=count))
+          await session.commit()
+      final = {"size": entry.size, "mtime": entry.mtime, "inode": entry.inode,
+               "content_hash": content_hash, "status": "indexed"}
+    except Exception as exc:
+      logger.warning(f"Indexing error for {entry.path} after {count} chunks: {exc}")
+      final = {"status": "error", "error": str(exc)[:2000]}
+    finally:
+      if step is not None and not step.done():
+        await asyncio.wait([step])      # let the in-flight next() return first
+        if not step.cancelled():
+          step.exception()              # abandoned: its outcome no longer matters
+      batches.close()
+    async with self.db.write_session() as session:
+      await session.execute(update(IndexedDocument).where(IndexedDocument.id == doc_id).values(**final))
       await session.commit()
-    return True
+    return final["status"] == "indexed"
+
+  def _pool(self) -> Optional[Executor]:
+    """The extraction executor; None (the loop's default thread pool) when workers=0.
+
+    Workers are spawned, never forked: the app process already runs database,
+    watcher and UI threads, and a fork can copy a lock one of them holds.
+    """
+    if self.workers and self._executor is None:
+      self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+    return self._executor
+
+  async def _write_results(
+    self, workspace_id: int, results: asyncio.Queue, on_written: Optional[Callable] = None,
+  ) -> int:
+    """Single writer: drain prepared files in batches until the None sentinel,
+    awaiting ``on_written(paths)`` after each batch. Returns how many documents
+    were (re)indexed.
+    """
+    indexed = 0
+    finished = False
+    while not finished:
+      batch = [await results.get()]
+      while len(batch) < _WRITE_BATCH and not results.empty():
+        batch.append(results.get_nowait())
+      if batch[-1] is None:
+        finished = True
+        batch.pop()
+      if batch:
+        indexed += await self._write_batch(workspace_id, batch)
+        if on_written is not None:
+          await on_written([entry.path for entry, *_ in batch])
+    return indexed
+
+  async def _write_batch(self, workspace_id: int, batch: list) -> int:
+    """Persist a batch in one transaction, falling back to per-file writes
+    so a single bad row can't lose the rest of the batch.
+    """
+    try:
+      async with self.db.write_session() as session:
+        indexed = await self._store_batch(session, workspace_id, batch, self.embedding_model)
+        await session.commit()
+      return indexed
+    except Exception as exc:
+      if len(batch) == 1:
+        logger.warning(f"Indexing write failed for {batch[0][0].path}: {exc}")
+        return 0
+      return sum([await self._write_batch(workspace_id, [item]) for item in batch])
 
-  async def _mark_error(self, workspace_id: int, path_str: str, error: str) -> None:
-    async with self.db.get_session() as session:
-      existing = await session.scalar(
-        select(IndexedDocument).where(
-          IndexedDocument.workspace_id == workspace_id,
-          IndexedDocument.path == path_str,
-        )
+  @staticmethod
+  async def _store_batch(session, workspace_id: int, batch: list, model: Optional[str] = None) -> int:
+    """Write a batch of pipeline results with one bulk statement per kind of
+    change: stale chunk delete, document updates, document inserts, chunk
+    inserts (their vectors tagged with embedder *model*). Returns how many
+    documents were (re)chunked.
+    """
+    documents = [(entry, doc_id, *prepared) for entry, doc_id, prepared, error in batch if error is None and prepared is not None]
+    refreshed = [(entry, doc_id) for entry, doc_id, prepared, error in batch if error is None and prepared is None]
+    failed = [(entry, doc_id, error) for entry, doc_id, _, error in batch if error is not None]
+
+    doc_updates = [
+      {"b_id": doc_id, "size": e.size, "mtime": e.mtime, "inode": e.inode, "content_hash": h,
+       "directory": e.root, "chunk_count": len(chunks), "status": "indexed", "error": None}
+      for e, doc_id, h, chunks, _ in documents if doc_id
+    ]
+    error_updates = [
+      {"b_id": doc_id, "status": "error", "error": error[:2000]}
+      for _, doc_id, error in failed if doc_id
+    ]
+    stat_updates = [
+      {"b_id": doc_id, "size": e.size, "mtime": e.mtime, "inode": e.inode}
+      for e, doc_id in refreshed
+    ]
+
+    reindexed = [doc_id for _, doc_id, _, _, _ in documents if doc_id]
+    for i in range(0, len(reindexed), _DELETE_BATCH):
+      await session.execute(
+        delete(DocumentChunk).where(DocumentChunk.document_id.in_(reindexed[i:i + _DELETE_BATCH]))
       )
-      if existing:
-        existing.status = "error"
-        existing.error = error[:2000]
-      else:
-        session.add(
-          IndexedDocument(
-            workspace_id=workspace_id,
-            path=path_str,
-            status="error",
-            error=error[:2000],
-            chunk_count=0,
-          )
+    for params in (doc_updates, error_updates, stat_updates):
+      if params:
+        # executemany: every parameter set in a list shares the same keys.
+        values = {key: bindparam(key) for key in params[0] if key != "b_id"}
+        await session.execute(
+          update(IndexedDocument.__table__).where(IndexedDocument.id == bindparam("b_id")).values(values),
+          params,
         )
-      await session.commit()
 
-  async def _prune(self, workspace_id: int, seen_paths: set) -> None:
-    """Delete documents (and their chunks) no longer present on disk."""
-    async with self.db.get_session() as session:
-      docs = await session.scalars(
-        select(IndexedDocument).where(IndexedDocument.workspace_id == workspace_id)
+    inserts = [
+      {"workspace_id": workspace_id, "path": e.path, "directory": e.root, "size": e.size, "mtime": e.mtime,
+       "inode": e.inode, "content_hash": h, "chunk_count": len(chunks), "status": "indexed", "error": None}
+      for e, doc_id, h, chunks, _ in documents if not doc_id
+    ]
+    inserts += [
+      {"workspace_id": workspace_id, "path": e.path, "directory": None, "size": None, "mtime": None,
+       "inode": None, "content_hash": None, "chunk_count": 0, "status": "error", "error": error[:2000]}
+      for e, doc_id, error in failed if not doc_id
+    ]
+    new_ids: dict[str, int] = {}
+    if inserts:
+      # Upsert on (workspace_id, path): a row that appeared since the run
+      # loaded its known documents is taken over, not duplicated.
+      stmt = sqlite_insert(IndexedDocument.__table__)
+      rows = await session.execute(
+        stmt.on_conflict_do_update(
+          index_elements=[IndexedDocument.workspace_id, IndexedDocument.path],
+          set_={key: stmt.excluded[key] for key in inserts[0] if key not in ("workspace_id", "path")},
+        ).returning(IndexedDocument.path, IndexedDocument.id),
+        inserts,
       )
-      stale_ids = [d.id for d in docs.all() if d.path not in seen_paths]
-      if stale_ids:
+      new_ids = dict(rows.all())
+      taken = list(new_ids.values())
+      for i in range(0, len(taken), _DELETE_BATCH):
+        await session.execute(delete(DocumentChunk).where(DocumentChunk.document_id.in_(taken[i:i + _DELETE_BATCH])))
+
+    chunk_rows = [
+      row
+      for e, doc_id, _, chunks, blobs in documents
+      for row in WorkspaceIndexer._chunk_rows(workspace_id, doc_id or new_ids[e.path], chunks, blobs, 0, model)
+    ]
+    if chunk_rows:
+      await session.execute(insert(DocumentChunk.__table__), chunk_rows)
+    return len(documents)
+
+  @staticmethod
+  def _chunk_rows(
+    workspace_id: int, doc_id: int, chunks: list, blobs: Optional[list],
+    first_ordinal: int = 0, model: Optional[str] = None,
+  ) -> list[dict]:
+    """``document_chunks`` insert parameters for a document's *chunks*."""
+    return [
+      {
+        "document_id": doc_id,
+        "workspace_id": workspace_id,
+        "ordinal": first_ordinal + i,
+        "content": content,
+        "start_line": start_line,
+        "end_line": end_line,
+        "token_estimate": max(1, len(content) // 4),
+        "embedding": blobs[i] if blobs else None,
+        "embedding_model": model if blobs else None,
+      }
+      for i, (content, start_line, end_line) in enumerate(chunks)
+    ]
+
+  # ------------------------------------------------------------------
+  # Internals
+  # ------------------------------------------------------------------
+
+  @staticmethod
+  def _is_indexable(name: str) -> bool:
+    ext = os.path.splitext(name)[1].lower()
+    return ext in _PLAIN_EXTS or ext in _STRUCTURED_EXTS
+
+  async def _prune(self, stale_ids: list) -> int:
+    """Delete documents (and their chunks) no longer present on disk."""
+    if not stale_ids:
+      return 0
+    async with self.db.write_session() as session:
+      for i in range(0, len(stale_ids), _DELETE_BATCH):
+        ids = stale_ids[i:i + _DELETE_BATCH]
         await session.execute(
-          delete(DocumentChunk).where(DocumentChunk.document_id.in_(stale_ids))
+          delete(DocumentChunk).where(DocumentChunk.document_id.in_(ids))
         )
         await session.execute(
-          delete(IndexedDocument).where(IndexedDocument.id.in_(stale_ids))
+          delete(IndexedDocument).where(IndexedDocument.id.in_(ids))
         )
-        await session.commit()
+      await session.commit()
+    return len(stale_ids)
 
   # ------------------------------------------------------------------
   # Text extraction & chunking
@@ -215,67 +747,99 @@ class WorkspaceIndexer:
         h.update(block)
     return h.hexdigest()
 
-  @staticmethod
-  def _extract_text(p: pathlib.Path) -> str:
-    ext = p.suffix.lower()
-    if ext == ".docx":
-      import docx as _docx
-      doc = _docx.Document(p)
-      return "\n".join(para.text for para in doc.paragraphs)
-    if ext == ".xlsx":
-      import openpyxl as _openpyxl
-      wb = _openpyxl.load_workbook(p, data_only=True, read_only=True)
-      rows = []
-      for sheet in wb.worksheets:
-        rows.append(f"--- Sheet: {sheet.title} ---")
-        for row in sheet.iter_rows(values_only=True):
-          if any(cell is not None for cell in row):
-            rows.append("\t".join(str(c) if c is not None else "" for c in row))
-      return "\n".join(rows)
-    if ext == ".pdf":
-      import pypdf as _pypdf
-      reader = _pypdf.PdfReader(p)
-      pages = []
-      for i, page in enumerate(reader.pages):
-        t = page.extract_text()
-        if t:
-          pages.append(f"--- Page {i + 1} ---\n{t}")
-      return "\n".join(pages)
-    # Plain text (best-effort decode).
-    return p.read_bytes().decode("utf-8", errors="replace")
+  @classmethod
+  def _chunk_text(cls, text: str, ext: str = "") -> list:
+    """Split text into ``(content, start_line, end_line)`` chunks (1-based lines).
+
+    A chunk ends at the last structural boundary that keeps it within
+    ``_CHUNK_CHARS``: a heading or, for code, a top-level definition; else a
+    paragraph break. Chunks with no such boundary are cut at a line end and
+    the next one starts ``_CHUNK_OVERLAP`` characters back.
+    """
+    return cls._chunk_spans(text, ext)[0]
+
+  @classmethod
+  def _iter_chunks(cls, blocks: Iterable[str], ext: str = "") -> Iterator[list]:
+    """Chunk a stream of text blocks (see ``extraction``), yielding lists of
+    chunks as soon as ~``_STREAM_BUFFER`` characters have arrived. Produces the
+    same chunks as ``_chunk_text`` on the joined text.
+    """
+    pending: list[str] = []
+    size = 0
+    line = 1
+    for block in blocks:
+      pending.append(block)
+      size += len(block)
+      if size < _STREAM_BUFFER:
+        continue
+      text = "".join(pending)
+      chunks, consumed = cls._chunk_spans(text, ext, final=False, first_line=line)
+      if chunks:
+        yield chunks
+      line += text.count("\n", 0, consumed)
+      pending = [text[consumed:]]
+      size = len(pending[0])
+    chunks, _ = cls._chunk_spans("".join(pending), ext, first_line=line)
+    if chunks:
+      yield chunks
 
   @staticmethod
-  def _chunk_text(text: str) -> list:
-    """Split text into overlapping character chunks with 1-based line ranges."""
-    if not text.strip():
-      return []
-
-    # Build a sorted list of char offsets at the start of each line so a chunk's
-    # char span can be mapped back to 1-based line numbers.
-    offsets = [0]
-    for i, ch in enumerate(text):
-      if ch == "\n":
-        offsets.append(i + 1)
-
-    def line_of(offset: int) -> int:
-      # Binary-ish search over sorted offsets.
-      lo, hi = 0, len(offsets) - 1
-      while lo < hi:
-        mid = (lo + hi + 1) // 2
-        if offsets[mid] <= offset:
-          lo = mid
-        else:
-          hi = mid - 1
-      return lo + 1  # 1-based
+  def _chunk_spans(text: str, ext: str, final: bool = True, first_line: int = 1) -> tuple[list, int]:
+    """Chunk *text* (whose first line is *first_line*). Unless *final*, more
+    text follows: stop before the last, incomplete window and also return the
+    offset it starts at, where chunking resumes once more text has arrived.
+    """
+    n = len(text)
+    if _NON_SPACE.search(text) is None:
+      return [], n
+    strong = [m.end() for m in _HEADINGS.finditer(text)]
+    if ext in _CODE_EXTS:
+      # Decorators start their definition: skip lines that follow one.
+      strong += [
+        m.end() for m in _DEFINITIONS.finditer(text)
+        if not text.startswith("@", text.rfind("\n", 0, m.start()) + 1)
+      ]
+      strong.sort()
+    weak = [m.end() for m in _PARAGRAPHS.finditer(text)]
+
+    def boundary(bounds: list, lo: int, hi: int) -> Optional[int]:
+      i = bisect.bisect_right(bounds, hi) - 1
+      return bounds[i] if i >= 0 and bounds[i] > lo else None
 
     chunks = []
-    n = len(text)
     start = 0
-    step = max(1, _CHUNK_CHARS - _CHUNK_OVERLAP)
+    line, line_at = first_line, 0   # cursor: *line* is the line holding offset *line_at*
+    # The boundary patterns look a few characters past the newline they match,
+    # so a partial buffer keeps some slack before its end.
+    reserve = 0 if final else _CHUNK_CHARS + 64
     while start < n:
-      end = min(n, start + _CHUNK_CHARS)
-      content = text[start:end].strip()
-      if content:
-        chunks.append((content, line_of(start), line_of(max(start, end - 1))))
-      start += step
-    return chunks
+      limit = start + _CHUNK_CHARS
+      if start + reserve >= n and not final:
+        return chunks, start
+      if limit >= n:
+        end = next_start = n
+      else:
+        end = boundary(strong, start + _CHUNK_MIN, limit) or boundary(weak, start + _CHUNK_MIN, limit)
+        if end is not None:
+          next_start = end
+        else:
+          newline = text.rfind("\n", start + _CHUNK_MIN, limit)
+          end = newline + 1 if newline >= 0 else limit
+          back = end - _CHUNK_OVERLAP
+          newline = text.find("\n", back, end - 1)
+          next_start = newline + 1 if newline >= 0 else back
+
+      # Trim surrounding whitespace by moving offsets: one slice per chunk.
+      first = _NON_SPACE.search(text, start, end)
+      if first is not None:
+        lo, hi = first.start(), end
+        while text[hi - 1].isspace():
+          hi -= 1
+        if lo >= line_at:
+          line += text.count("\n", line_at, lo)
+        else:
+          line -= text.count("\n", lo, line_at)
+        line_at = lo
+        chunks.append((text[lo:hi], line, line + text.count("\n", lo, hi)))
+      start = next_start
+    return chunks, n
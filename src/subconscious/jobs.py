@@ -5,17 +5,33 @@
     background. Every state change is published on the shared EventBus as a
     ``job.updated`` event so the desktop UI (and any other subscriber) can
     reflect progress live without polling.
+
+    Progress updates are coalesced per job to at most
+    :attr:`JobManager.MAX_UPDATES_PER_SEC` events; creation and terminal states
+    are always published immediately, and nothing is published while no one is
+    subscribed to ``job.*``.
+
+    Jobs launched with :meth:`JobManager.start` are owned by the manager: it
+    runs them as tasks and can cancel, pause and resume them. Jobs of a type
+    with a :meth:`JobManager.register`-ed runner are also persisted (with the
+    progress checkpoints they record) to the ``background_jobs`` table, so
+    :meth:`JobManager.restore` picks them up again after a restart or crash.
 """
 from __future__ import annotations
 
+import json
 import time
 import uuid
 import asyncio
 import logging
 from dataclasses import dataclass, field, asdict
-from typing import Optional
+from typing import Awaitable, Callable, Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 
 from .events import EventBus
+from .db.models import BackgroundJob
 
 
 logger = logging.getLogger("subconscious")
@@ -24,6 +40,7 @@ logger = logging.getLogger("subconscious")
 class JobStatus:
   """Lifecycle states for a background job."""
   RUNNING   = "running"
+  PAUSED    = "paused"
   COMPLETED = "completed"
   FAILED    = "failed"
   CANCELLED = "cancelled"
@@ -41,6 +58,9 @@ class Job:
   current: int = 0                # units completed so far
   message: str = ""               # latest human-readable status line
   error: Optional[str] = None
+  params: dict = field(default_factory=dict)   # runner arguments (JSON-serialisable)
+  checkpoint: Optional[dict] = None            # latest progress marker, given back on resume
+  cancellable: bool = False                    # owned by the manager (cancel/pause/resume)
   created_at: float = field(default_factory=time.time)
   updated_at: float = field(default_factory=time.time)
 
@@ -48,12 +68,38 @@ class Job:
     return asdict(self)
 
 
+# Runs (or resumes, from ``job.checkpoint``) a job; returns its final message.
+Runner = Callable[[Job], Awaitable[Optional[str]]]
+
+_UNFINISHED = (JobStatus.RUNNING, JobStatus.PAUSED)
+_SHUTDOWN = "shutdown"
+
+
 class JobManager:
   """Registry of background jobs with EventBus fan-out for the UI."""
 
-  def __init__(self, events: EventBus):
+  # Upper bound on job.updated events per job per second from update(). The
+  # latest state inside a window is sent when the window closes.
+  MAX_UPDATES_PER_SEC = 10.0
+  # Minimum seconds between persisted checkpoints of one job. Pausing or
+  # stopping a job always persists its latest checkpoint.
+  CHECKPOINT_INTERVAL = 2.0
+
+  def __init__(self, events: EventBus, max_updates_per_sec: Optional[float] = None, *, db=None):
     self._events = events
     self._jobs: dict[str, Job] = {}
+    rate = self.MAX_UPDATES_PER_SEC if max_updates_per_sec is None else max_updates_per_sec
+    self._min_interval = 1.0 / rate if rate > 0 else 0.0
+    self._last_emit: dict[str, float] = {}
+    self._trailing: dict[str, asyncio.TimerHandle] = {}
+    # Persistence for resumable jobs; None keeps every job in memory only.
+    self.db = db
+    self._runners: dict[str, Runner] = {}          # registered runner per job type
+    self._job_runners: dict[str, Runner] = {}      # runner of each owned job
+    self._persistent: set[str] = set()             # owned jobs stored in background_jobs
+    self._tasks: dict[str, asyncio.Task] = {}
+    self._stopping: dict[str, str] = {}            # job id → why its task was cancelled
+    self._saved_at: dict[str, float] = {}
 
   # ------------------------------------------------------------------
   # Mutations
@@ -87,7 +133,7 @@ class JobManager:
     elif job.total:
       job.progress = max(0.0, min(1.0, job.current / job.total))
     job.updated_at = time.time()
-    self._emit(job)
+    self._emit_throttled(job)
 
   def complete(self, job: Job, message: str = "") -> None:
     job.status = JobStatus.COMPLETED
@@ -95,23 +141,150 @@ class JobManager:
     if message:
       job.message = message
     job.updated_at = time.time()
-    self._emit(job)
+    self._emit(job, final=True)
 
   def fail(self, job: Job, error: str) -> None:
     job.status = JobStatus.FAILED
     job.error = error
     job.message = error
     job.updated_at = time.time()
-    self._emit(job)
+    self._emit(job, final=True)
 
   def clear_finished(self) -> None:
-    """Drop completed/failed/cancelled jobs, keeping only running ones."""
+    """Drop completed/failed/cancelled jobs, keeping running and paused ones."""
     self._jobs = {
-      k: v for k, v in self._jobs.items() if v.status == JobStatus.RUNNING
+      k: v for k, v in self._jobs.items() if v.status in _UNFINISHED
     }
     # Publish a generic refresh so the UI re-reads the list.
     self._publish({"type": "job.cleared", "data": {}})
 
+  # ------------------------------------------------------------------
+  # Owned jobs
+  # ------------------------------------------------------------------
+
+  def register(self, type: str, runner: Runner) -> None:
+    """Set the runner for jobs of *type*. Such jobs are persisted while
+    unfinished and resumed by :meth:`restore`."""
+    self._runners[type] = runner
+
+  def start(
+    self,
+    type: str,
+    title: str,
+    params: Optional[dict] = None,
+    *,
+    run: Optional[Runner] = None,
+    total: int = 0,
+  ) -> Job:
+    """Create a job and run it as a task owned by the manager.
+
+    The job runs the registered runner for *type* unless *run* is given; an
+    ad-hoc *run* can still be cancelled and paused, but isn't persisted (there
+    would be nothing to resume it with after a restart). The runner's return
+    value becomes the completion message; an exception fails the job.
+    """
+    runner = run or self._runners.get(type)
+    if runner is None:
+      raise ValueError(f"No runner registered for job type {type!r}")
+    job = Job(
+      id=str(uuid.uuid4()), type=type, title=title, total=total,
+      params=dict(params or {}), cancellable=True,
+    )
+    self._jobs[job.id] = job
+    self._own(job, runner, persistent=run is None)
+    self._emit(job)
+    self._spawn(job)
+    return job
+
+  def find(self, type: str, **params) -> Optional[Job]:
+    """The unfinished (running or paused) job of *type* whose params include *params*."""
+    for job in self._jobs.values():
+      if (
+        job.type == type and job.status in _UNFINISHED
+        and all(job.params.get(k) == v for k, v in params.items())
+      ):
+        return job
+    return None
+
+  async def cancel(self, job_id: str) -> bool:
+    """Stop a running or paused job for good, dropping its checkpoint.
+    Returns True once the job has stopped as cancelled."""
+    job = self._jobs.get(job_id)
+    if job is None or job.status not in _UNFINISHED or job_id not in self._job_runners:
+      return False
+    if job_id in self._tasks:
+      return await self._stop(job, JobStatus.CANCELLED)
+    self._settle(job, JobStatus.CANCELLED)
+    await self._forget(job)
+    return True
+
+  async def pause(self, job_id: str) -> bool:
+    """Stop a running job, keeping its checkpoint for :meth:`resume`.
+    Returns True once the job has stopped as paused (False if it finished
+    first)."""
+    job = self._jobs.get(job_id)
+    if job is None or job.status != JobStatus.RUNNING or job_id not in self._tasks:
+      return False
+    return await self._stop(job, JobStatus.PAUSED)
+
+  def resume(self, job_id: str) -> bool:
+    """Restart a paused job from its last checkpoint."""
+    job = self._jobs.get(job_id)
+    if job is None or job.status != JobStatus.PAUSED or job_id in self._tasks:
+      return False
+    job.status = JobStatus.RUNNING
+    job.updated_at = time.time()
+    self._emit(job)
+    self._spawn(job)
+    return True
+
+  async def checkpoint(self, job: Job, **state) -> None:
+    """Record progress for *job* (merged into ``job.checkpoint``), handed back
+    to the runner on resume. Persisted at most every ``CHECKPOINT_INTERVAL``."""
+    job.checkpoint = {**(job.checkpoint or {}), **state}
+    if job.id in self._persistent and time.monotonic() - self._saved_at.get(job.id, 0.0) >= self.CHECKPOINT_INTERVAL:
+      await self._save(job)
+
+  async def restore(self) -> int:
+    """Load unfinished jobs persisted by an earlier run: paused ones stay
+    paused, running ones are resumed from their checkpoints. Returns how many
+    jobs were restored."""
+    if self.db is None:
+      return 0
+    async with self.db.get_session() as session:
+      rows = (await session.scalars(select(BackgroundJob).order_by(BackgroundJob.created_at))).all()
+    restored = 0
+    for row in rows:
+      if row.id in self._jobs:
+        continue
+      runner = self._runners.get(row.type)
+      if runner is None:
+        logger.warning(f"Not restoring background job {row.id} of unknown type {row.type!r}")
+        continue
+      job = Job(
+        id=row.id, type=row.type, title=row.title,
+        status=JobStatus.PAUSED if row.status == JobStatus.PAUSED else JobStatus.RUNNING,
+        params=json.loads(row.params or "{}"),
+        checkpoint=json.loads(row.checkpoint) if row.checkpoint else None,
+        cancellable=True,
+      )
+      self._jobs[job.id] = job
+      self._own(job, runner, persistent=True)
+      self._emit(job)
+      if job.status == JobStatus.RUNNING:
+        self._spawn(job)
+      restored += 1
+    return restored
+
+  async def close(self) -> None:
+    """Stop every running job for shutdown. Resumable jobs keep their
+    checkpoint and running state, so :meth:`restore` resumes them."""
+    tasks = list(self._tasks.items())
+    for job_id, task in tasks:
+      self._stopping[job_id] = _SHUTDOWN
+      task.cancel()
+    await asyncio.gather(*(task for _, task in tasks), return_exceptions=True)
+
   # ------------------------------------------------------------------
   # Queries
   # ------------------------------------------------------------------
@@ -131,8 +304,124 @@ class JobManager:
   # Internals
   # ------------------------------------------------------------------
 
-  def _emit(self, job: Job) -> None:
-    self._publish({"type": "job.updated", "data": job.snapshot()})
+  def _own(self, job: Job, runner: Runner, persistent: bool) -> None:
+    self._job_runners[job.id] = runner
+    if persistent and self.db is not None:
+      self._persistent.add(job.id)
+
+  def _spawn(self, job: Job) -> None:
+    self._tasks[job.id] = asyncio.create_task(self._run(job))
+
+  async def _run(self, job: Job) -> None:
+    """Drive one owned job and settle its final (or paused) state."""
+    try:
+      await self._save(job)
+      message = await self._job_runners[job.id](job)
+    except asyncio.CancelledError:
+      reason = self._stopping.pop(job.id, None)
+      if reason == JobStatus.CANCELLED:
+        self._settle(job, JobStatus.CANCELLED)
+        await self._forget(job)
+      elif reason == JobStatus.PAUSED:
+        self._settle(job, JobStatus.PAUSED)
+        await self._save(job)
+      else:
+        await self._save(job)        # shutdown: resumed by the next restore()
+        if reason is None:
+          raise
+    except Exception as exc:
+      logger.error(f"Background job failed ({job.title}): {exc}")
+      self.fail(job, str(exc))
+      await self._forget(job)
+    else:
+      self.complete(job, message or job.message)
+      await self._forget(job)
+    finally:
+      self._tasks.pop(job.id, None)
+      self._stopping.pop(job.id, None)
+
+  async def _stop(self, job: Job, status: str) -> bool:
+    """Cancel *job*'s task and wait until it has wound down (its runner's
+    cleanup included), settling it as *status* unless it finished first."""
+    task = self._tasks[job.id]
+    self._stopping[job.id] = status
+    task.cancel()
+    await asyncio.wait([task])
+    if self._tasks.get(job.id) is task:     # cancelled before it ever ran
+      del self._tasks[job.id]
+      self._stopping.pop(job.id, None)
+      self._settle(job, status)
+      await (self._forget(job) if status == JobStatus.CANCELLED else self._save(job))
+    return job.status == status
+
+  def _settle(self, job: Job, status: str) -> None:
+    job.status = status
+    job.updated_at = time.time()
+    self._emit(job, final=True)
+
+  async def _save(self, job: Job) -> None:
+    """Upsert a resumable job's row (status, params and checkpoint)."""
+    if job.id not in self._persistent:
+      return
+    self._saved_at[job.id] = time.monotonic()
+    values = {
+      "type": job.type, "title": job.title, "status": job.status,
+      "params": json.dumps(job.params),
+      "checkpoint": json.dumps(job.checkpoint) if job.checkpoint is not None else None,
+    }
+    stmt = sqlite_insert(BackgroundJob).values(id=job.id, **values)
+    try:
+      async with self.db.write_session() as session:
+        await session.execute(stmt.on_conflict_do_update(index_elements=[BackgroundJob.id], set_=values))
+        await session.commit()
+    except Exception as exc:  # a lost checkpoint only costs redone work
+      logger.warning(f"Failed to save background job {job.id}: {exc}")
+
+  async def _forget(self, job: Job) -> None:
+    """Drop a finished job's row and bookkeeping."""
+    self._job_runners.pop(job.id, None)
+    self._saved_at.pop(job.id, None)
+    if job.id not in self._persistent:
+      return
+    self._persistent.discard(job.id)
+    try:
+      async with self.db.write_session() as session:
+        await session.execute(delete(BackgroundJob).where(BackgroundJob.id == job.id))
+        await session.commit()
+    except Exception as exc:
+      logger.warning(f"Failed to delete background job {job.id}: {exc}")
+
+  def _emit_throttled(self, job: Job) -> None:
+    """Emit now if the job's rate window has passed, else once when it does."""
+    if job.id in self._trailing:
+      return  # a flush is already scheduled and will carry this state
+    wait = self._last_emit.get(job.id, float("-inf")) + self._min_interval - time.monotonic()
+    if wait <= 0:
+      self._emit(job)
+      return
+    try:
+      loop = asyncio.get_running_loop()
+    except RuntimeError:
+      return
+    self._trailing[job.id] = loop.call_later(wait, self._flush_trailing, job.id)
+
+  def _flush_trailing(self, job_id: str) -> None:
+    self._trailing.pop(job_id, None)
+    job = self._jobs.get(job_id)
+    if job is not None and job.status == JobStatus.RUNNING:
+      self._emit(job)
+
+  def _emit(self, job: Job, final: bool = False) -> None:
+    handle = self._trailing.pop(job.id, None)
+    if handle is not None:
+      handle.cancel()
+    if final:
+      self._last_emit.pop(job.id, None)
+    else:
+      self._last_emit[job.id] = time.monotonic()
+    # Don't build the snapshot (or a task) for an event nobody will receive.
+    if self._events.has_subscribers("job.updated"):
+      self._publish({"type": "job.updated", "data": job.snapshot()})
 
   def _publish(self, event: dict) -> None:
     """Fire-and-forget publish; safe to call with no running loop."""
@@ -141,4 +430,6 @@ class JobManager:
     except RuntimeError:
       # No event loop (e.g. called from sync context/tests) — skip live event.
       return
+    if not self._events.has_subscribers(event["type"]):
+      return
     asyncio.create_task(self._events.publish(event))
@@ -50,7 +50,7 @@ class MobileEngine:
         "size": ["width", "height"],
         "maximized": [False, True],
       }
-      async with self.db.get_session() as session:
+      async with self.db.write_session() as session:
         for key, value in system_settings.items():
           exists = await session.scalar(
             select(AppState).where(AppState.key == key)
@@ -66,7 +66,7 @@ class MobileEngine:
     await self.db.init_models()
     await self.init_settings()
 
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       self.current_network = await session.scalar(
         select(AppState).where(AppState.key == "current_network")
       )
@@ -149,7 +149,7 @@ class MobileEngine:
 
   async def update_setting(self, key: str, value: str, tag: str = "system"):
     """Persist a setting."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       existing = await session.scalar(
         select(AppState).where(AppState.key == key, AppState.tag == tag)
       )
@@ -177,7 +177,7 @@ class MobileEngine:
     workspace_id: int,
     thread_id: Optional[int] = None,
   ) -> Thread:
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       if thread_id:
         thread = await session.get(Thread, thread_id)
         if thread:
@@ -202,7 +202,7 @@ class MobileEngine:
 
   async def save_message(self, thread_id: int, role: str, content: str) -> Message:
     """Persist a message and bump the thread's updated_at."""
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       msg = Message(thread_id=thread_id, role=role, content=content)
       session.add(msg)
       await session.execute(
@@ -225,7 +225,7 @@ class MobileEngine:
       return list(result.all())
 
   async def update_thread_title(self, thread_id: int, title: str) -> None:
-    async with self.db.get_session() as session:
+    async with self.db.write_session() as session:
       await session.execute(
         sql_update(Thread).where(Thread.id == thread_id).values(title=title)
       )
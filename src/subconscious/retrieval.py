@@ -0,0 +1,337 @@
+""" Workspace retrieval over the indexed chunk store.
+
+    Full-text search runs against the ``document_chunks_fts`` FTS5 index and
+    is ranked with BM25. Queries are free text: words are matched
+    individually (any word may match, chunks matching more rank higher),
+    ``"quoted text"`` matches a phrase and a trailing ``*`` matches a prefix
+    (``index*``). Each hit carries a highlighted snippet and the line range of
+    the matched text within its file.
+
+    Databases whose SQLite lacks FTS5 fall back to a substring match.
+
+    With embeddings enabled, :func:`fuse` merges the BM25 ranking with the
+    vector index's cosine ranking by reciprocal rank fusion, so chunks that
+    are close in meaning but share no words with the query still surface.
+
+    :func:`retrieve` is the entry point used by the engine (search API and
+    the agent's workspace context): it runs the search(es), fuses them and
+    optionally expands every hit with its neighbouring chunks. Every query
+    joins chunks with their document, so a search is a fixed number of
+    round-trips regardless of how many hits it returns.
+"""
+from __future__ import annotations
+
+import re
+import asyncio
+import logging
+from dataclasses import dataclass, asdict
+from typing import Optional
+
+from sqlalchemy import select, text, and_, or_
+from sqlalchemy.exc import OperationalError
+
+from .db.models import IndexedDocument, DocumentChunk
+
+
+logger = logging.getLogger("subconscious")
+
+
+# Markers wrapped around matched terms in snippets.
+SNIPPET_OPEN = "**"
+SNIPPET_CLOSE = "**"
+_SNIPPET_TOKENS = 24         # tokens of context per snippet
+
+# Private markers used to locate the matched text inside a chunk.
+_HIT_OPEN, _HIT_CLOSE = "\x01", "\x02"
+
+_RRF_K = 60                  # reciprocal rank fusion damping constant
+_CANDIDATES = 4              # per-ranking candidates fetched per requested hit when fusing
+
+_QUERY_PARTS = re.compile(r'"([^"]*)"|(\S+)')
+_WORDS = re.compile(r"\w+", re.UNICODE)
+
+# Words that carry no topic in a chat message; dropped by :func:`content_query`.
+_STOPWORDS = frozenset("""
+  about above after again all also and any are because been before being below between both but
+  can could did does doing down during each few for from further had has have having her here
+  hers him his how into its itself just more most not now off once only other our ours out over
+  own same she should some such than that the their them then there these they this those through
+  too under until very was were what when where which while who whom why will with would you your
+  yours yes okay thanks thank please hello one ones thing things something anything get got make
+  let know like want need tell show give use try see look
+""".split())
+
+_FTS_SEARCH = text(
+  "SELECT c.id, c.document_id, c.ordinal, c.content, c.start_line, c.end_line, d.path, "
+  "bm25(document_chunks_fts) AS score, "
+  f"snippet(document_chunks_fts, 0, :open, :close, '…', {_SNIPPET_TOKENS}) AS snippet, "
+  f"highlight(document_chunks_fts, 0, char(1), char(2)) AS marked "
+  "FROM document_chunks_fts "
+  "JOIN document_chunks c ON c.id = document_chunks_fts.rowid "
+  "JOIN indexed_documents d ON d.id = c.document_id "
+  "WHERE document_chunks_fts MATCH :match AND c.workspace_id = :workspace_id "
+  "ORDER BY score LIMIT :limit"
+)
+
+
+@dataclass
+class ChunkHit:
+  """One retrieved chunk and where it sits in its file.
+
+  Lines are 1-based and inclusive. ``match_start_line``/``match_end_line``
+  narrow the range to the matched text (the whole chunk for semantic-only
+  hits). ``score`` is higher-is-better: BM25 for a plain search, the fused
+  score after :func:`fuse`, which also records each component (None when that
+  ranking missed the chunk). ``context`` and its line range are only set by
+  :func:`expand_neighbours`.
+  """
+  chunk_id: int
+  document_id: int
+  path: str
+  ordinal: int
+  start_line: Optional[int]
+  end_line: Optional[int]
+  match_start_line: Optional[int]
+  match_end_line: Optional[int]
+  score: float
+  snippet: str
+  content: str
+  bm25: Optional[float] = None
+  cosine: Optional[float] = None
+  context: Optional[str] = None
+  context_start_line: Optional[int] = None
+  context_end_line: Optional[int] = None
+
+  def to_dict(self) -> dict:
+    return asdict(self)
+
+
+def build_match_query(query: str) -> str:
+  """ Translate free text into an FTS5 MATCH expression.
+
+      Every term is quoted, so FTS5 operators and punctuation in user input
+      can't produce a syntax error. Returns "" when there is nothing to match.
+  """
+  parts: list[str] = []
+  for phrase, word in _QUERY_PARTS.findall(query):
+    if phrase:
+      terms = _WORDS.findall(phrase)
+      if terms:
+        parts.append('"' + " ".join(terms) + '"')
+      continue
+    terms = _WORDS.findall(word)
+    parts.extend(f'"{t}"' for t in terms)
+    if terms and word.endswith("*"):
+      parts[-1] += "*"
+  return " OR ".join(parts)
+
+
+def content_query(text: str) -> str:
+  """ The content words of free *text* (a chat message, say) as a search query.
+
+      Lower-cased, de-duplicated, without stopwords or words under three
+      characters; "" when nothing is left worth searching for.
+  """
+  words = [w for w in _WORDS.findall(text.lower()) if len(w) > 2 and w not in _STOPWORDS]
+  return " ".join(dict.fromkeys(words))
+
+
+def _match_lines(marked: str, start_line: Optional[int]) -> tuple[Optional[int], Optional[int]]:
+  """ 1-based file lines spanned by the highlighted terms in *marked* """
+  first = marked.find(_HIT_OPEN)
+  if first < 0 or start_line is None:
+    return start_line, start_line
+  last = marked.rfind(_HIT_CLOSE)
+  return start_line + marked.count("\n", 0, first), start_line + marked.count("\n", 0, last)
+
+
+def _whole_chunk(chunk: DocumentChunk, path: str) -> ChunkHit:
+  """ A hit covering all of *chunk* (no located match) """
+  return ChunkHit(
+    chunk_id=chunk.id,
+    document_id=chunk.document_id,
+    path=path,
+    ordinal=chunk.ordinal,
+    start_line=chunk.start_line,
+    end_line=chunk.end_line,
+    match_start_line=chunk.start_line,
+    match_end_line=chunk.end_line,
+    score=0.0,
+    snippet=chunk.content[:200],
+    content=chunk.content,
+  )
+
+
+# ---------------------------------------------------------------------------
+# Rankings
+# ---------------------------------------------------------------------------
+
+async def search_chunks(session, workspace_id: int, query: str, limit: int = 8) -> list[ChunkHit]:
+  """ Rank a workspace's chunks against *query* by BM25, best first. """
+  match = build_match_query(query)
+  if not match:
+    return []
+  try:
+    rows = (await session.execute(_FTS_SEARCH, {
+      "match": match, "workspace_id": workspace_id, "limit": limit,
+      "open": SNIPPET_OPEN, "close": SNIPPET_CLOSE,
+    })).all()
+  except OperationalError as exc:
+    if "document_chunks_fts" not in str(exc) and "fts5" not in str(exc):
+      raise
+    logger.debug(f"FTS index unavailable, using substring search: {exc}")
+    return await _substring_search(session, workspace_id, query, limit)
+
+  results = []
+  for row in rows:
+    match_start, match_end = _match_lines(row.marked, row.start_line)
+    results.append(ChunkHit(
+      chunk_id=row.id,
+      document_id=row.document_id,
+      path=row.path,
+      ordinal=row.ordinal,
+      start_line=row.start_line,
+      end_line=row.end_line,
+      match_start_line=match_start,
+      match_end_line=match_end,
+      score=-row.score,   # bm25() is lower-is-better; expose higher-is-better
+      snippet=row.snippet,
+      content=row.content,
+      bm25=-row.score,
+    ))
+  return results
+
+
+async def _substring_search(session, workspace_id: int, query: str, limit: int) -> list[ChunkHit]:
+  """ Unranked fallback for SQLite builds without FTS5 """
+  rows = await session.execute(
+    select(DocumentChunk, IndexedDocument.path)
+    .join(IndexedDocument, IndexedDocument.id == DocumentChunk.document_id)
+    .where(
+      DocumentChunk.workspace_id == workspace_id,
+      DocumentChunk.content.contains(query.strip(), autoescape=True),
+    )
+    .limit(limit)
+  )
+  return [_whole_chunk(c, path) for c, path in rows.all()]
+
+
+async def fetch_chunks(session, chunk_ids: list) -> dict[int, ChunkHit]:
+  """ Whole-chunk hits for *chunk_ids* (one joined query), keyed by chunk id """
+  if not chunk_ids:
+    return {}
+  rows = await session.execute(
+    select(DocumentChunk, IndexedDocument.path)
+    .join(IndexedDocument, IndexedDocument.id == DocumentChunk.document_id)
+    .where(DocumentChunk.id.in_(chunk_ids))
+  )
+  return {c.id: _whole_chunk(c, path) for c, path in rows.all()}
+
+
+def fuse(lexical: list[ChunkHit], semantic: list[tuple[int, float]], chunks: dict[int, ChunkHit], limit: int) -> list[ChunkHit]:
+  """ Merge BM25 hits and ``(chunk_id, cosine)`` hits by reciprocal rank fusion.
+
+      *chunks* supplies hits for semantic-only results (see
+      :func:`fetch_chunks`). ``score`` becomes the fused score; ``bm25`` and
+      ``cosine`` keep the components.
+  """
+  fused: dict[int, ChunkHit] = {}
+  for rank, hit in enumerate(lexical):
+    hit.score = 1.0 / (_RRF_K + rank + 1)
+    fused[hit.chunk_id] = hit
+  for rank, (chunk_id, cosine) in enumerate(semantic):
+    hit = fused.get(chunk_id)
+    if hit is None:
+      hit = chunks.get(chunk_id)
+      if hit is None:
+        continue  # deleted since the vector index was built
+      fused[chunk_id] = hit
+    hit.cosine = cosine
+    hit.score += 1.0 / (_RRF_K + rank + 1)
+  return sorted(fused.values(), key=lambda h: h.score, reverse=True)[:limit]
+
+
+# ---------------------------------------------------------------------------
+# Expansion
+# ---------------------------------------------------------------------------
+
+async def expand_neighbours(session, hits: list[ChunkHit], radius: int = 1) -> list[ChunkHit]:
+  """ Fill each hit's ``context`` with the chunk plus up to *radius* chunks
+      either side of it in the same document (one query for all hits). """
+  if radius <= 0 or not hits:
+    return hits
+  rows = (await session.execute(
+    select(DocumentChunk.document_id, DocumentChunk.ordinal, DocumentChunk.content,
+           DocumentChunk.start_line, DocumentChunk.end_line)
+    .where(or_(*(
+      and_(DocumentChunk.document_id == hit.document_id,
+           DocumentChunk.ordinal.between(hit.ordinal - radius, hit.ordinal + radius))
+      for hit in hits
+    )))
+    .order_by(DocumentChunk.document_id, DocumentChunk.ordinal)
+  )).all()
+  by_document: dict[int, list] = {}
+  for row in rows:
+    by_document.setdefault(row.document_id, []).append(row)
+  for hit in hits:
+    around = [
+      row for row in by_document.get(hit.document_id, ())
+      if abs(row.ordinal - hit.ordinal) <= radius
+    ] or [hit]
+    hit.context = "\n".join(row.content for row in around)
+    hit.context_start_line = around[0].start_line
+    hit.context_end_line = around[-1].end_line
+  return hits
+
+
+# ---------------------------------------------------------------------------
+# Entry point
+# ---------------------------------------------------------------------------
+
+async def retrieve(
+  db,
+  workspace_id: int,
+  query: str,
+  *,
+  limit: int = 8,
+  neighbours: int = 0,
+  embedder=None,
+  vectors=None,
+  build_index: bool = True,
+) -> list[ChunkHit]:
+  """ The best *limit* chunks of a workspace for *query*.
+
+      BM25 only, unless an *embedder* and a ``VectorStore`` (*vectors*) are
+      given: then BM25 and cosine candidates are fused, falling back to BM25
+      alone when the embedder or vector index fails. With *build_index* off
+      the vector side is only used if the index is already loaded and current,
+      so a missing or stale index is never rebuilt on the caller's time.
+      *neighbours* > 0 expands each hit with that many surrounding chunks.
+  """
+  if not query or not query.strip() or not workspace_id or limit <= 0:
+    return []
+  hybrid = embedder is not None and vectors is not None
+  if hybrid and not build_index and vectors.loaded(workspace_id) is None:
+    hybrid = False
+  candidates = limit * _CANDIDATES if hybrid else limit
+  async with db.get_session() as session:
+    hits = await search_chunks(session, workspace_id, query, candidates)
+
+  semantic: list[tuple[int, float]] = []
+  if hybrid:
+    try:
+      (query_vector,) = await embedder.embed([query])
+      index = await vectors.get(workspace_id)
+      if index is not None:
+        semantic = await asyncio.to_thread(index.search, query_vector, candidates)
+    except Exception as exc:
+      logger.warning(f"Vector search unavailable, using BM25 only: {exc}")
+
+  async with db.get_session() as session:
+    if semantic:
+      known = {hit.chunk_id for hit in hits}
+      extra = await fetch_chunks(session, [chunk_id for chunk_id, _ in semantic if chunk_id not in known])
+      hits = fuse(hits, semantic, extra, limit)
+    else:
+      hits = hits[:limit]
+    return await expand_neighbours(session, hits, neighbours)
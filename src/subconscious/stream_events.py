@@ -8,8 +8,9 @@ multiple message bubbles
 from __future__ import annotations
 
 import json
+import asyncio
 from dataclasses import dataclass, field
-from typing import Any, Union
+from typing import Any, AsyncIterator, Optional, Union
 
 
 @dataclass
@@ -65,12 +66,114 @@ class ApprovalResolved:
   approved: bool
 
 
+@dataclass
+class AttachmentProgress:
+  """The turn's attachments are being read and inlined into the prompt.
+
+  Emitted with ``done=0`` before the model is called, then once per finished
+  attachment (``name``), so the UI can show "preparing attachments" rather
+  than appearing to hang on a large file. ``done == total`` means the prompt
+  is ready.
+  """
+  done: int
+  total: int
+  name: str = ""
+
+
 # Discriminated union of everything the event stream can yield.
 StreamEvent = Union[
-  TextDelta, ToolCallStarted, ToolCallResult, ApprovalRequest, ApprovalResolved
+  TextDelta, ToolCallStarted, ToolCallResult, ApprovalRequest, ApprovalResolved,
+  AttachmentProgress,
 ]
 
 
+# Default coalescing window for TextDelta batches: release buffered text after
+# this long, or as soon as this many UTF-8 bytes are waiting.
+DEFAULT_FLUSH_MS = 25.0
+DEFAULT_FLUSH_BYTES = 4096
+
+
+# Read-ahead bound between a coalesced stream's source and its consumer.
+_COALESCE_QUEUE_SIZE = 256
+_END = object()
+
+
+async def _read_ahead(events: AsyncIterator[StreamEvent], queue: asyncio.Queue) -> None:
+  """Drain *events* into *queue*, ending with ``_END`` or the raised exception."""
+  try:
+    async for event in events:
+      await queue.put(event)
+  except Exception as exc:
+    await queue.put(exc)
+    return
+  await queue.put(_END)
+
+
+async def coalesce_deltas(
+  events: AsyncIterator[StreamEvent],
+  *,
+  flush_ms: float = DEFAULT_FLUSH_MS,
+  flush_bytes: int = DEFAULT_FLUSH_BYTES,
+) -> AsyncIterator[StreamEvent]:
+  """Merge consecutive ``TextDelta`` events into batches.
+
+  Fast local models emit hundreds of tiny deltas per second; every one a
+  consumer forwards costs a JSON frame or a UI re-render. Buffered text is
+  released once it is *flush_ms* old or *flush_bytes* long, whichever comes
+  first, and always before any non-text event so ordering is preserved.
+  ``flush_ms <= 0`` passes every event straight through.
+
+  The source is read ahead by one task into a bounded queue, so a burst of
+  deltas is drained without suspending and only an idle stream arms a timer.
+  """
+  if flush_ms <= 0:
+    async for event in events:
+      yield event
+    return
+
+  loop = asyncio.get_running_loop()
+  queue: asyncio.Queue = asyncio.Queue(maxsize=_COALESCE_QUEUE_SIZE)
+  reader = asyncio.create_task(_read_ahead(events, queue))
+  buffer: list[str] = []
+  size = 0
+  deadline = 0.0
+  try:
+    while True:
+      if buffer and queue.empty():
+        try:
+          async with asyncio.timeout_at(deadline):
+            item = await queue.get()
+        except TimeoutError:
+          yield TextDelta(content="".join(buffer))
+          buffer, size = [], 0
+          continue
+      else:
+        item = await queue.get()
+
+      if item is _END:
+        break
+      if isinstance(item, Exception):
+        raise item
+      if isinstance(item, TextDelta):
+        if not buffer:
+          deadline = loop.time() + flush_ms / 1000
+        buffer.append(item.content)
+        size += len(item.content.encode("utf-8"))
+        if size >= flush_bytes or loop.time() >= deadline:
+          yield TextDelta(content="".join(buffer))
+          buffer, size = [], 0
+      else:
+        if buffer:
+          yield TextDelta(content="".join(buffer))
+          buffer, size = [], 0
+        yield item
+
+    if buffer:
+      yield TextDelta(content="".join(buffer))
+  finally:
+    reader.cancel()
+
+
 def _coerce_jsonable(value: Any) -> Any:
   """Best-effort convert an arbitrary tool arg/result into JSON-friendly data.
 
@@ -26,7 +26,7 @@ async def save_note(
     content: The body of the note (plain text or markdown).
     tags:    Optional comma-separated tags, e.g. 'recipe, vegetarian'.
   """
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     existing = await session.scalar(
       select(Note).where(Note.workspace_id == ctx.deps.workspace_id, Note.title == title)
     )
@@ -109,7 +109,7 @@ async def delete_note(ctx: RunContext[EngineContext], note_id: int) -> str:
   Args:
     note_id: The numeric ID of the note to delete.
   """
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     note = await session.get(Note, note_id)
     if not note or note.workspace_id != ctx.deps.workspace_id:
       return f"Note {note_id} not found."
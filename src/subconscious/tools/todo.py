@@ -44,7 +44,7 @@ async def add_todo(
     if not due:
       return {"error": f"Could not parse due_date '{due_date}'. Use 'YYYY-MM-DD' or 'YYYY-MM-DD HH:MM'."}
 
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     item = TodoItem(
       workspace_id=ctx.deps.workspace_id,
       thread_id=ctx.deps.thread_id or None,
@@ -122,7 +122,7 @@ async def update_todo(
     status:   New status: 'open', 'in_progress', 'done', 'cancelled' (optional).
     due_date: New due date 'YYYY-MM-DD' (optional, pass empty string to clear).
   """
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     item = await session.get(TodoItem, todo_id)
     if not item:
       return {"error": f"To-do item {todo_id} not found."}
@@ -155,7 +155,7 @@ async def complete_todo(ctx: RunContext[EngineContext], todo_id: int) -> str:
   Args:
     todo_id: The numeric ID of the to-do item.
   """
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     item = await session.get(TodoItem, todo_id)
     if not item:
       return f"To-do item {todo_id} not found."
@@ -173,7 +173,7 @@ async def delete_todo(ctx: RunContext[EngineContext], todo_id: int) -> str:
   Args:
     todo_id: The numeric ID of the to-do item to delete.
   """
-  async with ctx.deps.db.get_session() as session:
+  async with ctx.deps.db.write_session() as session:
     item = await session.get(TodoItem, todo_id)
     if not item:
       return f"To-do item {todo_id} not found."
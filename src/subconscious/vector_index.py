@@ -0,0 +1,273 @@
+""" Per-workspace vector index over chunk embeddings.
+
+    ``VectorStore`` builds one ``VectorIndex`` per workspace from the
+    embedding blobs in ``document_chunks`` and writes it to
+    ``<data_dir>/vectors/`` as a flat file that is memory-mapped for search,
+    so a large index costs page cache rather than Python heap and reopens
+    instantly after a restart. The indexer invalidates a workspace's index
+    whenever its chunks change; the next search rebuilds it.
+
+    Search is exact cosine similarity (vectors are stored normalised). NumPy is
+    used when installed; otherwise a pure-Python scan over the same mapping
+    answers the query, slower but with identical results.
+"""
+from __future__ import annotations
+
+import os
+import sys
+import json
+import mmap
+import heapq
+import asyncio
+import logging
+import pathlib
+import operator
+from array import array
+from typing import Optional, Sequence
+
+from sqlalchemy import select, func
+
+from .db.models import DocumentChunk
+from .embeddings import FLOAT32, INT8, blob_dtype, decode_vector, encode_vector
+
+try:
+  import numpy as np
+except ImportError:  # optional: pure-Python scan instead
+  np = None
+
+
+logger = logging.getLogger("subconscious")
+
+
+# File layout, little-endian throughout (as are the embedding blobs it is
+# built from): MAGIC | u32 header length | JSON header | padding to 8 |
+# int64 ids[count] | float32 scales[count] (int8 only) | matrix. The header
+# records the embedder model and dimension the vectors came from.
+_MAGIC = b"SCVEC1\n"
+_NATIVE_LE = sys.byteorder == "little"
+
+
+def _le(values: array) -> array:
+  """*values* in little-endian order (a copy on big-endian hosts)."""
+  if not _NATIVE_LE:
+    values = array(values.typecode, values)
+    values.byteswap()
+  return values
+
+
+class VectorIndex:
+  """An immutable, memory-mapped cosine index of one workspace's chunks."""
+
+  def __init__(self, path: pathlib.Path, header: dict, buf: mmap.mmap, offset: int):
+    self.path = path
+    self.header = header
+    self.count: int = header["count"]
+    self.dim: int = header["dim"]
+    self.dtype: str = header["dtype"]
+    self.model: Optional[str] = header.get("model")
+    self._buf = buf
+    self._ids_at = offset
+    self._scales_at = offset + 8 * self.count
+    self._matrix_at = self._scales_at + (4 * self.count if self.dtype == INT8 else 0)
+
+  # ------------------------------------------------------------------
+  # Files
+  # ------------------------------------------------------------------
+
+  @staticmethod
+  def write(
+    path: pathlib.Path, rows: Sequence[tuple[int, bytes]], signature: Sequence[int],
+    model: Optional[str] = None,
+  ) -> None:
+    """Write an index file for *rows* of ``(chunk_id, embedding blob)``, all
+    embedded by *model*."""
+    dtype = blob_dtype(rows[0][1]) if rows else FLOAT32
+    ids = array("q")
+    scales = array("f")
+    matrix = bytearray()
+    dim = 0
+    for chunk_id, blob in rows:
+      if blob_dtype(blob) != dtype:
+        blob = encode_vector(decode_vector(blob), dtype)
+      body = blob[5:] if dtype == INT8 else blob[1:]
+      row_dim = len(body) // (1 if dtype == INT8 else 4)
+      if dim and row_dim != dim:
+        continue  # malformed blob: one model always yields one dimension
+      dim = row_dim
+      ids.append(chunk_id)
+      if dtype == INT8:
+        scales.frombytes(blob[1:5])
+      matrix += body
+    header = json.dumps({
+      "count": len(ids), "dim": dim, "dtype": dtype, "model": model, "signature": list(signature),
+    }).encode()
+    prefix = _MAGIC + len(header).to_bytes(4, "little") + header
+    prefix += b"\0" * (-len(prefix) % 8)
+
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "wb") as f:
+      f.write(prefix)
+      f.write(_le(ids).tobytes())
+      if dtype == INT8:
+        f.write(scales.tobytes())
+      f.write(matrix)
+    os.replace(tmp, path)
+
+  @classmethod
+  def open(cls, path: pathlib.Path) -> Optional["VectorIndex"]:
+    """Map an index file; None if it is missing or unreadable."""
+    try:
+      with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+      return None
+    if buf[:len(_MAGIC)] != _MAGIC:
+      buf.close()
+      return None
+    at = len(_MAGIC)
+    size = int.from_bytes(buf[at:at + 4], "little")
+    header = json.loads(buf[at + 4:at + 4 + size])
+    offset = at + 4 + size
+    return cls(path, header, buf, offset + (-offset % 8))
+
+  def close(self) -> None:
+    try:
+      self._buf.close()
+    except BufferError:
+      pass  # a search still holds a view; the mapping goes when it finishes
+
+  # ------------------------------------------------------------------
+  # Search
+  # ------------------------------------------------------------------
+
+  def search(self, query: Sequence[float], k: int) -> list[tuple[int, float]]:
+    """Top *k* ``(chunk_id, cosine)`` pairs for a normalised *query*, best first."""
+    if not self.count or len(query) != self.dim or k <= 0:
+      return []
+    k = min(k, self.count)
+    if np is not None:
+      return self._search_numpy(query, k)
+    return self._search_python(query, k)
+
+  def _search_numpy(self, query: Sequence[float], k: int) -> list[tuple[int, float]]:
+    q = np.asarray(query, dtype=np.float32)
+    ids = np.frombuffer(self._buf, dtype="<i8", count=self.count, offset=self._ids_at)
+    if self.dtype == INT8:
+      matrix = np.frombuffer(self._buf, dtype=np.int8, count=self.count * self.dim, offset=self._matrix_at)
+      scales = np.frombuffer(self._buf, dtype="<f4", count=self.count, offset=self._scales_at)
+      scores = (matrix.reshape(self.count, self.dim) @ q) * scales
+    else:
+      matrix = np.frombuffer(self._buf, dtype="<f4", count=self.count * self.dim, offset=self._matrix_at)
+      scores = matrix.reshape(self.count, self.dim) @ q
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [(int(ids[i]), float(scores[i])) for i in top]
+
+  def _search_python(self, query: Sequence[float], k: int) -> list[tuple[int, float]]:
+    view = memoryview(self._buf)
+    try:
+      ids = view[self._ids_at:self._scales_at].cast("q")
+      width = 1 if self.dtype == INT8 else 4
+      matrix = view[self._matrix_at:self._matrix_at + self.count * self.dim * width].cast("b" if self.dtype == INT8 else "f")
+      scales = view[self._scales_at:self._matrix_at].cast("f") if self.dtype == INT8 else None
+      if not _NATIVE_LE:  # the mapping is little-endian: swap into native copies
+        ids = _le(array("q", ids))
+        matrix = matrix if self.dtype == INT8 else _le(array("f", matrix))
+        scales = _le(array("f", scales)) if scales is not None else None
+      dim, mul = self.dim, operator.mul
+
+      def scored():
+        for row in range(self.count):
+          score = sum(map(mul, matrix[row * dim:(row + 1) * dim], query))
+          yield (score * scales[row] if scales is not None else score), row
+
+      best = heapq.nlargest(k, scored())
+      return [(ids[row], score) for score, row in best]
+    finally:
+      view.release()
+
+
+class VectorStore:
+  """Lazily built, disk-backed ``VectorIndex`` per workspace.
+
+  With a *model*, only chunks embedded by that embedder model are indexed and
+  an index file built from another model's vectors is rebuilt, so vectors from
+  two models are never ranked together.
+  """
+
+  def __init__(self, db, directory: pathlib.Path, model: Optional[str] = None):
+    self.db = db
+    self.directory = pathlib.Path(directory)
+    self.model = model
+    self._indexes: dict[int, VectorIndex] = {}
+    self._stale: set[int] = set()
+    self._locks: dict[int, asyncio.Lock] = {}
+
+  def invalidate(self, workspace_id: int) -> None:
+    """Forget a workspace's index; the next :meth:`get` rebuilds it."""
+    self._stale.add(workspace_id)
+    index = self._indexes.pop(workspace_id, None)
+    if index is not None:
+      index.close()
+
+  def loaded(self, workspace_id: int) -> Optional[VectorIndex]:
+    """The workspace's index if it is already open and current, without any I/O."""
+    return self._indexes.get(workspace_id)
+
+  async def get(self, workspace_id: int) -> Optional[VectorIndex]:
+    """The workspace's index, or None when it has no embedded chunks."""
+    index = self._indexes.get(workspace_id)
+    if index is not None:
+      return index
+    async with self._locks.setdefault(workspace_id, asyncio.Lock()):
+      if workspace_id in self._indexes:
+        return self._indexes[workspace_id]
+      signature = await self._signature(workspace_id)
+      if not signature[0]:
+        return None
+      path = self.directory / f"workspace_{workspace_id}.vec"
+      if workspace_id not in self._stale:
+        index = VectorIndex.open(path)
+        if index is not None and (index.header.get("signature") != list(signature) or index.model != self.model):
+          index.close()
+          index = None
+      if index is None:
+        async with self.db.get_session() as session:
+          rows = (await session.execute(
+            select(DocumentChunk.id, DocumentChunk.embedding)
+            .where(*self._embedded(workspace_id))
+            .order_by(DocumentChunk.id)
+          )).all()
+        try:
+          self.directory.mkdir(parents=True, exist_ok=True)
+          await asyncio.to_thread(VectorIndex.write, path, rows, signature, self.model)
+        except OSError as exc:  # e.g. the old file is still mapped by a search on Windows
+          logger.warning(f"Could not write vector index for workspace {workspace_id}: {exc}")
+          return None
+        index = VectorIndex.open(path)
+        logger.debug(f"Built vector index for workspace {workspace_id}: {index.count if index else 0} vectors")
+      self._stale.discard(workspace_id)
+      if index is not None:
+        self._indexes[workspace_id] = index
+      return index
+
+  def _embedded(self, workspace_id: int) -> list:
+    """Filter for the workspace's chunks with a vector from this store's model."""
+    conditions = [DocumentChunk.workspace_id == workspace_id, DocumentChunk.embedding.is_not(None)]
+    if self.model is not None:
+      conditions.append(DocumentChunk.embedding_model == self.model)
+    return conditions
+
+  async def _signature(self, workspace_id: int) -> tuple[int, int, int]:
+    """(count, max id, sum of ids) of the embedded chunks — cheap change detection."""
+    async with self.db.get_session() as session:
+      row = (await session.execute(
+        select(func.count(), func.coalesce(func.max(DocumentChunk.id), 0), func.coalesce(func.sum(DocumentChunk.id), 0))
+        .where(*self._embedded(workspace_id))
+      )).one()
+    return int(row[0]), int(row[1]), int(row[2])
+
+  def close(self) -> None:
+    for index in self._indexes.values():
+      index.close()
+    self._indexes.clear()
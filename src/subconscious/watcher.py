@@ -0,0 +1,149 @@
+""" Filesystem watching for continuous, incremental workspace indexing.
+
+    ``WorkspaceWatcher`` follows the directories attached to a workspace and
+    hands every debounced batch of changed paths to
+    :meth:`WorkspaceIndexer.index_paths`, which re-indexes just those files and
+    prunes deleted ones — the index stays fresh without full rescans.
+
+    Native notifications come from ``watchfiles`` (inotify on Linux,
+    FSEvents / ReadDirectoryChangesW elsewhere). When native watching can't be
+    set up (e.g. the inotify watch limit is exhausted, or network mounts) it
+    polls instead; without ``watchfiles`` at all it falls back to periodic
+    stat-only re-index passes.
+"""
+from __future__ import annotations
+
+import os
+import asyncio
+import logging
+from typing import Optional
+
+from .indexing import WorkspaceIndexer
+
+try:
+  import watchfiles
+except ImportError:  # optional: shipped with uvicorn[standard], absent on mobile
+  watchfiles = None
+
+
+logger = logging.getLogger("subconscious")
+
+
+class WorkspaceWatcher:
+  """Keeps one watch task per watched workspace."""
+
+  _DEBOUNCE_MS = 1000         # quiet period before a batch of changes is indexed
+  _POLL_DELAY_MS = 2000       # watchfiles polling interval when native watching fails
+  _RESCAN_INTERVAL = 30.0     # seconds between stat passes without watchfiles
+
+  def __init__(
+    self,
+    indexer: WorkspaceIndexer,
+    *,
+    debounce_ms: Optional[int] = None,
+    force_polling: bool = False,
+  ):
+    self.indexer = indexer
+    self.debounce_ms = self._resolve_debounce(debounce_ms)
+    self.force_polling = force_polling
+    self._tasks: dict[int, asyncio.Task] = {}
+    self._stops: dict[int, asyncio.Event] = {}
+
+  @classmethod
+  def _resolve_debounce(cls, debounce_ms: Optional[int]) -> int:
+    """ Explicit arg → ``SUBCONSCIOUS_WATCH_DEBOUNCE_MS`` → ``_DEBOUNCE_MS`` """
+    if debounce_ms is None:
+      try:
+        debounce_ms = int(os.environ.get("SUBCONSCIOUS_WATCH_DEBOUNCE_MS", ""))
+      except ValueError:
+        debounce_ms = cls._DEBOUNCE_MS
+    return max(1, debounce_ms)
+
+  # ------------------------------------------------------------------
+  # Public
+  # ------------------------------------------------------------------
+
+  def watch(self, workspace_id: int, directories: list) -> None:
+    """(Re)start watching *directories* for *workspace_id*."""
+    self.unwatch(workspace_id)
+    directories = [os.path.abspath(d) for d in directories if os.path.isdir(d)]
+    if not directories:
+      return
+    stop = asyncio.Event()
+    self._stops[workspace_id] = stop
+    self._tasks[workspace_id] = asyncio.create_task(self._run(workspace_id, directories, stop))
+
+  def unwatch(self, workspace_id: int) -> None:
+    """Stop watching a workspace (no-op if it isn't watched)."""
+    stop = self._stops.pop(workspace_id, None)
+    if stop is not None:
+      stop.set()
+    task = self._tasks.pop(workspace_id, None)
+    if task is not None:
+      task.cancel()
+
+  def is_watching(self, workspace_id: int) -> bool:
+    task = self._tasks.get(workspace_id)
+    return task is not None and not task.done()
+
+  async def close(self) -> None:
+    """Stop every watch and wait for the tasks to finish."""
+    tasks = list(self._tasks.values())
+    for workspace_id in list(self._tasks):
+      self.unwatch(workspace_id)
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+  # ------------------------------------------------------------------
+  # Internals
+  # ------------------------------------------------------------------
+
+  async def _run(self, workspace_id: int, directories: list, stop: asyncio.Event) -> None:
+    if watchfiles is None:
+      await self._rescan(workspace_id, directories, stop)
+      return
+    force_polling = self.force_polling
+    while not stop.is_set():
+      try:
+        async for changes in watchfiles.awatch(
+          *directories,
+          debounce=self.debounce_ms,
+          stop_event=stop,
+          force_polling=force_polling,
+          poll_delay_ms=self._POLL_DELAY_MS,
+        ):
+          await self._apply(workspace_id, directories, {path for _, path in changes})
+        return
+      except asyncio.CancelledError:
+        raise
+      except Exception as exc:
+        if force_polling:
+          logger.error(f"Watching workspace {workspace_id} failed: {exc}")
+          return
+        logger.warning(f"Native file watching unavailable for workspace {workspace_id} ({exc}); polling instead")
+        force_polling = True
+
+  async def _rescan(self, workspace_id: int, directories: list, stop: asyncio.Event) -> None:
+    """Fallback without watchfiles: periodic re-index passes, which skip
+    unchanged files on stat alone. Each pass is an "index" job, skipped while
+    another re-index of the workspace is running or paused."""
+    jobs = self.indexer.jobs
+
+    async def run(job) -> str:
+      await self.indexer.reindex(workspace_id, directories, job)
+      return job.message
+
+    while not stop.is_set():
+      try:
+        await asyncio.wait_for(stop.wait(), timeout=self._RESCAN_INTERVAL)
+        return
+      except asyncio.TimeoutError:
+        pass
+      if jobs.find("index", workspace_id=workspace_id) is None:
+        jobs.start("index", "Checking for changed files", {"workspace_id": workspace_id}, run=run)
+
+  async def _apply(self, workspace_id: int, directories: list, paths: set) -> None:
+    try:
+      indexed = await self.indexer.index_paths(workspace_id, directories, paths)
+      logger.debug(f"Watcher: {len(paths)} changed paths, {indexed} re-indexed (workspace {workspace_id})")
+    except Exception as exc:  # keep watching after a failed batch
+      logger.warning(f"Watch indexing failed for workspace {workspace_id}: {exc}")
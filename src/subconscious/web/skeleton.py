@@ -479,7 +479,7 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
     set_is_streaming(False)
 
   async def handle_save_workspace(name, description, ws_id=None):
-    async with engine.db.get_session() as session:
+    async with engine.db.write_session() as session:
       if ws_id:
         ws = await session.get(Workspace, ws_id)
         if ws:
@@ -506,7 +506,7 @@ def AppView(page: ft.Page, engine) -> list[ft.Control]:
       page.update()
 
     async def do_delete(e):
-      async with engine.db.get_session() as session:
+      async with engine.db.write_session() as session:
         ws = await session.get(Workspace, ws_id)
         if ws:
           await session.delete(ws)
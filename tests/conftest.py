@@ -44,6 +44,10 @@ class FakeDatabase:
   def get_session(self) -> AsyncSession:
     return self._session_factory()
 
+  def write_session(self) -> AsyncSession:
+    # A single shared in-memory engine has nothing to serialise against.
+    return self._session_factory()
+
 
 @pytest_asyncio.fixture
 async def db(async_engine):
@@ -0,0 +1,77 @@
+"""
+Tests for the model / toolset / agent caches in ``AgentManager.build_agent``.
+"""
+
+from subconscious.agent import AgentManager
+
+
+def _manager() -> AgentManager:
+  return AgentManager(config=None)  # type: ignore[arg-type]
+
+
+def _cfg(**overrides) -> dict:
+  cfg = {"provider": "ollama", "model": "llama3", "base_url": "http://localhost:11434"}
+  cfg.update(overrides)
+  return cfg
+
+
+def tool_a() -> str:
+  """Tool A."""
+  return "a"
+
+
+def tool_b() -> str:
+  """Tool B."""
+  return "b"
+
+
+def test_warm_build_reuses_agent_and_model():
+  manager = _manager()
+  first = manager.build_agent(_cfg())
+  second = manager.build_agent(_cfg())
+  assert first is second
+
+
+def test_prompt_change_reuses_model_instance():
+  manager = _manager()
+  plain = manager.build_agent(_cfg())
+  ambient = manager.build_agent(_cfg(), ambient_context="OS: Linux")
+  assert plain is not ambient
+  assert plain.model is ambient.model
+
+
+def test_credential_change_builds_new_model():
+  manager = _manager()
+  old = manager.build_agent(_cfg(api_key="one"))
+  new = manager.build_agent(_cfg(api_key="two"))
+  assert old.model is not new.model
+
+
+def test_toolsets_keyed_by_enabled_tool_set():
+  manager = _manager()
+  first = manager.build_agent(_cfg(), tools=[tool_a, tool_b])
+  reordered = manager.build_agent(_cfg(), tools=[tool_b, tool_a])
+  fewer = manager.build_agent(_cfg(), tools=[tool_a])
+  assert first is reordered
+  assert fewer is not first
+  assert len(manager._toolsets) == 2
+
+
+def test_invalidate_drops_cached_instances():
+  manager = _manager()
+  before = manager.build_agent(_cfg())
+  manager.invalidate()
+  after = manager.build_agent(_cfg())
+  assert before is not after
+  assert before.model is not after.model
+
+
+def test_caches_are_lru_bounded(monkeypatch):
+  monkeypatch.setattr(AgentManager, "_MODEL_CACHE_SIZE", 2)
+  manager = _manager()
+  first = manager.build_agent(_cfg(model="m0"))
+  manager.build_agent(_cfg(model="m1"))
+  manager.build_agent(_cfg(model="m0"))   # refresh m0
+  manager.build_agent(_cfg(model="m2"))   # evicts m1
+  assert len(manager._models) == 2
+  assert manager.build_agent(_cfg(model="m0")).model is first.model
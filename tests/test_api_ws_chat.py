@@ -0,0 +1,234 @@
+"""
+Tests for multiplexed chat over the ``/api/v1/events`` WebSocket.
+
+A stub engine stands in for the real one so the tests exercise only the
+frame protocol: concurrent ``chat.send`` turns keyed by correlation id,
+``chat.cancel``, ``approval.resolve`` and the per-connection cap.
+"""
+
+import asyncio
+import contextlib
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+import subconscious.api.app as app_module
+from subconscious.api.app import API_PREFIX, create_app
+from subconscious.events import EventBus
+from subconscious.retrieval import ChunkHit
+from subconscious.stream_events import TextDelta, ApprovalRequest, ApprovalResolved
+
+
+_TOKEN = "test-token"
+
+
+class _StubSession:
+  async def scalar(self, stmt):
+    return SimpleNamespace(id=1, workspace_id=1)
+
+
+class _StubDB:
+  @contextlib.asynccontextmanager
+  async def _session(self):
+    yield _StubSession()
+
+  def get_session(self):
+    return self._session()
+
+
+class _StubEngine:
+  """Streams the prompt back one word per delta.
+
+  A prompt of ``"wait"`` blocks until ``release()``; ``"tool"`` asks for an
+  approval first.
+  """
+
+  def __init__(self):
+    self.events = EventBus()
+    self.db = _StubDB()
+    self.config = None
+    self.saved: list[tuple[str, str]] = []
+    self.gate: asyncio.Event | None = None
+    self._approvals: dict[str, asyncio.Future] = {}
+
+  async def save_message(self, thread_id, role, content):
+    self.saved.append((role, content))
+
+  async def search_workspace(self, workspace_id, query, limit=8, neighbours=0):
+    self.searched = (workspace_id, query, limit, neighbours)
+    return [ChunkHit(
+      chunk_id=7, document_id=3, path="/proj/readme.md", ordinal=0, start_line=1, end_line=3,
+      match_start_line=2, match_end_line=2, score=1.5, snippet="**local**", content="a\nlocal\nc",
+      bm25=1.5,
+    )]
+
+  def resolve_approval(self, tool_call_id, approved):
+    self._approvals[tool_call_id].set_result(approved)
+    return True
+
+  async def stream_chat_events(self, content, thread_id, **kwargs):
+    if content == "tool":
+      fut = self._approvals["call-1"] = asyncio.get_running_loop().create_future()
+      yield ApprovalRequest(tool_name="rm", args={}, tool_call_id="call-1", operation="delete")
+      approved = await fut
+      yield ApprovalResolved(tool_call_id="call-1", approved=approved)
+    if content == "wait":
+      yield TextDelta(content="partial")
+      self.gate = self.gate or asyncio.Event()
+      await self.gate.wait()
+    for word in content.split():
+      await asyncio.sleep(0)
+      yield TextDelta(content=word)
+
+
+@pytest.fixture
+def client():
+  engine = _StubEngine()
+  with TestClient(create_app(engine, _TOKEN)) as c:  # type: ignore[arg-type]
+    c.stub = engine
+    yield c
+
+
+def _send(ws, corr, content, **extra):
+  ws.send_json({"v": 1, "type": "chat.send", "id": corr,
+                "data": {"thread_uuid": "t", "content": content, **extra}})
+
+
+def _collect_until(ws, predicate) -> list[dict]:
+  frames = []
+  while True:
+    frame = ws.receive_json()
+    frames.append(frame)
+    if predicate(frame):
+      return frames
+
+
+def test_second_chat_completes_while_first_is_streaming(client):
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}") as ws:
+    _send(ws, "slow", "wait")
+    _send(ws, "fast", "one two")
+    frames = _collect_until(ws, lambda f: f["type"] == "chat.done" and f["id"] == "fast")
+    assert "".join(f["data"]["delta"] for f in frames if f["type"] == "chat.delta" and f["id"] == "fast") == "onetwo"
+    assert not any(f["type"] == "chat.done" and f["id"] == "slow" for f in frames)
+    ws.send_json({"v": 1, "type": "chat.cancel", "id": "slow"})
+    _collect_until(ws, lambda f: f["type"] == "chat.done" and f["id"] == "slow")
+
+
+def test_cancel_keeps_partial_reply(client):
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}") as ws:
+    _send(ws, "c1", "wait")
+    _collect_until(ws, lambda f: f["type"] == "chat.delta")
+    ws.send_json({"v": 1, "type": "chat.cancel", "id": "c1"})
+    done = _collect_until(ws, lambda f: f["type"] == "chat.done")[-1]
+  assert done == {"v": 1, "type": "chat.done", "id": "c1", "data": {"cancelled": True}}
+  assert ("agent", "partial") in client.stub.saved
+
+
+def test_approval_resolve_frame_unblocks_turn(client):
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}") as ws:
+    _send(ws, "a1", "tool", auto_approve=False)
+    request = _collect_until(ws, lambda f: f["type"] == "approval.request")[-1]
+    assert request["data"]["tool_call_id"] == "call-1"
+    ws.send_json({"v": 1, "type": "approval.resolve", "data": {"tool_call_id": "call-1", "approved": True}})
+    frames = _collect_until(ws, lambda f: f["type"] == "chat.done")
+  resolved = [f for f in frames if f["type"] == "approval.resolved"]
+  assert resolved[0]["data"] == {"tool_call_id": "call-1", "approved": True}
+
+
+def test_approval_resolve_ignores_tool_calls_of_other_connections(client):
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}") as ws, \
+       client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}") as other:
+    _send(ws, "a1", "tool", auto_approve=False)
+    _collect_until(ws, lambda f: f["type"] == "approval.request")
+    other.send_json({"v": 1, "type": "approval.resolve", "data": {"tool_call_id": "call-1", "approved": False}})
+    other.send_json({"v": 1, "type": "subscribe", "id": "s1", "data": {}})
+    _collect_until(other, lambda f: f["type"] == "subscribed")   # the resolve was handled first
+    assert not client.stub._approvals["call-1"].done()
+    ws.send_json({"v": 1, "type": "approval.resolve", "data": {"tool_call_id": "call-1", "approved": True}})
+    frames = _collect_until(ws, lambda f: f["type"] == "chat.done")
+  resolved = [f for f in frames if f["type"] == "approval.resolved"]
+  assert resolved[0]["data"] == {"tool_call_id": "call-1", "approved": True}
+
+
+def test_disconnect_waits_for_partial_reply_to_be_saved(client):
+  save_message = client.stub.save_message
+
+  async def slow_save_message(thread_id, role, content):
+    await asyncio.sleep(0.05)
+    await save_message(thread_id, role, content)
+
+  client.stub.save_message = slow_save_message
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}") as ws:
+    _send(ws, "c1", "wait")
+    _collect_until(ws, lambda f: f["type"] == "chat.delta")
+  assert ("agent", "partial") in client.stub.saved
+
+
+def test_flush_ms_zero_sends_every_delta(client):
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}&flush_ms=0") as ws:
+    _send(ws, "raw", "one two three")
+    frames = _collect_until(ws, lambda f: f["type"] == "chat.done")
+  assert [f["data"]["delta"] for f in frames if f["type"] == "chat.delta"] == ["one", "two", "three"]
+
+
+def test_duplicate_id_is_rejected(client):
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}") as ws:
+    _send(ws, "dup", "wait")
+    _send(ws, "dup", "again")
+    error = _collect_until(ws, lambda f: f["type"] == "chat.error")[-1]
+    assert error["id"] == "dup"
+    ws.send_json({"v": 1, "type": "chat.cancel", "id": "dup"})
+    _collect_until(ws, lambda f: f["type"] == "chat.done")
+
+
+def test_concurrency_cap_queues_extra_turns(client, monkeypatch):
+  monkeypatch.setattr(app_module, "WS_MAX_CONCURRENT_CHATS", 1)
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}") as ws:
+    _send(ws, "first", "wait")
+    _collect_until(ws, lambda f: f["type"] == "chat.delta")
+    _send(ws, "queued", "hello")
+    ws.send_json({"v": 1, "type": "chat.cancel", "id": "first"})
+    frames = _collect_until(ws, lambda f: f["type"] == "chat.done" and f["id"] == "queued")
+  order = [f["id"] for f in frames if f["type"] == "chat.done"]
+  assert order == ["first", "queued"]
+
+
+def test_since_replays_missed_events(client):
+  async def _backlog():
+    for i in range(3):
+      await client.stub.events.publish({"type": "thread.updated", "data": {"i": i}})
+  asyncio.run(_backlog())
+
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}&since=1") as ws:
+    assert [ws.receive_json()["seq"] for _ in range(2)] == [2, 3]
+
+  with client.websocket_connect(f"{API_PREFIX}/events?token={_TOKEN}&since=50") as ws:
+    assert ws.receive_json() == {"v": 1, "type": "events.resync", "data": {"seq": 3}}
+
+
+def test_query_filters_apply_to_replay_and_subscribe_frame_acks(client):
+  async def _backlog():
+    await client.stub.events.publish({"type": "thread.updated", "data": {"workspace_uuid": "w1"}})
+    await client.stub.events.publish({"type": "message.created", "data": {"workspace_uuid": "w2"}})
+    await client.stub.events.publish({"type": "message.created", "data": {"workspace_uuid": "w1"}})
+  asyncio.run(_backlog())
+
+  url = f"{API_PREFIX}/events?token={_TOKEN}&since=0&types=message.*&workspace_uuid=w1"
+  with client.websocket_connect(url) as ws:
+    assert ws.receive_json()["seq"] == 3
+    ws.send_json({"v": 1, "type": "subscribe", "id": "s1", "data": {"types": ["job.*"]}})
+    ack = ws.receive_json()
+    assert ack["type"] == "subscribed" and ack["id"] == "s1"
+    assert ack["data"] == {"types": ["job.*"], "workspace_uuid": None, "thread_uuid": None}
+
+
+def test_workspace_search_endpoint(client):
+  headers = {"Authorization": f"Bearer {_TOKEN}"}
+  res = client.get(f"{API_PREFIX}/workspaces/w/search", params={"q": "local", "limit": 3, "neighbours": 1}, headers=headers)
+  assert res.status_code == 200
+  assert client.stub.searched == (1, "local", 3, 1)
+  [hit] = res.json()
+  assert hit["path"] == "/proj/readme.md" and (hit["match_start_line"], hit["match_end_line"]) == (2, 2)
+  assert hit["bm25"] == 1.5 and hit["cosine"] is None and "chunk_id" not in hit
+  assert client.get(f"{API_PREFIX}/workspaces/w/search", params={"q": ""}, headers=headers).status_code == 422
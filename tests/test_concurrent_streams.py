@@ -0,0 +1,170 @@
+"""
+Concurrency harness for ``Engine.stream_chat_events``.
+
+A fake provider records the credentials it was constructed with and a
+``FunctionModel`` streams them back as the reply, interleaving with every
+other stream at each chunk. Running many turns at once across providers and
+keys then proves that each stream authenticates with its own model config
+and that the process environment is never touched.
+"""
+
+import os
+import time
+import asyncio
+import pathlib
+
+import pytest
+from pydantic_ai.models.function import FunctionModel
+
+import subconscious.agent as agent_module
+from subconscious.agent import AgentManager
+from subconscious.engine import Engine
+from subconscious.stream_events import TextDelta, AttachmentProgress
+from subconscious.tools import ToolRegistry
+
+
+_STREAMS = 60
+_PROVIDERS = ("openai", "anthropic", "deepseek")
+
+
+class FakeProvider:
+  """Stand-in provider that only remembers how it was authenticated."""
+
+  def __init__(self, api_key=None, base_url=None):
+    self.api_key = api_key
+    self.base_url = base_url
+
+
+def _fake_infer_model(model_name: str, provider_factory):
+  provider = provider_factory(model_name.split(":", 1)[0])
+
+  async def _stream(messages, info):
+    for part in (provider.api_key or "<none>").split("-"):
+      await asyncio.sleep(0)   # yield so every stream interleaves
+      yield part + "|"
+
+  return FunctionModel(stream_function=_stream)
+
+
+@pytest.fixture
+def engine(db, monkeypatch, tmp_path):
+  monkeypatch.setattr(agent_module, "infer_provider_class", lambda name: FakeProvider)
+  monkeypatch.setattr(agent_module, "infer_model", _fake_infer_model)
+  engine = Engine.__new__(Engine)
+  engine.db = db
+  engine.agent_manager = AgentManager(config=None)  # type: ignore[arg-type]
+  engine.tool_registry = ToolRegistry()
+  engine.system_info = None
+  engine._share_system_context = False
+  engine.config = type("Cfg", (), {"data_dir": pathlib.Path(tmp_path)})()
+  return engine
+
+
+async def _run_stream(engine: Engine, index: int) -> tuple[str, str]:
+  key = f"key-{index}-secret"
+  model_cfg = {
+    "provider": _PROVIDERS[index % len(_PROVIDERS)],
+    "model": "fake-model",
+    "api_key": key,
+    "history_policy": "drop",
+  }
+  chunks = []
+  async for event in engine.stream_chat_events(
+    f"hello {index}", thread_id=900_000 + index, model_cfg=model_cfg,
+    enabled_tools=[], auto_approve=True,
+  ):
+    if isinstance(event, TextDelta):
+      chunks.append(event.content)
+  return key, "".join(chunks)
+
+
+async def test_parallel_streams_use_their_own_credentials(engine):
+  env_before = dict(os.environ)
+  results = await asyncio.gather(*(_run_stream(engine, i) for i in range(_STREAMS)))
+
+  for key, reply in results:
+    assert reply == "|".join(key.split("-")) + "|"
+  assert dict(os.environ) == env_before
+  # One cached model per distinct credential, shared by nothing else.
+  assert len(engine.agent_manager._models) == min(_STREAMS, AgentManager._MODEL_CACHE_SIZE)
+
+
+async def test_attachments_render_off_the_event_loop(engine, monkeypatch, tmp_path):
+  (tmp_path / "notes.md").write_text("# Notes\nremember the milk\n")
+  (tmp_path / "docs").mkdir()
+  (tmp_path / "docs" / "a.txt").write_text("a")
+  attachments = [
+    {"path": str(tmp_path / "notes.md"), "type": "file", "name": "notes.md"},
+    {"path": str(tmp_path / "docs"), "type": "folder", "name": "docs"},
+    {"path": str(tmp_path / "gone.pdf"), "type": "file", "name": "gone.pdf"},
+    {"path": str(tmp_path / "notes.md"), "type": "file", "name": "again.md"},
+  ]
+  render = Engine._render_attachment
+
+  def slow_render(self, a):
+    time.sleep(0.2)                       # a large PDF being parsed
+    return render(self, a)
+
+  monkeypatch.setattr(Engine, "_render_attachment", slow_render)
+  ticks = 0
+
+  async def ticker():
+    nonlocal ticks
+    while True:
+      await asyncio.sleep(0.01)
+      ticks += 1
+
+  ticking = asyncio.create_task(ticker())
+  sections: list = []
+  started = time.perf_counter()
+  try:
+    progress = [p async for p in engine._render_attachments(attachments, sections)]
+  finally:
+    ticking.cancel()
+  elapsed = time.perf_counter() - started
+
+  assert elapsed < 0.6                    # rendered in parallel, not 4 x 0.2 s
+  assert ticks >= 10                      # the loop kept running meanwhile
+  assert [(p.done, p.total) for p in progress] == [(0, 4), (1, 4), (2, 4), (3, 4), (4, 4)]
+  assert sorted(p.name for p in progress[1:]) == ["again.md", "docs", "gone.pdf", "notes.md"]
+  prompt = Engine._build_prompt_with_attachments("what should I buy?", sections)
+  assert prompt.index("### File: notes.md") < prompt.index("### Folder: docs") < prompt.index("[File not found:")
+  assert "remember the milk" in prompt and prompt.endswith("---\n\nwhat should I buy?")
+
+
+async def test_stream_reports_attachment_progress_before_the_reply(engine, tmp_path):
+  (tmp_path / "notes.md").write_text("remember the milk\n")
+  events = [e async for e in engine.stream_chat_events(
+    "hello", thread_id=990_001, model_cfg={"provider": "openai", "model": "fake-model", "api_key": "k", "history_policy": "drop"},
+    attachments=[{"path": str(tmp_path / "notes.md"), "type": "file", "name": "notes.md"}],
+    enabled_tools=[], auto_approve=True,
+  )]
+  assert [type(e) for e in events[:2]] == [AttachmentProgress, AttachmentProgress]
+  assert (events[1].done, events[1].total, events[1].name) == (1, 1, "notes.md")
+  assert all(isinstance(e, TextDelta) for e in events[2:]) and len(events) > 2
+
+
+def test_build_agent_passes_credentials_to_provider(monkeypatch):
+  built: list[FakeProvider] = []
+
+  def _provider_class(name):
+    class _Recording(FakeProvider):
+      def __init__(self, api_key=None, base_url=None):
+        super().__init__(api_key=api_key, base_url=base_url)
+        built.append(self)
+    return _Recording
+
+  monkeypatch.setattr(agent_module, "infer_provider_class", _provider_class)
+  monkeypatch.setattr(agent_module, "infer_model", _fake_infer_model)
+  env_before = dict(os.environ)
+  AgentManager(config=None).build_agent(  # type: ignore[arg-type]
+    {"provider": "together ai", "model": "llama", "api_key": "tk", "base_url": "https://x/v1"}
+  )
+  assert dict(os.environ) == env_before
+  assert [(p.api_key, p.base_url) for p in built] == [("tk", "https://x/v1")]
+
+
+def test_env_var_is_read_as_fallback(monkeypatch):
+  monkeypatch.setenv("GROQ_API_KEY", "from-env")
+  assert AgentManager.resolve_api_key({"provider": "groq"}) == "from-env"
+  assert AgentManager.resolve_api_key({"provider": "groq", "api_key": "stored"}) == "stored"
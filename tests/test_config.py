@@ -1,4 +1,10 @@
+import asyncio
+import threading
+
 import pytest
+
+import subconscious.config as config_module
+from subconscious.agent import AgentManager
 from subconscious.config import Config
 
 
@@ -11,3 +17,107 @@ def test_config_custom():
   config = Config(dev=True)
   assert config.dev is True
   assert "-dev" in str(config.data_dir)
+
+
+# ---------------------------------------------------------------------------
+# Encrypted keyring cache
+# ---------------------------------------------------------------------------
+
+class _CountingCipher:
+  def __init__(self, cipher):
+    self._cipher = cipher
+    self.decrypts = 0
+
+  def encrypt(self, data):
+    return self._cipher.encrypt(data)
+
+  def decrypt(self, token):
+    self.decrypts += 1
+    return self._cipher.decrypt(token)
+
+
+@pytest.fixture
+def cipher(monkeypatch):
+  counting = _CountingCipher(config_module.CIPHER)
+  monkeypatch.setattr(config_module, "CIPHER", counting)
+  return counting
+
+
+async def test_keyring_round_trip_is_decrypted_once(tmp_path, cipher):
+  writer = Config(data_dir=tmp_path)
+  writer.secrets = {"models": {"m1": {"provider": "openai"}}}
+  await writer.write_keyring()
+
+  reader = Config(data_dir=tmp_path)
+  for _ in range(20):
+    reader.read_keyring()
+    assert reader.secrets["models"]["m1"]["provider"] == "openai"
+  assert cipher.decrypts == 1
+  assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_missing_keyring_yields_defaults(tmp_path):
+  config = Config(data_dir=tmp_path)
+  config.read_keyring()
+  assert config.secrets == {"models": {}, "tools": {}, "mcp": {}, "_thread_tools": {}}
+
+
+async def test_read_keyring_returns_private_copy(tmp_path):
+  config = Config(data_dir=tmp_path)
+  config.read_keyring()
+  config.secrets["models"]["draft"] = {}
+  assert "draft" not in config.cached_secrets()["models"]
+
+
+async def test_external_change_reloads_and_notifies(tmp_path, cipher):
+  ours = Config(data_dir=tmp_path)
+  ours.secrets = {"models": {}}
+  await ours.write_keyring()
+  calls = []
+  ours.add_keyring_listener(lambda: calls.append(1))
+  ours.cached_secrets()
+
+  theirs = Config(data_dir=tmp_path)
+  theirs.secrets = {"models": {"new": {}}}
+  await theirs.write_keyring()
+
+  assert "new" in ours.cached_secrets()["models"]
+  assert calls == [1]
+
+
+async def test_write_keyring_invalidates_agent_caches(tmp_path):
+  config = Config(data_dir=tmp_path)
+  manager = AgentManager(config)
+  manager.build_agent({"provider": "ollama", "model": "llama3"})
+  assert manager._agents
+  config.read_keyring()
+  await config.write_keyring()
+  assert not manager._agents
+
+
+def test_concurrent_readers_never_see_partial_writes(tmp_path):
+  writer = Config(data_dir=tmp_path)
+  writer.secrets = {"models": {"v": 0}}
+  asyncio.run(writer.write_keyring())
+  errors: list[Exception] = []
+  done = threading.Event()
+
+  def _read():
+    reader = Config(data_dir=tmp_path)
+    while not done.is_set():
+      try:
+        assert "v" in reader.cached_secrets()["models"]
+      except Exception as exc:  # InvalidToken / JSON errors on a torn read
+        errors.append(exc)
+        return
+
+  readers = [threading.Thread(target=_read) for _ in range(4)]
+  for t in readers:
+    t.start()
+  for i in range(100):
+    writer.secrets = {"models": {"v": i, "pad": "x" * (i * 50)}}
+    asyncio.run(writer.write_keyring())
+  done.set()
+  for t in readers:
+    t.join()
+  assert errors == []
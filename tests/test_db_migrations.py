@@ -0,0 +1,111 @@
+"""
+Tests for the versioned schema migration runner (``subconscious.db.migrations``).
+"""
+
+import time
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from subconscious.config import Config
+from subconscious.db.session import Database
+from subconscious.db.migrations import SCHEMA_VERSION, migrate
+
+
+def _record_statements(engine) -> list[str]:
+  statements: list[str] = []
+
+  @event.listens_for(engine.sync_engine, "before_cursor_execute")
+  def _capture(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+
+  return statements
+
+
+async def test_fresh_database_reaches_latest_version(tmp_path):
+  db = Database(Config(data_dir=tmp_path))
+  await db.init_models()
+  async with db.get_session() as session:
+    version = await session.scalar(text("PRAGMA user_version"))
+  await db.close()
+  assert version == SCHEMA_VERSION
+
+
+async def test_migrated_database_starts_with_one_read(tmp_path):
+  db = Database(Config(data_dir=tmp_path))
+  await db.init_models()
+  await db.close()
+
+  db = Database(Config(data_dir=tmp_path))
+  statements = _record_statements(db.writer)
+  await db.init_models()
+  await db.close()
+  assert statements == ["PRAGMA user_version"]
+
+
+async def test_legacy_database_is_upgraded_and_backfilled(tmp_path):
+  """A pre-versioning DB (missing columns, NULL uuids) is brought up to date."""
+  url = f"sqlite+aiosqlite:///{tmp_path / 'subconscious.db'}"
+  legacy = create_async_engine(url)
+  async with legacy.begin() as conn:
+    await conn.execute(text(
+      "CREATE TABLE threads (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+      "workspace_id INTEGER NOT NULL, title VARCHAR, description VARCHAR, created_at DATETIME)"
+    ))
+    await conn.execute(text(
+      "CREATE TABLE messages (id INTEGER PRIMARY KEY AUTOINCREMENT, thread_id INTEGER NOT NULL, "
+      "role VARCHAR NOT NULL, content TEXT NOT NULL, created_at DATETIME)"
+    ))
+    await conn.execute(text("INSERT INTO threads (workspace_id, title) VALUES (1, 't')"))
+    await conn.execute(
+      text("INSERT INTO messages (thread_id, role, content) VALUES (1, 'user', :c)"),
+      [{"c": f"m{i}"} for i in range(25_000)],
+    )
+  await legacy.dispose()
+
+  upgraded = create_async_engine(url)
+  started = time.perf_counter()
+  assert await migrate(upgraded) == SCHEMA_VERSION
+  elapsed = time.perf_counter() - started
+  await upgraded.dispose()
+
+  check = create_async_engine(url)
+  async with check.connect() as conn:
+    cols = {row[1] for row in (await conn.execute(text("PRAGMA table_info(threads)"))).fetchall()}
+    missing = await conn.scalar(text("SELECT COUNT(*) FROM messages WHERE uuid IS NULL OR uuid = ''"))
+    distinct = await conn.scalar(text("SELECT COUNT(DISTINCT uuid) FROM messages"))
+  await check.dispose()
+
+  assert {"uuid", "updated_at", "tools_config", "approval_config"} <= cols
+  assert missing == 0
+  assert distinct == 25_000
+  assert elapsed < 10.0
+
+
+async def test_duplicate_document_rows_are_collapsed(tmp_path):
+  url = f"sqlite+aiosqlite:///{tmp_path / 'subconscious.db'}"
+  legacy = create_async_engine(url)
+  async with legacy.begin() as conn:
+    await conn.execute(text(
+      "CREATE TABLE indexed_documents (id INTEGER PRIMARY KEY AUTOINCREMENT, workspace_id INTEGER NOT NULL, "
+      "path VARCHAR NOT NULL, directory VARCHAR, size INTEGER, mtime INTEGER, content_hash VARCHAR, "
+      "chunk_count INTEGER NOT NULL, status VARCHAR NOT NULL, error TEXT, indexed_at DATETIME)"
+    ))
+    await conn.execute(
+      text("INSERT INTO indexed_documents (workspace_id, path, chunk_count, status) VALUES (1, :p, 0, 'indexed')"),
+      [{"p": "/a.md"}, {"p": "/a.md"}, {"p": "/b.md"}],
+    )
+  await legacy.dispose()
+
+  upgraded = create_async_engine(url)
+  assert await migrate(upgraded) == SCHEMA_VERSION
+  async with upgraded.connect() as conn:
+    rows = (await conn.execute(text("SELECT id, path FROM indexed_documents ORDER BY path"))).all()
+    unique = await conn.scalar(text(
+      "SELECT \"unique\" FROM pragma_index_list('indexed_documents') "
+      "WHERE name = 'ux_indexed_documents_workspace_path'"
+    ))
+  await upgraded.dispose()
+  assert [tuple(r) for r in rows] == [(2, "/a.md"), (3, "/b.md")]     # the newest row is kept
+  assert unique == 1
@@ -0,0 +1,145 @@
+"""
+Tests for the pooled, WAL-mode ``Database`` and its single-writer queue.
+
+These use a real on-disk SQLite file (WAL needs one) under ``tmp_path``.
+"""
+
+import time
+import asyncio
+
+import pytest
+from sqlalchemy import text, select, func
+
+from subconscious.config import Config
+from subconscious.db.session import Database
+from subconscious.db.models import AppState, TodoItem, WorkspaceMemory
+from subconscious.tools import EngineContext
+from subconscious.tools.memory import remember
+from subconscious.tools.todo import add_todo
+from tests.conftest import FakeRunContext
+
+
+@pytest.fixture
+async def database(tmp_path):
+  db = Database(Config(data_dir=tmp_path))
+  await db.init_models()
+  yield db
+  await db.close()
+
+
+async def test_connections_use_wal_and_pragmas(database):
+  async with database.get_session() as session:
+    mode = await session.scalar(text("PRAGMA journal_mode"))
+    sync = await session.scalar(text("PRAGMA synchronous"))
+    cache = await session.scalar(text("PRAGMA cache_size"))
+  assert mode.lower() == "wal"
+  assert sync == 1  # NORMAL
+  assert cache == -Database._CACHE_SIZE_KIB
+
+
+async def test_concurrent_writers_never_lock(database):
+  """Many concurrent write sessions are serialised instead of failing."""
+  async def write(i: int) -> None:
+    async with database.write_session() as session:
+      session.add(AppState(key=f"k{i}", value=str(i), tag="test"))
+      await asyncio.sleep(0)  # yield while holding the writer turn
+      await session.commit()
+
+  await asyncio.gather(*(write(i) for i in range(50)))
+
+  async with database.get_session() as session:
+    count = await session.scalar(
+      select(func.count()).select_from(AppState).where(AppState.tag == "test")
+    )
+  assert count == 50
+
+
+async def test_write_turns_are_exclusive(database):
+  active = 0
+  peak = 0
+
+  async def write() -> None:
+    nonlocal active, peak
+    async with database.write_session():
+      active += 1
+      peak = max(peak, active)
+      await asyncio.sleep(0.001)
+      active -= 1
+
+  await asyncio.gather(*(write() for _ in range(20)))
+  assert peak == 1
+
+
+async def test_cancelled_waiter_does_not_stall_queue(database):
+  hold = asyncio.Event()
+
+  async def holder() -> None:
+    async with database.write_session():
+      await hold.wait()
+
+  holder_task = asyncio.create_task(holder())
+  await asyncio.sleep(0.01)
+  waiter = asyncio.create_task(holder())
+  await asyncio.sleep(0.01)
+  waiter.cancel()
+  hold.set()
+  await holder_task
+
+  async with database.write_session() as session:
+    assert await session.scalar(text("SELECT 1")) == 1
+
+
+async def test_tool_writes_queue_behind_a_long_write(tmp_path, monkeypatch):
+  """Tool writes wait for the writer turn instead of hitting a locked database."""
+  monkeypatch.setattr(Database, "_BUSY_TIMEOUT_MS", 100)
+  db = Database(Config(data_dir=tmp_path))
+  await db.init_models()
+  ctx = FakeRunContext(deps=EngineContext(db=db, workspace_id=1, thread_id=0, data_dir=""))
+  holding = asyncio.Event()
+
+  async def long_write() -> None:
+    async with db.write_session() as session:
+      session.add(AppState(key="long", value="v", tag="test"))
+      await session.flush()              # takes SQLite's write lock
+      holding.set()
+      await asyncio.sleep(0.5)           # well past the busy timeout
+      await session.commit()
+
+  try:
+    writer = asyncio.create_task(long_write())
+    await holding.wait()
+    results = await asyncio.gather(
+      *(remember(ctx, f"k{i}", str(i)) for i in range(5)),
+      *(add_todo(ctx, f"todo {i}") for i in range(5)),
+    )
+    await writer
+    assert all("error" not in r for r in results[5:])
+    async with db.get_session() as session:
+      assert await session.scalar(select(func.count()).select_from(WorkspaceMemory)) == 5
+      assert await session.scalar(select(func.count()).select_from(TodoItem)) == 5
+  finally:
+    await db.close()
+
+
+async def test_close_is_fast(tmp_path):
+  db = Database(Config(data_dir=tmp_path))
+  await db.init_models()
+  async with db.write_session() as session:
+    await session.execute(text("SELECT 1"))
+  async with db.get_session() as session:
+    await session.execute(text("SELECT 1"))
+
+  started = time.perf_counter()
+  await db.close()
+  assert time.perf_counter() - started < 1.0
+
+
+async def test_unpooled_mode_still_supported(tmp_path):
+  db = Database(Config(data_dir=tmp_path), pooled=False)
+  await db.init_models()
+  async with db.write_session() as session:
+    session.add(AppState(key="k", value="v", tag="test"))
+    await session.commit()
+  async with db.get_session() as session:
+    assert await session.scalar(select(AppState.value).where(AppState.key == "k")) == "v"
+  await db.close()
@@ -0,0 +1,98 @@
+"""
+Tests for ``stream_events.coalesce_deltas``.
+"""
+
+import json
+import asyncio
+
+import pytest
+
+from subconscious.api.app import _delta_flush_settings
+from subconscious.stream_events import (
+  TextDelta, ToolCallStarted, coalesce_deltas,
+)
+
+
+async def _events(items, delay: float = 0.0):
+  for item in items:
+    if delay:
+      await asyncio.sleep(delay)
+    yield item
+
+
+async def _collect(stream) -> list:
+  return [event async for event in stream]
+
+
+async def test_consecutive_deltas_merge():
+  out = await _collect(coalesce_deltas(_events([TextDelta("a"), TextDelta("b"), TextDelta("c")])))
+  assert out == [TextDelta("abc")]
+
+
+async def test_non_text_event_flushes_first_and_keeps_order():
+  call = ToolCallStarted(tool_name="t", args={}, tool_call_id="1")
+  out = await _collect(coalesce_deltas(_events([TextDelta("a"), call, TextDelta("b")])))
+  assert out == [TextDelta("a"), call, TextDelta("b")]
+
+
+async def test_byte_threshold_flushes():
+  deltas = [TextDelta("é" * 5) for _ in range(4)]   # 10 UTF-8 bytes each
+  out = await _collect(coalesce_deltas(_events(deltas), flush_ms=10_000, flush_bytes=20))
+  assert [len(e.content) for e in out] == [10, 10]
+
+
+async def test_time_threshold_flushes_stalled_buffer():
+  released = asyncio.Event()
+
+  async def stalled():
+    yield TextDelta("first")
+    await released.wait()       # only the timer can release "first"
+    yield TextDelta("second")
+
+  stream = coalesce_deltas(stalled(), flush_ms=20)
+  first = await asyncio.wait_for(anext(stream), timeout=5)
+  assert first.content == "first"
+  released.set()
+  assert [event.content async for event in stream] == ["second"]
+
+
+async def test_zero_window_passes_through():
+  deltas = [TextDelta("a"), TextDelta("b")]
+  assert await _collect(coalesce_deltas(_events(deltas), flush_ms=0)) == deltas
+
+
+async def test_source_errors_propagate():
+  async def broken():
+    yield TextDelta("a")
+    raise ValueError("provider exploded")
+
+  with pytest.raises(ValueError, match="exploded"):
+    await _collect(coalesce_deltas(broken()))
+
+
+@pytest.mark.parametrize("params, expected", [
+  ({}, (25.0, 4096)),
+  ({"flush_ms": "0"}, (0.0, 4096)),
+  ({"flush_ms": "99999", "flush_bytes": "0"}, (1000.0, 1)),
+  ({"flush_ms": "soon", "flush_bytes": "512"}, (25.0, 512)),
+])
+def test_connection_flush_settings(params, expected):
+  assert _delta_flush_settings(params) == expected
+
+
+async def _frames(stream) -> int:
+  """Forward *stream* like the API does: one JSON frame per event."""
+  sink: list[str] = []
+  async for event in stream:
+    sink.append(json.dumps({"v": 1, "type": "chat.delta", "id": "x", "data": {"delta": event.content}}))
+  return len(sink)
+
+
+async def test_coalescing_sends_one_frame_per_flush_window():
+  tokens = 20_000
+  deltas = [TextDelta("tok ") for _ in range(tokens)]
+
+  assert await _frames(_events(deltas)) == tokens
+  # With the timer out of reach only the byte threshold flushes.
+  batched = await _frames(coalesce_deltas(_events(deltas), flush_ms=60_000, flush_bytes=4096))
+  assert batched == -(-tokens * 4 // 4096)
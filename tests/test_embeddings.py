@@ -0,0 +1,253 @@
+"""
+Tests for chunk embeddings, the memory-mapped vector index and hybrid
+(BM25 + cosine) retrieval.
+"""
+
+import os
+import math
+import struct
+
+import pytest
+from sqlalchemy import select, func
+
+from subconscious.config import Config
+from subconscious.db.session import Database
+from subconscious.events import EventBus
+from subconscious.jobs import JobManager
+from subconscious.indexing import WorkspaceIndexer
+from subconscious.db.models import DocumentChunk
+from subconscious.embeddings import (
+  FLOAT32, INT8, HashingEmbedder, blob_dtype, decode_vector, encode_vector, embedder_from_env,
+)
+from subconscious.retrieval import search_chunks, fetch_chunks, fuse, retrieve
+from subconscious.vector_index import VectorIndex, VectorStore
+
+
+@pytest.fixture
+async def db(tmp_path_factory):
+  database = Database(Config(data_dir=tmp_path_factory.mktemp("data")))
+  await database.init_models()
+  yield database
+  await database.close()
+
+
+class _FlakyEmbedder(HashingEmbedder):
+  """Fails until ``up`` is set, like an embedding server that isn't running yet."""
+
+  def __init__(self):
+    super().__init__()
+    self.up = False
+
+  async def embed(self, texts):
+    if not self.up:
+      raise ConnectionError("embedding server down")
+    return await super().embed(texts)
+
+
+def _cosine(a, b) -> float:
+  return sum(x * y for x, y in zip(a, b))
+
+
+def test_hashing_embedder_is_deterministic_and_normalised():
+  embedder = HashingEmbedder(dim=64)
+  a = embedder.embed_one("reindex the workspace directories")
+  assert a == HashingEmbedder(dim=64).embed_one("reindex the workspace directories")
+  assert math.isclose(math.sqrt(sum(x * x for x in a)), 1.0, rel_tol=1e-9)
+  close = embedder.embed_one("reindex workspace directories")
+  far = embedder.embed_one("coffee and milk")
+  assert _cosine(a, close) > _cosine(a, far)
+
+
+@pytest.mark.parametrize("dtype, size", [(FLOAT32, 1 + 4 * 64), (INT8, 1 + 4 + 64)])
+def test_blob_roundtrip(dtype, size):
+  vec = HashingEmbedder(dim=64).embed_one("local first agent")
+  blob = encode_vector(vec, dtype)
+  assert len(blob) == size and blob_dtype(blob) == dtype
+  assert _cosine(vec, decode_vector(blob)) > 0.99
+
+
+def test_embedder_from_env(monkeypatch):
+  monkeypatch.delenv("SUBCONSCIOUS_EMBEDDINGS", raising=False)
+  assert embedder_from_env() is None
+  monkeypatch.setenv("SUBCONSCIOUS_EMBEDDINGS", "hash")
+  assert isinstance(embedder_from_env(), HashingEmbedder)
+
+
+@pytest.mark.parametrize("dtype", [FLOAT32, INT8])
+def test_vector_index_file_search(tmp_path, dtype):
+  embedder = HashingEmbedder(dim=32)
+  texts = ["alpha beta", "gamma delta", "alpha gamma", "epsilon"]
+  path = tmp_path / "ws.vec"
+  VectorIndex.write(path, [(10 + i, encode_vector(embedder.embed_one(t), dtype)) for i, t in enumerate(texts)], (4, 13, 46))
+  index = VectorIndex.open(path)
+  try:
+    assert (index.count, index.dim, index.dtype) == (4, 32, dtype)
+    assert index.header["signature"] == [4, 13, 46]
+    hits = index.search(embedder.embed_one("alpha beta"), 2)
+    assert [chunk_id for chunk_id, _ in hits][0] == 10
+    assert len(hits) == 2 and hits[0][1] >= hits[1][1]
+    assert index.search([0.0] * 8, 2) == []     # wrong dimension
+  finally:
+    index.close()
+  assert VectorIndex.open(tmp_path / "missing.vec") is None
+
+
+async def test_indexer_embeds_chunks_and_store_rebuilds(db, tmp_path):
+  docs = tmp_path / "docs"
+  docs.mkdir()
+  (docs / "a.md").write_text("coffee beans are roasted\n" * 5)
+  (docs / "b.md").write_text("the indexer walks workspace directories\n" * 5)
+  store = VectorStore(db, tmp_path / "vectors")
+  changed = []
+
+  def on_change(workspace_id):
+    changed.append(workspace_id)
+    store.invalidate(workspace_id)
+
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0, embedder=HashingEmbedder(), on_change=on_change)
+  try:
+    await indexer.reindex(9400, [str(docs)])
+    assert changed == [9400]
+    index = await store.get(9400)
+    assert index is not None and index.count == 2
+    assert await store.get(9400) is index                 # cached until invalidated
+
+    (docs / "c.md").write_text("roasted coffee, brewed\n")
+    await indexer.index_paths(9400, [str(docs)], {str(docs / "c.md")})
+    rebuilt = await store.get(9400)
+    assert rebuilt is not index and rebuilt.count == 3
+    assert os.path.exists(tmp_path / "vectors" / "workspace_9400.vec")
+  finally:
+    indexer.close()
+    store.close()
+
+
+async def test_failed_embeddings_are_back_filled(db, tmp_path):
+  (tmp_path / "a.md").write_text("hello world\n")
+  embedder = _FlakyEmbedder()
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0, embedder=embedder)
+
+  async def missing() -> int:
+    async with db.get_session() as session:
+      return await session.scalar(
+        select(func.count()).select_from(DocumentChunk)
+        .where(DocumentChunk.workspace_id == 9401, DocumentChunk.embedding.is_(None))
+      )
+
+  try:
+    await indexer.reindex(9401, [str(tmp_path)])
+    assert await missing() == 1        # indexed anyway, without a vector
+    embedder.up = True
+    await indexer.reindex(9401, [str(tmp_path)])
+    assert await missing() == 0
+  finally:
+    indexer.close()
+
+
+async def test_hybrid_fusion_surfaces_semantic_only_hits(db, tmp_path):
+  docs = tmp_path / "docs"
+  docs.mkdir()
+  (docs / "fts.md").write_text("invoice totals for march\n")
+  (docs / "sem.md").write_text("quarterly invoice spreadsheet march totals summary\n")
+  (docs / "other.md").write_text("gardening notes\n")
+  embedder = HashingEmbedder()
+  store = VectorStore(db, tmp_path / "vectors")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0, embedder=embedder, on_change=store.invalidate)
+  try:
+    await indexer.reindex(9402, [str(docs)])
+    query = "invoice totals march"
+    async with db.get_session() as session:
+      lexical = await search_chunks(session, 9402, query, 1)    # BM25 alone keeps one hit
+    index = await store.get(9402)
+    semantic = index.search(embedder.embed_one(query), 2)
+    known = {hit.chunk_id for hit in lexical}
+    async with db.get_session() as session:
+      rows = await fetch_chunks(session, [c for c, _ in semantic if c not in known])
+    results = fuse(lexical, semantic, rows, 3)
+
+    assert {r.path.rsplit(os.sep, 1)[-1] for r in results} == {"fts.md", "sem.md"}
+    top = results[0]
+    assert top.bm25 is not None and top.cosine is not None   # ranked by both
+    assert [r.score for r in results] == sorted((r.score for r in results), reverse=True)
+    assert any(r.bm25 is None and r.cosine is not None for r in results)
+
+
+    hybrid = await retrieve(db, 9402, query, limit=2, embedder=embedder, vectors=store)
+    assert {r.path.rsplit(os.sep, 1)[-1] for r in hybrid} == {"fts.md", "sem.md"}
+    assert all(r.bm25 is not None and r.cosine is not None for r in hybrid)
+  finally:
+    indexer.close()
+    store.close()
+
+
+async def test_retrieve_without_building_skips_a_missing_index(db, tmp_path):
+  (tmp_path / "a.md").write_text("invoice totals for march\n")
+  embedder = _FlakyEmbedder()              # any embed call would raise and be logged
+  store = VectorStore(db, tmp_path / "vectors")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0, embedder=HashingEmbedder())
+  try:
+    await indexer.reindex(9403, [str(tmp_path)])
+    hits = await retrieve(db, 9403, "invoice", limit=2, embedder=embedder, vectors=store, build_index=False)
+    assert [h.cosine for h in hits] == [None]                 # BM25 only
+    assert store.loaded(9403) is None
+    assert not (tmp_path / "vectors").exists()                # nothing built on this path
+
+    embedder.up = True
+    assert await store.get(9403) is store.loaded(9403) is not None
+    hits = await retrieve(db, 9403, "invoice", limit=2, embedder=embedder, vectors=store, build_index=False)
+    assert hits[0].cosine is not None                         # loaded index is used
+  finally:
+    indexer.close()
+    store.close()
+
+
+async def test_switching_embedder_model_re_embeds_and_rebuilds(db, tmp_path):
+  docs = tmp_path / "docs"
+  docs.mkdir()
+  (docs / "a.md").write_text("invoice totals for march\n")
+  (docs / "b.md").write_text("gardening notes\n")
+  vectors = tmp_path / "vectors"
+
+  async def models() -> list:
+    async with db.get_session() as session:
+      return (await session.scalars(
+        select(DocumentChunk.embedding_model).where(DocumentChunk.workspace_id == 9404)
+      )).all()
+
+  old = WorkspaceIndexer(db, JobManager(EventBus()), workers=0, embedder=HashingEmbedder(dim=64))
+  store = VectorStore(db, vectors, model="hash-64")
+  try:
+    await old.reindex(9404, [str(docs)])
+    index = await store.get(9404)
+    assert (index.count, index.dim, index.model) == (2, 64, "hash-64")
+  finally:
+    old.close()
+    store.close()
+
+  # Same files, new model: the old vectors are neither indexed nor mixed in...
+  new = WorkspaceIndexer(db, JobManager(EventBus()), workers=0, embedder=HashingEmbedder(dim=32))
+  store = VectorStore(db, vectors, model="hash-32")
+  try:
+    assert await store.get(9404) is None
+    # ...and the next run re-embeds them although no file changed.
+    await new.reindex(9404, [str(docs)])
+    assert await models() == ["hash-32", "hash-32"]
+    index = await store.get(9404)
+    assert (index.count, index.dim, index.model) == (2, 32, "hash-32")
+  finally:
+    new.close()
+    store.close()
+
+
+def test_vector_blobs_and_index_files_are_little_endian(tmp_path):
+  vec = [0.6, -0.8]
+  assert encode_vector(vec, FLOAT32)[1:] == struct.pack("<2f", *vec)
+  path = tmp_path / "le.vec"
+  VectorIndex.write(path, [(7, encode_vector(vec, FLOAT32))], (1, 7, 7), "m")
+  index = VectorIndex.open(path)
+  try:
+    assert index.model == "m"
+    assert index._buf[index._ids_at:index._ids_at + 8] == struct.pack("<q", 7)
+    assert index.search(vec, 1)[0][0] == 7
+  finally:
+    index.close()
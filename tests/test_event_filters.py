@@ -0,0 +1,72 @@
+"""
+Tests for topic- and scope-filtered EventBus subscriptions.
+"""
+
+from subconscious.events import EventBus
+
+
+def _drain(queue) -> list[str]:
+  out = []
+  while not queue.empty():
+    out.append(queue.get_nowait()["type"])
+  return out
+
+
+async def test_topic_filters_match_exact_types_and_prefixes():
+  bus = EventBus()
+  everything = bus.subscribe()
+  jobs = bus.subscribe(["job.*"])
+  messages = bus.subscribe(["message.created", "thread"])   # bare "thread" means "thread.*"
+  for t in ("job.created", "job.updated", "message.created", "message.deleted", "thread.updated"):
+    await bus.publish({"type": t, "data": {}})
+
+  assert len(_drain(everything)) == 5
+  assert _drain(jobs) == ["job.created", "job.updated"]
+  assert _drain(messages) == ["message.created", "thread.updated"]
+
+
+async def test_scope_filters_drop_other_workspaces_but_pass_unscoped_events():
+  bus = EventBus()
+  queue = bus.subscribe(workspace_uuid="w1", thread_uuid="t1")
+  await bus.publish({"type": "message.created", "data": {"workspace_uuid": "w1", "thread_uuid": "t1"}})
+  await bus.publish({"type": "message.created", "data": {"workspace_uuid": "w1", "thread_uuid": "t2"}})
+  await bus.publish({"type": "thread.created", "data": {"workspace_uuid": "w2"}})
+  await bus.publish({"type": "job.updated", "data": {"id": "j"}})
+  assert _drain(queue) == ["message.created", "job.updated"]
+
+
+async def test_thread_scope_applies_to_thread_events_carrying_uuid():
+  bus = EventBus()
+  queue = bus.subscribe(thread_uuid="t1")
+  for uuid in ("t1", "t2"):
+    await bus.publish({"type": "thread.created", "data": {"uuid": uuid, "workspace_uuid": "w1"}})
+    await bus.publish({"type": "thread.updated", "data": {"uuid": uuid, "workspace_uuid": "w1"}})
+  await bus.publish({"type": "message.created", "data": {"uuid": "m1", "thread_uuid": "t1"}})
+  events = []
+  while not queue.empty():
+    events.append(queue.get_nowait())
+  assert [(e["type"], e["data"]["uuid"]) for e in events] == [
+    ("thread.created", "t1"), ("thread.updated", "t1"), ("message.created", "m1"),
+  ]
+
+
+async def test_update_subscription_and_unsubscribe_reindex():
+  bus = EventBus()
+  queue = bus.subscribe(["job.*"])
+  bus.update_subscription(queue, ["message.*"])
+  await bus.publish({"type": "job.updated", "data": {}})
+  await bus.publish({"type": "message.created", "data": {}})
+  assert _drain(queue) == ["message.created"]
+
+  bus.unsubscribe(queue)
+  assert bus._by_topic == {} and bus.subscriber_count == 0
+
+
+async def test_replay_honours_the_subscribers_filters():
+  bus = EventBus()
+  await bus.publish({"type": "thread.updated", "data": {"thread_uuid": "t1"}})
+  await bus.publish({"type": "message.created", "data": {"thread_uuid": "t2"}})
+  await bus.publish({"type": "message.created", "data": {"thread_uuid": "t1"}})
+  queue = bus.subscribe(["message.*"], thread_uuid="t1")
+  assert [e["seq"] for e in await bus.replay(0, queue)] == [3]
+  assert len(await bus.replay(0)) == 3
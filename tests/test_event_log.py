@@ -0,0 +1,142 @@
+"""
+Tests for EventBus sequencing / replay and the SQLite-backed event store.
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy import delete
+
+from subconscious.events import EventBus
+from subconscious.event_store import SQLiteEventStore
+from subconscious.db.models import AppState, EventLog
+
+
+async def _publish(bus: EventBus, *types: str) -> None:
+  for t in types:
+    await bus.publish({"type": t, "data": {}})
+
+
+async def test_events_are_sequenced_and_delivered():
+  bus = EventBus()
+  queue = bus.subscribe()
+  await _publish(bus, "a", "b", "c")
+  assert [queue.get_nowait()["seq"] for _ in range(3)] == [1, 2, 3]
+  assert bus.last_seq == 3
+
+
+async def test_replay_returns_only_the_gap():
+  bus = EventBus()
+  await _publish(bus, "a", "b", "c", "d")
+  missed = await bus.replay(2)
+  assert [(e["seq"], e["type"]) for e in missed] == [(3, "c"), (4, "d")]
+  assert await bus.replay(4) == []
+
+
+async def test_replay_past_ring_requires_resync():
+  bus = EventBus(history=3)
+  await _publish(bus, *"abcde")
+  assert [e["seq"] for e in await bus.replay(2)] == [3, 4, 5]
+  assert await bus.replay(1) is None
+  assert await bus.replay(99) is None   # seq from another (unpersisted) run
+
+
+async def test_job_events_are_sequenced_but_not_logged():
+  bus = EventBus()
+  await _publish(bus, "message.created", "job.updated", "thread.updated")
+  assert [e["type"] for e in await bus.replay(0)] == ["message.created", "thread.updated"]
+
+
+@pytest.fixture
+async def store(db):
+  async with db.write_session() as session:
+    await session.execute(delete(EventLog))
+    await session.execute(delete(AppState).where(AppState.tag == "event_log"))
+    await session.commit()
+  store = SQLiteEventStore(db, keep=5)
+  yield store
+  await store.close()
+
+
+async def test_store_survives_restart_and_continues_sequence(store, db):
+  bus = EventBus(history=2)
+  await bus.attach_store(store)
+  await _publish(bus, *"abcd")
+  await store.close(bus.last_seq)
+
+  restarted = EventBus(history=2)
+  await restarted.attach_store(SQLiteEventStore(db, keep=5))
+  assert restarted.last_seq == 4
+  await _publish(restarted, "e")
+  assert [e["type"] for e in await restarted.replay(1)] == ["b", "c", "d", "e"]
+
+
+async def test_crash_does_not_reissue_seqs_of_lost_events(store, db):
+  bus = EventBus(history=2)
+  await bus.attach_store(store)
+  await _publish(bus, "a", "b")
+  await store.flush()
+  await _publish(bus, "c", "d")     # still in the unflushed batch when the engine dies
+  seen = bus.last_seq
+  store._pending.clear()
+  store._flush_task.cancel()
+
+  restarted = EventBus(history=2)
+  await restarted.attach_store(SQLiteEventStore(db, keep=5))
+  await _publish(restarted, "e")
+  assert restarted.last_seq > seen
+  # A client that saw "b" or "d" may have missed events nobody can replay.
+  assert await restarted.replay(2) is None
+  assert await restarted.replay(seen) is None
+  assert [e["type"] for e in await restarted.replay(restarted.last_seq - 1)] == ["e"]
+
+
+async def test_seqs_are_reserved_before_they_are_handed_out(store, monkeypatch):
+  monkeypatch.setattr(EventBus, "_SEQ_BLOCK", 4)
+  reserved = [0]
+  reserve = store.reserve
+
+  async def recording_reserve(seq):
+    reserved.append(await reserve(seq))
+    return seq
+
+  monkeypatch.setattr(store, "reserve", recording_reserve)
+  bus = EventBus()
+  await bus.attach_store(store)
+  for t in "abcdefghij":
+    await _publish(bus, t)
+    assert max(reserved) >= bus.last_seq
+  assert len(reserved) < 10          # reserved in blocks, not per event
+
+
+async def test_store_prunes_beyond_retention(store):
+  bus = EventBus(history=2)
+  await bus.attach_store(store)
+  await _publish(bus, *"abcdefgh")
+  await store.flush()
+  assert await store.floor() == 3
+  assert [e["type"] for e in await bus.replay(3)] == list("defgh")
+  assert await bus.replay(2) is None
+
+
+async def test_close_waits_for_a_flush_in_progress(store, db, monkeypatch):
+  monkeypatch.setattr(SQLiteEventStore, "_FLUSH_DELAY", 0)
+  writing, release = asyncio.Event(), asyncio.Event()
+  write_session = db.write_session
+
+  @asynccontextmanager
+  async def slow_write_session():
+    writing.set()
+    await release.wait()
+    async with write_session() as session:
+      yield session
+
+  monkeypatch.setattr(db, "write_session", slow_write_session)
+  store.append({"seq": 1, "type": "a"})
+  await writing.wait()              # the batch has left _pending
+  closing = asyncio.create_task(store.close())
+  await asyncio.sleep(0.01)
+  release.set()
+  await closing
+  assert [e["type"] for e in await store.since(0)] == ["a"]
@@ -0,0 +1,122 @@
+"""
+Tests for the streaming document extractors (``subconscious.extraction``) and
+the bounded reads built on them.
+"""
+
+import os
+import asyncio
+from types import SimpleNamespace
+
+import docx
+import openpyxl
+import pytest
+
+from subconscious import extraction
+from subconscious.extraction import ExtractionCache, extract_text, iter_docx, iter_plain, iter_xlsx
+from subconscious.desktop_tools.filesystem import _read_xlsx, read_range, search_in_file
+
+
+def _workbook(path, rows: int) -> str:
+  """Write a two-sheet workbook; return the text the old whole-file reader produced."""
+  wb = openpyxl.Workbook()
+  expected = []
+  for title in ("Orders", "Refunds"):
+    ws = wb.active if title == "Orders" else wb.create_sheet(title)
+    ws.title = title
+    expected.append(f"--- Sheet: {title} ---")
+    for i in range(rows):
+      ws.append([f"{title}-{i}", i, None if i % 3 else "note"])
+      expected.append("\t".join([f"{title}-{i}", str(i), "" if i % 3 else "note"]))
+    ws.append([None, None, None])   # empty rows are skipped
+  wb.save(path)
+  return "\n".join(expected)
+
+
+def test_xlsx_streams_row_blocks(tmp_path):
+  path = tmp_path / "big.xlsx"
+  expected = _workbook(path, 1200)
+  blocks = list(iter_xlsx(path))
+  assert len(blocks) > 4
+  assert "".join(blocks) == expected == extract_text(path)
+
+
+def test_docx_and_plain_blocks_join_to_full_text(tmp_path, monkeypatch):
+  doc = docx.Document()
+  paragraphs = [f"Paragraph {i}" for i in range(450)]
+  for text in paragraphs:
+    doc.add_paragraph(text)
+  doc.save(tmp_path / "long.docx")
+  blocks = list(iter_docx(tmp_path / "long.docx"))
+  assert len(blocks) == 3 and "".join(blocks) == "\n".join(paragraphs)
+
+  monkeypatch.setattr(extraction, "_TEXT_BLOCK_CHARS", 64)
+  raw = "línea uno\r\nline two\n" * 40
+  (tmp_path / "notes.txt").write_bytes(raw.encode() + b"\xff")
+  blocks = list(iter_plain(tmp_path / "notes.txt"))
+  assert len(blocks) > 10
+  assert "".join(blocks) == (raw.encode() + b"\xff").decode("utf-8", errors="replace")
+
+
+def test_read_keeps_only_the_prefix(tmp_path):
+  path = tmp_path / "big.xlsx"
+  expected = _workbook(path, 1200)
+  text, total = _read_xlsx(path, 100)
+  assert text == expected[:100] and total == len(expected)
+
+
+def test_cache_serves_repeat_extractions(tmp_path, monkeypatch):
+  path = tmp_path / "report.xlsx"
+  expected = _workbook(path, 300)
+  cache = ExtractionCache(tmp_path / "cache", max_bytes=10_000_000)
+  assert cache.extract_text(path) == expected and (cache.hits, cache.misses) == (0, 1)
+
+  monkeypatch.setattr(extraction, "iter_xlsx", lambda p: pytest.fail("re-parsed a cached workbook"))
+  assert cache.extract_text(path) == expected and cache.hits == 1
+  # Another instance (e.g. an indexer worker process) shares the entries.
+  assert ExtractionCache(tmp_path / "cache").extract_text(path) == expected
+
+  os.utime(path, ns=(1, 1))            # changed mtime → new key → re-extracted
+  monkeypatch.undo()
+  assert cache.extract_text(path) == expected and cache.misses == 2
+
+
+def test_cache_skips_abandoned_reads_and_plain_files(tmp_path):
+  path = tmp_path / "report.xlsx"
+  _workbook(path, 1200)
+  cache = ExtractionCache(tmp_path / "cache", max_bytes=10_000_000)
+  blocks = cache.iter_text(path)
+  next(blocks)
+  blocks.close()                        # e.g. search_in_file stopping at max_results
+  assert not list((tmp_path / "cache").rglob("*.txt")) and not list((tmp_path / "cache").rglob("*.tmp"))
+
+  (tmp_path / "notes.md").write_text("plain text is read directly")
+  assert cache.extract_text(tmp_path / "notes.md") == "plain text is read directly"
+  assert (cache.hits, cache.misses) == (0, 1)
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+  cache = ExtractionCache(tmp_path / "cache", max_bytes=35_000)
+  books = []
+  for i in range(4):
+    books.append(tmp_path / f"book{i}.xlsx")
+    _workbook(books[-1], 300)           # ~10 KB of text each
+  for age, book in enumerate(books[:3]):
+    cache.extract_text(book)
+    os.utime(cache._entry(book), (1000 + age, 1000 + age))   # book0 oldest … book2 newest
+  cache.extract_text(books[0])          # hit: book0 becomes most recently used
+  cache.extract_text(books[3])          # over budget → evicts the oldest (book1)
+  total = sum(f.stat().st_size for f in (tmp_path / "cache").rglob("*.txt"))
+  assert total <= 35_000
+  assert cache._entry(books[0]).exists() and cache._entry(books[3]).exists()
+  assert not cache._entry(books[1]).exists()
+
+
+def test_read_range_and_search_use_extracted_text(tmp_path):
+  path = tmp_path / "report.xlsx"
+  _workbook(path, 50)
+  ctx = SimpleNamespace(deps=SimpleNamespace(engine=SimpleNamespace(extraction_cache=ExtractionCache(tmp_path / "cache"))))
+  found = asyncio.run(search_in_file(ctx, str(path), r"Refunds-7\t"))
+  assert "Refunds-7" in found and "Error" not in found
+  lineno = int(found.splitlines()[1].split(":")[0])
+  excerpt = asyncio.run(read_range(ctx, str(path), lineno, lineno))
+  assert excerpt.endswith("Refunds-7\t7\t")
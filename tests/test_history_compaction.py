@@ -0,0 +1,173 @@
+"""
+Tests for rolling thread summaries (`ThreadCompactor`, `Engine.compact_thread`
+and the summary policy in `_build_history`).
+"""
+
+import asyncio
+import itertools
+from datetime import datetime, timedelta
+
+from pydantic_ai.messages import ModelRequest
+
+from subconscious.engine import Engine
+from subconscious.events import EventBus
+from subconscious.jobs import JobManager, JobStatus
+from subconscious.history import (
+  HistoryPolicy, OMITTED_NOTE, SUMMARY_PREFIX, ThreadCompactor,
+)
+from subconscious.db.models import Message
+
+
+_thread_ids = itertools.count(80_000)
+
+
+async def _seed(db, count: int, content: str = "x" * 40) -> tuple[int, list[Message]]:
+  """Insert *count* alternating user/agent messages; return (thread id, rows)."""
+  thread_id = next(_thread_ids)
+  base = datetime(2026, 1, 1)
+  rows = [
+    Message(
+      thread_id=thread_id,
+      role="user" if i % 2 == 0 else "agent",
+      content=f"{i}:{content}",
+      created_at=base + timedelta(seconds=i),
+    )
+    for i in range(count)
+  ]
+  async with db.get_session() as session:
+    session.add_all(rows)
+    await session.commit()
+  return thread_id, rows
+
+
+def _key(row: Message) -> tuple[datetime, int]:
+  return (row.created_at, row.id)
+
+
+class _RecordingSummariser:
+  def __init__(self):
+    self.prompts: list[str] = []
+
+  async def __call__(self, prompt: str) -> str:
+    self.prompts.append(prompt)
+    return f"summary #{len(self.prompts)}"
+
+
+def _compactor(db) -> ThreadCompactor:
+  return ThreadCompactor(db, JobManager(EventBus()))
+
+
+async def test_compact_folds_messages_before_cursor(db):
+  thread_id, rows = await _seed(db, 10)
+  compactor = _compactor(db)
+  summarise = _RecordingSummariser()
+
+  summary = await compactor.compact(thread_id, _key(rows[6]), summarise, compactor.jobs.create("compact", "t"))
+
+  assert summary.content == "summary #1"
+  assert summary.until_message_id == rows[5].id
+  assert summary.message_count == 6
+  assert "5:" in summarise.prompts[0] and "6:" not in summarise.prompts[0]
+
+
+async def test_compact_is_incremental(db):
+  thread_id, rows = await _seed(db, 20)
+  compactor = _compactor(db)
+  summarise = _RecordingSummariser()
+  job = compactor.jobs.create("compact", "t")
+
+  await compactor.compact(thread_id, _key(rows[8]), summarise, job)
+  summary = await compactor.compact(thread_id, _key(rows[14]), summarise, job)
+
+  second = summarise.prompts[1]
+  assert "summary #1" in second
+  assert "7:" not in second and "8:" in second and "13:" in second
+  assert summary.message_count == 14
+  assert summary.until_message_id == rows[13].id
+
+
+async def test_compact_splits_large_backlogs_into_segments(db, monkeypatch):
+  monkeypatch.setattr(ThreadCompactor, "_SEGMENT_TOKENS", 50)
+  thread_id, rows = await _seed(db, 12, content="y" * 96)  # ~25 tokens each
+  compactor = _compactor(db)
+  summarise = _RecordingSummariser()
+
+  summary = await compactor.compact(thread_id, _key(rows[-1]), summarise, compactor.jobs.create("compact", "t"))
+
+  assert len(summarise.prompts) == 6
+  assert summary.message_count == 11
+
+
+async def test_pending_tokens_starts_after_checkpoint(db):
+  thread_id, rows = await _seed(db, 10, content="z" * 396)
+  compactor = _compactor(db)
+  before = await compactor.pending_tokens(thread_id, None, _key(rows[8]))
+  summary = await compactor.compact(thread_id, _key(rows[4]), _RecordingSummariser(), compactor.jobs.create("compact", "t"))
+  after = await compactor.pending_tokens(thread_id, summary, _key(rows[8]))
+  assert before > after > 0
+  assert await compactor.pending_tokens(thread_id, summary, _key(rows[4])) == 0
+
+
+def test_build_history_summary_policy():
+  engine = Engine.__new__(Engine)
+  rows = [Message(role="user", content="hi")]
+
+  summarised = engine._build_history(rows, truncated=True, policy=HistoryPolicy.SUMMARY, summary="s")
+  assert summarised[0].parts[0].content == SUMMARY_PREFIX + "s"
+
+  pending = engine._build_history(rows, truncated=True, policy=HistoryPolicy.SUMMARY)
+  assert isinstance(pending[0], ModelRequest)
+  assert pending[0].parts[0].content == OMITTED_NOTE
+
+
+class _FakeAgentManager:
+  class _Agent:
+    async def run(self, prompt):
+      return type("Result", (), {"output": "rolled up"})()
+
+  def build_agent(self, model_cfg, **_):
+    return self._Agent()
+
+
+async def test_compact_thread_runs_once_per_thread_as_job(db):
+  thread_id, rows = await _seed(db, 6)
+  engine = Engine.__new__(Engine)
+  engine.db = db
+  engine.jobs = JobManager(EventBus())
+  engine.compactor = ThreadCompactor(db, engine.jobs)
+  engine.agent_manager = _FakeAgentManager()
+  engine._compacting = set()
+
+  job_id = engine.compact_thread(thread_id, {}, _key(rows[4]))
+  assert job_id is not None
+  assert engine.compact_thread(thread_id, {}, _key(rows[4])) is None
+
+  for _ in range(100):
+    if engine.jobs.list()[0]["status"] != JobStatus.RUNNING:
+      break
+    await asyncio.sleep(0.01)
+  assert not engine._compacting
+  [job] = engine.jobs.list()
+  assert job["status"] == JobStatus.COMPLETED
+  summary = await engine.compactor.get_summary(thread_id)
+  assert summary.content == "rolled up"
+
+
+async def test_compact_thread_cancelled_before_running_can_start_again(db):
+  thread_id, rows = await _seed(db, 6)
+  engine = Engine.__new__(Engine)
+  engine.db = db
+  engine.jobs = JobManager(EventBus())
+  engine.compactor = ThreadCompactor(db, engine.jobs)
+  engine.agent_manager = _FakeAgentManager()
+  engine._compacting = set()
+
+  job_id = engine.compact_thread(thread_id, {}, _key(rows[4]))
+  assert await engine.jobs.cancel(job_id)      # before its task ever ran
+  assert not engine._compacting
+  assert engine.compact_thread(thread_id, {}, _key(rows[4])) is not None
+  for _ in range(100):
+    if engine.jobs.list()[0]["status"] != JobStatus.RUNNING:
+      break
+    await asyncio.sleep(0.01)
+  assert engine.jobs.list()[0]["status"] == JobStatus.COMPLETED
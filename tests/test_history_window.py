@@ -0,0 +1,142 @@
+"""
+Tests for the bounded chat-history window (`Engine.load_history_window`,
+`Engine._resolve_history_limits` and the omission policy in `_build_history`).
+
+These use the in-memory SQLite `db` fixture from conftest and build the Engine
+via __new__ to avoid standing up the full startup pipeline.
+"""
+
+import itertools
+from datetime import datetime, timedelta
+
+import pytest
+from pydantic_ai.messages import ModelRequest, ModelResponse
+
+from subconscious.engine import Engine
+from subconscious.history import HistoryPolicy, OMITTED_NOTE
+from subconscious.db.models import Message
+
+
+# Each test gets its own thread id in the shared session-scoped DB.
+_thread_ids = itertools.count(70_000)
+
+
+def _make_engine(db) -> Engine:
+  engine = Engine.__new__(Engine)
+  engine.db = db
+  return engine
+
+
+async def _seed(db, count: int, content: str = "x" * 40) -> int:
+  """Insert *count* alternating user/agent messages; return the thread id."""
+  thread_id = next(_thread_ids)
+  base = datetime(2026, 1, 1)
+  async with db.get_session() as session:
+    for i in range(count):
+      session.add(Message(
+        thread_id=thread_id,
+        role="user" if i % 2 == 0 else "agent",
+        content=f"{i}:{content}",
+        created_at=base + timedelta(seconds=i),
+      ))
+    await session.commit()
+  return thread_id
+
+
+def _indexes(window) -> list[int]:
+  return [int(m.content.split(":")[0]) for m in window.messages]
+
+
+async def test_unbounded_window_returns_whole_thread(db):
+  thread_id = await _seed(db, 10)
+  window = await _make_engine(db).load_history_window(thread_id)
+  assert _indexes(window) == list(range(10))
+  assert window.truncated is False
+
+
+async def test_max_messages_keeps_newest_in_order(db):
+  thread_id = await _seed(db, 300)
+  window = await _make_engine(db).load_history_window(thread_id, max_messages=20)
+  assert _indexes(window) == list(range(280, 300))
+  assert window.truncated is True
+
+
+async def test_token_budget_bounds_window(db):
+  thread_id = await _seed(db, 100, content="y" * 396)  # ~100 tokens each
+  window = await _make_engine(db).load_history_window(thread_id, token_budget=1_000)
+  assert window.tokens <= 1_000
+  assert _indexes(window) == list(range(90, 100))
+
+
+async def test_newest_message_always_included(db):
+  thread_id = await _seed(db, 3, content="z" * 4_000)
+  window = await _make_engine(db).load_history_window(thread_id, token_budget=10)
+  assert _indexes(window) == [2]
+  assert window.truncated is True
+
+
+async def test_skip_latest_excludes_just_saved_prompt(db):
+  thread_id = await _seed(db, 5)
+  window = await _make_engine(db).load_history_window(thread_id, skip_latest=1)
+  assert _indexes(window) == [0, 1, 2, 3]
+
+
+async def test_truncated_window_starts_on_user_turn(db):
+  thread_id = await _seed(db, 10)
+  window = await _make_engine(db).load_history_window(thread_id, max_messages=3)
+  assert window.messages[0].role == "user"
+  assert _indexes(window) == [8, 9]
+
+
+async def test_cursor_pages_backwards(db):
+  thread_id = await _seed(db, 200)
+  engine = _make_engine(db)
+  first = await engine.load_history_window(thread_id, max_messages=50)
+  second = await engine.load_history_window(thread_id, max_messages=50, before=first.cursor)
+  assert _indexes(second) == list(range(100, 150))
+
+
+def test_build_history_note_policy_prepends_omission_note():
+  engine = Engine.__new__(Engine)
+  rows = [Message(role="user", content="hi"), Message(role="agent", content="hello")]
+
+  noted = engine._build_history(rows, truncated=True, policy=HistoryPolicy.NOTE)
+  assert isinstance(noted[0], ModelRequest)
+  assert noted[0].parts[0].content == OMITTED_NOTE
+  assert isinstance(noted[-1], ModelResponse)
+
+  dropped = engine._build_history(rows, truncated=True, policy=HistoryPolicy.DROP)
+  assert len(dropped) == 2
+
+
+class TestResolveHistoryLimits:
+  def test_defaults(self, monkeypatch):
+    for var in ("MAX_MESSAGES", "TOKEN_BUDGET", "COMPACT_THRESHOLD", "POLICY"):
+      monkeypatch.delenv(f"SUBCONSCIOUS_HISTORY_{var}", raising=False)
+    limits = Engine.__new__(Engine)._resolve_history_limits(None)
+    assert limits == {
+      "max_messages": Engine._DEFAULT_HISTORY_MESSAGES,
+      "token_budget": Engine._DEFAULT_HISTORY_TOKENS,
+      "compact_threshold": Engine._DEFAULT_COMPACT_THRESHOLD,
+      "policy": Engine._DEFAULT_HISTORY_POLICY,
+    }
+
+  def test_model_cfg_beats_env(self, monkeypatch):
+    monkeypatch.setenv("SUBCONSCIOUS_HISTORY_TOKEN_BUDGET", "500")
+    limits = Engine.__new__(Engine)._resolve_history_limits(
+      {"history_token_budget": 900, "history_policy": "drop"}
+    )
+    assert limits["token_budget"] == 900
+    assert limits["policy"] == HistoryPolicy.DROP
+
+  @pytest.mark.parametrize("raw", ["0", "-3"])
+  def test_non_positive_disables_bound(self, monkeypatch, raw):
+    monkeypatch.setenv("SUBCONSCIOUS_HISTORY_MAX_MESSAGES", raw)
+    assert Engine.__new__(Engine)._resolve_history_limits(None)["max_messages"] is None
+
+  def test_garbage_falls_back_to_default(self, monkeypatch):
+    monkeypatch.setenv("SUBCONSCIOUS_HISTORY_MAX_MESSAGES", "lots")
+    monkeypatch.setenv("SUBCONSCIOUS_HISTORY_POLICY", "shred")
+    limits = Engine.__new__(Engine)._resolve_history_limits(None)
+    assert limits["max_messages"] == Engine._DEFAULT_HISTORY_MESSAGES
+    assert limits["policy"] == Engine._DEFAULT_HISTORY_POLICY
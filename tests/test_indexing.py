@@ -0,0 +1,470 @@
+"""
+Tests for the staged ``WorkspaceIndexer`` pipeline: threaded walk, pooled
+extraction and the batched writer.
+
+The pipeline reads and writes concurrently, so these use a real on-disk
+``Database`` (separate read pool and writer) rather than the shared
+in-memory fixture.
+"""
+
+import os
+import sys
+import time
+import asyncio
+
+import pytest
+from sqlalchemy import event, select, func
+
+from subconscious.config import Config
+from subconscious.db.session import Database
+from subconscious.events import EventBus
+from subconscious.jobs import JobManager
+from subconscious import extraction, indexing
+from subconscious.extraction import iter_text
+from subconscious.indexing import WorkspaceIndexer, _FileEntry
+from subconscious.db.models import IndexedDocument, DocumentChunk
+
+
+@pytest.fixture
+async def db(tmp_path_factory):
+  database = Database(Config(data_dir=tmp_path_factory.mktemp("data")))
+  await database.init_models()
+  yield database
+  await database.close()
+
+
+def _corpus(root, files: int = 12) -> None:
+  (root / "sub").mkdir()
+  for i in range(files):
+    folder = root / "sub" if i % 2 else root
+    (folder / f"note_{i}.md").write_text(f"# Note {i}\n" + "lorem ipsum dolor\n" * (40 * (i + 1)))
+  (root / "image.png").write_bytes(b"\x89PNG")   # not indexable
+
+
+async def _counts(db, workspace_id: int) -> tuple[int, int]:
+  async with db.get_session() as session:
+    docs = await session.scalar(select(func.count()).select_from(IndexedDocument).where(IndexedDocument.workspace_id == workspace_id))
+    chunks = await session.scalar(select(func.count()).select_from(DocumentChunk).where(DocumentChunk.workspace_id == workspace_id))
+  return docs, chunks
+
+
+def _record_statements(database: Database) -> list[str]:
+  statements: list[str] = []
+
+  def record(conn, cursor, statement, *args):
+    statements.append(statement)
+
+  for engine in {database.engine, database.writer}:
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+  return statements
+
+
+async def _run(indexer: WorkspaceIndexer, workspace_id: int, directories: list) -> str:
+  job = indexer.jobs.create("index", "test")
+  await indexer.reindex(workspace_id, directories, job)
+  return job.message
+
+
+@pytest.mark.parametrize("workers", [0, 2])
+async def test_reindex_pipeline_indexes_skips_and_prunes(db, tmp_path, workers):
+  workspace_id = 9100 + workers
+  _corpus(tmp_path)
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=workers)
+  try:
+    assert await _run(indexer, workspace_id, [str(tmp_path)]) == "Indexed 12 of 12 files"
+    docs, chunks = await _counts(db, workspace_id)
+    assert docs == 12 and chunks > 12
+
+    assert await _run(indexer, workspace_id, [str(tmp_path)]) == "Indexed 0 of 12 files"
+
+    changed = tmp_path / "note_0.md"
+    changed.write_text("short now")
+    os.utime(changed, (1, 1))
+    (tmp_path / "sub" / "note_1.md").unlink()
+    assert await _run(indexer, workspace_id, [str(tmp_path)]) == "Indexed 1 of 11 files"
+    assert (await _counts(db, workspace_id))[0] == 11
+
+    await _run(indexer, workspace_id, [])   # directory detached
+    assert await _counts(db, workspace_id) == (0, 0)
+  finally:
+    indexer.close()
+
+
+async def test_extraction_errors_are_recorded_per_file(db, tmp_path):
+  workspace_id = 9110
+  (tmp_path / "ok.txt").write_text("fine")
+  (tmp_path / "broken.pdf").write_bytes(b"not a pdf")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  assert await _run(indexer, workspace_id, [str(tmp_path)]) == "Indexed 1 of 2 files"
+  async with db.get_session() as session:
+    statuses = dict((await session.execute(
+      select(IndexedDocument.path, IndexedDocument.status).where(IndexedDocument.workspace_id == workspace_id)
+    )).all())
+  assert statuses == {str(tmp_path / "ok.txt"): "indexed", str(tmp_path / "broken.pdf"): "error"}
+
+
+async def test_loop_stays_responsive_while_indexing(db, tmp_path):
+  for i in range(40):
+    (tmp_path / f"f{i}.txt").write_text("word " * 20_000)
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=2)
+  ticks = 0
+
+  async def ticker():
+    nonlocal ticks
+    while True:
+      await asyncio.sleep(0.005)
+      ticks += 1
+
+  task = asyncio.create_task(ticker())
+  try:
+    await _run(indexer, 9120, [str(tmp_path)])
+  finally:
+    task.cancel()
+    indexer.close()
+  assert ticks > 0
+
+
+def test_worker_count_resolution(monkeypatch):
+  monkeypatch.setenv("SUBCONSCIOUS_INDEX_WORKERS", "3")
+  assert WorkspaceIndexer._resolve_workers(None) == 3
+  assert WorkspaceIndexer._resolve_workers(0) == 0
+  monkeypatch.setenv("SUBCONSCIOUS_INDEX_WORKERS", "lots")
+  assert WorkspaceIndexer._resolve_workers(None) >= 1
+
+
+def test_extraction_pool_spawns_rather_than_forks():
+  indexer = WorkspaceIndexer(None, None, workers=1)
+  try:
+    assert indexer._pool()._mp_context.get_start_method() == "spawn"
+  finally:
+    indexer.close()
+
+
+async def test_unchanged_files_are_skipped_without_being_opened(db, tmp_path, monkeypatch):
+  for i in range(5):
+    (tmp_path / f"f{i}.txt").write_text(f"file {i}")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  await _run(indexer, 9130, [str(tmp_path)])
+
+  opened: list[str] = []
+  monkeypatch.setattr("subconscious.indexing._prepare_file", lambda path, *a: opened.append(path))
+  assert await _run(indexer, 9130, [str(tmp_path)]) == "Indexed 0 of 5 files"
+  assert opened == []
+
+
+async def test_replaced_file_with_same_stat_is_hash_checked_and_inode_refreshed(db, tmp_path):
+  target = tmp_path / "a.txt"
+  target.write_text("same content")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  await _run(indexer, 9140, [str(tmp_path)])
+
+  # Replace the file (new inode) keeping content, size and mtime.
+  stat = target.stat()
+  replacement = tmp_path / "a.tmp"
+  replacement.write_text("same content")
+  os.utime(replacement, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+  os.replace(replacement, target)
+  assert target.stat().st_ino != stat.st_ino
+
+  assert await _run(indexer, 9140, [str(tmp_path)]) == "Indexed 0 of 1 files"
+  async with db.get_session() as session:
+    inode = await session.scalar(select(IndexedDocument.inode).where(IndexedDocument.workspace_id == 9140))
+  assert inode == target.stat().st_ino
+
+
+async def test_noop_reindex_reads_no_files(db, tmp_path, monkeypatch):
+  files = 2_000
+  for d in range(20):
+    folder = tmp_path / f"d{d}"
+    folder.mkdir()
+    for i in range(files // 20):
+      (folder / f"f{i}.txt").write_text(f"{d}/{i}")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  await _run(indexer, 9150, [str(tmp_path)])
+
+  opened = []
+  monkeypatch.setattr(indexing, "_prepare_file", lambda path, *args: opened.append(path))
+  monkeypatch.setattr(WorkspaceIndexer, "_hash_file", staticmethod(lambda p: opened.append(str(p))))
+  statements = _record_statements(db)
+  assert await _run(indexer, 9150, [str(tmp_path)]) == f"Indexed 0 of {files} files"
+  assert opened == []
+  assert len(statements) == 1          # the preload of known rows; no per-file lookups or writes
+
+
+async def test_chunk_writes_are_batched_per_write_batch(db):
+  docs, per_doc = 200, 20
+  text = "the quick brown fox jumps over the lazy dog\n" * 35
+  chunks = WorkspaceIndexer._chunk_text(text * (per_doc // 2))
+  corpus = [
+    (_FileEntry("/bench", f"/bench/bulk/{i}.md", len(text), 0, i), None, ("h", chunks, None), None)
+    for i in range(docs)
+  ]
+
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  statements = _record_statements(db)
+  batches = range(0, docs, 64)
+  for i in batches:
+    await indexer._write_batch(9161, corpus[i:i + 64])
+  written = [s.split(" (")[0].split(" WHERE")[0] for s in statements]
+
+  assert (await _counts(db, 9161)) == (docs, docs * len(chunks))
+  # Per batch: one document upsert, one stale-chunk delete, one chunk executemany.
+  assert written == [
+    "INSERT INTO indexed_documents", "DELETE FROM document_chunks", "INSERT INTO document_chunks",
+  ] * len(batches)
+
+
+async def test_index_paths_touches_only_given_paths(db, tmp_path):
+  (tmp_path / "docs").mkdir()
+  for name in ("a.md", "b.md", "docs/c.md", "docs/d.md"):
+    (tmp_path / name).write_text(name)
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  await _run(indexer, 9170, [str(tmp_path)])
+
+  (tmp_path / "a.md").write_text("a, edited")
+  (tmp_path / "new.md").write_text("brand new")
+  (tmp_path / "b.md").write_text("b, edited but not reported")
+  for name in ("docs/c.md", "docs/d.md"):
+    (tmp_path / name).unlink()
+  (tmp_path / "docs").rmdir()
+  touched = {str(tmp_path / "a.md"), str(tmp_path / "new.md"), str(tmp_path / "docs"), "/elsewhere/x.md"}
+  assert await indexer.index_paths(9170, [str(tmp_path)], touched) == 2
+
+  async with db.get_session() as session:
+    paths = set((await session.scalars(select(IndexedDocument.path).where(IndexedDocument.workspace_id == 9170))).all())
+  assert paths == {str(tmp_path / n) for n in ("a.md", "b.md", "new.md")}
+
+
+async def test_watcher_batch_waits_for_a_running_reindex(db, tmp_path):
+  for i in range(20):
+    (tmp_path / f"n{i:02}.md").write_text(f"note {i}\n")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  full = asyncio.create_task(_run(indexer, 9171, [str(tmp_path)]))
+  await asyncio.sleep(0)                    # the full run holds the workspace lock
+  # A watcher batch for a file the full run hasn't stored yet waits its turn,
+  # then finds the file already indexed.
+  assert await indexer.index_paths(9171, [str(tmp_path)], {str(tmp_path / "n19.md")}) == 0
+  assert full.done()
+  await full
+
+  async with db.get_session() as session:
+    rows = (await session.execute(
+      select(IndexedDocument.path, func.count()).where(IndexedDocument.workspace_id == 9171)
+      .group_by(IndexedDocument.path)
+    )).all()
+  assert len(rows) == 20 and {n for _, n in rows} == {1}
+  assert await _counts(db, 9171) == (20, 20)
+
+
+async def test_new_document_upserts_over_an_existing_row(db, tmp_path):
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  entry = _FileEntry(str(tmp_path), str(tmp_path / "a.md"), 5, 1, 1)
+  item = (entry, None, ("h", [("first", 1, 1)], None), None)
+  assert await indexer._write_batch(9172, [item]) == 1
+  # A second run that didn't know the row (doc_id None) takes it over.
+  item = (entry, None, ("h2", [("second", 1, 1), ("third", 2, 2)], None), None)
+  assert await indexer._write_batch(9172, [item]) == 1
+
+  async with db.get_session() as session:
+    (doc,) = (await session.scalars(select(IndexedDocument).where(IndexedDocument.workspace_id == 9172))).all()
+    chunks = (await session.scalars(
+      select(DocumentChunk.content).where(DocumentChunk.document_id == doc.id).order_by(DocumentChunk.ordinal)
+    )).all()
+  assert (doc.content_hash, doc.chunk_count, chunks) == ("h2", 2, ["second", "third"])
+
+
+def _assert_line_ranges(text: str, chunks: list) -> None:
+  lines = text.split("\n")
+  for content, start_line, end_line in chunks:
+    assert "\n".join(lines[start_line - 1:end_line]).strip() == content
+
+
+def test_chunk_text_splits_markdown_at_headings():
+  sections = [f"## Section {i}\n\n" + f"Paragraph text for section {i}.\n" * 25 for i in range(6)]
+  text = "# Title\n\n" + "\n".join(sections)
+  chunks = WorkspaceIndexer._chunk_text(text, ".md")
+  assert all(len(content) <= 1500 for content, _, _ in chunks)
+  assert all(content.startswith("## Section") for content, _, _ in chunks[1:])
+  _assert_line_ranges(text, chunks)
+
+
+def test_chunk_text_splits_code_at_definitions():
+  text = "import os\n\n" + "".join(
+    f"@cache\ndef handler_{i}(request):\n" + "  value = request.get('key')\n" * 12 + "\n" for i in range(12)
+  )
+  chunks = WorkspaceIndexer._chunk_text(text, ".py")
+  assert all(content.startswith("@cache\ndef handler_") for content, _, _ in chunks[1:])
+  _assert_line_ranges(text, chunks)
+
+
+def test_chunk_text_overlaps_unstructured_text():
+  text = "".join(f"line {i} of an unstructured log file\n" for i in range(400))
+  chunks = WorkspaceIndexer._chunk_text(text, ".log")
+  assert len(chunks) > 1
+  for (_, _, prev_end), (_, start, _) in zip(chunks, chunks[1:]):
+    assert start <= prev_end                     # consecutive chunks share lines
+  _assert_line_ranges(text, chunks)
+  assert WorkspaceIndexer._chunk_text("x" * 4000)[1][1] == 1    # one long line
+  assert WorkspaceIndexer._chunk_text(" \n\t\n") == []
+
+
+def _traced_lines(fn, *args) -> tuple[int, object]:
+  """Run *fn* and count the Python lines it executes (C-level scanning doesn't count)."""
+  executed = 0
+
+  def tracer(frame, event, arg):
+    nonlocal executed
+    if event == "line":
+      executed += 1
+    return tracer
+
+  previous = sys.gettrace()       # e.g. a coverage tracer
+  sys.settrace(tracer)
+  try:
+    result = fn(*args)
+  finally:
+    sys.settrace(previous)
+  return executed, result
+
+
+def test_chunk_text_does_not_scan_per_character():
+  text = "".join(
+    f"2024-05-01 12:{i % 60:02d}:00 INFO worker-{i % 8} handled request {i} in {i % 97} ms\n"
+    + ("\n" if i % 40 == 39 else "")
+    for i in range(6_000)
+  )
+  executed, chunks = _traced_lines(WorkspaceIndexer._chunk_text, text, ".log")
+  _assert_line_ranges(text, chunks)
+  assert executed < len(text) // 20     # a per-character loop runs several lines per character
+
+
+async def _stored_chunks(db, workspace_id: int) -> list:
+  async with db.get_session() as session:
+    rows = await session.execute(
+      select(DocumentChunk.ordinal, DocumentChunk.content, DocumentChunk.start_line, DocumentChunk.end_line)
+      .where(DocumentChunk.workspace_id == workspace_id).order_by(DocumentChunk.ordinal)
+    )
+    return [tuple(row) for row in rows.all()]
+
+
+async def test_large_files_are_streamed_in_batches(db, tmp_path, monkeypatch):
+  monkeypatch.setattr(indexing, "_STREAM_BYTES", 10_000)
+  monkeypatch.setattr(indexing, "_STREAM_BUFFER", 8_000)
+  monkeypatch.setattr(extraction, "_TEXT_BLOCK_CHARS", 4_000)
+  text = "".join(f"## Part {i}\n\n" + f"Body line {i} with words.\n" * 30 for i in range(60))
+  (tmp_path / "big.md").write_text(text)
+  expected = WorkspaceIndexer._chunk_text(text, ".md")
+
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  commits = []
+  insert_chunks = indexer._chunk_rows
+  monkeypatch.setattr(indexer, "_chunk_rows", lambda *a: commits.append(len(a[2])) or insert_chunks(*a))
+  try:
+    assert await _run(indexer, 9200, [str(tmp_path)]) == "Indexed 1 of 1 files"
+    assert len(commits) > 3 and sum(commits) == len(expected)     # committed batch by batch
+    stored = await _stored_chunks(db, 9200)
+    assert stored == [(i, *chunk) for i, chunk in enumerate(expected)]
+    async with db.get_session() as session:
+      doc = await session.scalar(select(IndexedDocument).where(IndexedDocument.workspace_id == 9200))
+    assert (doc.status, doc.chunk_count, doc.content_hash is not None) == ("indexed", len(expected), True)
+
+    (tmp_path / "big.md").write_text(text.replace("Part 0", "Prologue"))
+    await _run(indexer, 9200, [str(tmp_path)])
+    stored = await _stored_chunks(db, 9200)
+    assert stored[0][1].startswith("## Prologue") and len(stored) == len(expected)
+  finally:
+    indexer.close()
+
+
+async def test_streaming_failure_marks_document(db, tmp_path, monkeypatch):
+  monkeypatch.setattr(indexing, "_STREAM_BYTES", 1_000)
+  monkeypatch.setattr(indexing, "_STREAM_BUFFER", 2_000)
+
+  def broken(path):
+    yield "first page of text\n" * 400
+    raise ValueError("corrupt trailer")
+
+  monkeypatch.setattr(indexing, "iter_text", broken)
+  (tmp_path / "bad.md").write_text("x" * 5_000)
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  try:
+    assert await _run(indexer, 9201, [str(tmp_path)]) == "Indexed 0 of 1 files"
+    async with db.get_session() as session:
+      docs = (await session.scalars(select(IndexedDocument).where(IndexedDocument.workspace_id == 9201))).all()
+    assert [(d.status, d.error) for d in docs] == [("error", "corrupt trailer")]
+    assert docs[0].chunk_count > 0          # the batches before the failure were kept
+    assert docs[0].size is None             # not recorded as unchanged ...
+
+    monkeypatch.setattr(indexing, "iter_text", iter_text)
+    assert await _run(indexer, 9201, [str(tmp_path)]) == "Indexed 1 of 1 files"   # ... so it is retried
+    async with db.get_session() as session:
+      doc = await session.scalar(select(IndexedDocument).where(IndexedDocument.workspace_id == 9201))
+    assert (doc.status, doc.error) == ("indexed", None)
+  finally:
+    indexer.close()
+
+
+async def test_cancelling_mid_stream_leaves_one_row_per_file(db, tmp_path, monkeypatch):
+  monkeypatch.setattr(indexing, "_STREAM_BYTES", 1_000)
+  monkeypatch.setattr(indexing, "_STREAM_BUFFER", 2_000)
+  monkeypatch.setattr(extraction, "_TEXT_BLOCK_CHARS", 2_000)
+  iter_chunks = WorkspaceIndexer._iter_chunks
+
+  def slow_chunks(blocks, ext):
+    for batch in iter_chunks(blocks, ext):
+      time.sleep(0.02)                   # each next() runs for a while in its thread
+      yield batch
+
+  monkeypatch.setattr(WorkspaceIndexer, "_iter_chunks", staticmethod(slow_chunks))
+  (tmp_path / "big.md").write_text("".join(f"## Part {i}\n\n" + "words and more words\n" * 40 for i in range(200)))
+  (tmp_path / "small.md").write_text("# Small\n")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  try:
+    task = asyncio.create_task(indexer.reindex(9202, [str(tmp_path)]))
+    while (await _counts(db, 9202))[1] < 3:        # a few batches are in
+      await asyncio.sleep(0.005)
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+      await task                                    # the cancellation isn't swallowed
+    await asyncio.sleep(0.1)
+    async with db.get_session() as session:
+      rows = (await session.execute(
+        select(IndexedDocument.path, IndexedDocument.status).where(IndexedDocument.workspace_id == 9202)
+      )).all()
+    by_path = {}
+    for path, status in rows:
+      by_path.setdefault(os.path.basename(path), []).append(status)
+    assert by_path["big.md"] == ["indexing"]       # one partial row, redone next run
+
+    await _run(indexer, 9202, [str(tmp_path)])
+    async with db.get_session() as session:
+      rows = (await session.execute(
+        select(IndexedDocument.path, IndexedDocument.status).where(IndexedDocument.workspace_id == 9202)
+      )).all()
+    assert sorted((os.path.basename(p), s) for p, s in rows) == [("big.md", "indexed"), ("small.md", "indexed")]
+  finally:
+    indexer.close()
+
+
+def test_streaming_chunker_reads_a_bounded_window_ahead(tmp_path):
+  text = "".join(f"{i:08d} a line of a very large extracted document\n" for i in range(50_000))
+  (tmp_path / "big.log").write_text(text)
+  read = 0
+
+  def counted(blocks):
+    nonlocal read
+    for block in blocks:
+      read += len(block)
+      yield block
+
+  read_at_batch, streamed = [], []
+  for batch in WorkspaceIndexer._iter_chunks(counted(iter_text(tmp_path / "big.log")), ".log"):
+    read_at_batch.append(read)
+    streamed.extend(batch)         # a consumer that persists and drops each batch
+
+  assert streamed == WorkspaceIndexer._chunk_text(text, ".log")
+  assert len(read_at_batch) > 5
+  # Each batch is released after at most one buffer plus one block of new input,
+  # so memory stays bounded however large the document is.
+  window = indexing._STREAM_BUFFER + extraction._TEXT_BLOCK_CHARS
+  assert all(b - a <= window for a, b in zip([0, *read_at_batch], read_at_batch))
@@ -0,0 +1,226 @@
+"""
+Tests for owned background jobs: cancel, pause/resume and checkpoints that
+survive a restart (``JobManager.start`` / ``restore``), including a workspace
+re-index resuming past its checkpointed path.
+"""
+
+import asyncio
+import time
+
+import pytest
+from sqlalchemy import select, func
+
+from subconscious.config import Config
+from subconscious.db.session import Database
+from subconscious.db.models import BackgroundJob, DocumentChunk, IndexedDocument
+from subconscious.events import EventBus
+from subconscious import extraction, indexing
+from subconscious.indexing import WorkspaceIndexer
+from subconscious.jobs import JobManager, JobStatus
+
+
+@pytest.fixture
+async def db(tmp_path_factory):
+  database = Database(Config(data_dir=tmp_path_factory.mktemp("data")))
+  await database.init_models()
+  yield database
+  await database.close()
+
+
+class _Counter:
+  """A resumable runner: counts to ``params["to"]``, one step per ``step()``,
+  checkpointing after each."""
+
+  def __init__(self, jobs: JobManager):
+    self.jobs = jobs
+    self.gate = asyncio.Event()
+    self.started_from: list[int] = []
+    jobs.register("count", self)
+
+  async def __call__(self, job):
+    start = (job.checkpoint or {}).get("i", 0)
+    self.started_from.append(start)
+    for i in range(start, job.params["to"]):
+      await self.gate.wait()
+      self.gate.clear()
+      await self.jobs.checkpoint(job, i=i + 1)
+    return f"counted to {job.params['to']}"
+
+  async def step(self, n: int) -> None:
+    for _ in range(n):
+      self.gate.set()
+      while self.gate.is_set():
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.01)
+
+
+async def _rows(db) -> list:
+  async with db.get_session() as session:
+    return (await session.scalars(select(BackgroundJob))).all()
+
+
+async def test_cancel_stops_the_task_and_drops_the_row(db):
+  jobs = JobManager(EventBus(), db=db)
+  counter = _Counter(jobs)
+  job = jobs.start("count", "Counting", {"to": 10})
+  await counter.step(2)
+  assert [r.status for r in await _rows(db)] == [JobStatus.RUNNING]
+
+  assert await jobs.cancel(job.id)
+  assert job.status == JobStatus.CANCELLED and job.id not in jobs._tasks
+  assert await _rows(db) == []
+  assert not await jobs.cancel(job.id) and not jobs.resume(job.id)
+
+
+async def test_pause_survives_restart_and_resumes_from_checkpoint(db, monkeypatch):
+  monkeypatch.setattr(JobManager, "CHECKPOINT_INTERVAL", 0.0)
+  jobs = JobManager(EventBus(), db=db)
+  counter = _Counter(jobs)
+  job = jobs.start("count", "Counting", {"to": 5})
+  await counter.step(3)
+  assert await jobs.pause(job.id)
+  assert job.status == JobStatus.PAUSED
+  (row,) = await _rows(db)
+  assert (row.status, row.checkpoint) == (JobStatus.PAUSED, '{"i": 3}')
+
+  # A new process: paused jobs come back paused, with their checkpoint.
+  restarted = JobManager(EventBus(), db=db)
+  counter = _Counter(restarted)
+  assert await restarted.restore() == 1
+  (restored,) = restarted.list()
+  assert restored["status"] == JobStatus.PAUSED and restored["checkpoint"] == {"i": 3}
+  assert restarted.resume(job.id)
+  await counter.step(2)
+  await asyncio.sleep(0.01)
+  (done,) = restarted.list()
+  assert counter.started_from == [3]
+  assert (done["status"], done["message"]) == (JobStatus.COMPLETED, "counted to 5")
+  assert await _rows(db) == []
+
+
+async def test_shutdown_leaves_running_jobs_to_be_resumed(db, monkeypatch):
+  monkeypatch.setattr(JobManager, "CHECKPOINT_INTERVAL", 0.0)
+  jobs = JobManager(EventBus(), db=db)
+  counter = _Counter(jobs)
+  job = jobs.start("count", "Counting", {"to": 4})
+  await counter.step(1)
+  await jobs.close()
+  (row,) = await _rows(db)
+  assert (row.status, row.checkpoint) == (JobStatus.RUNNING, '{"i": 1}')
+
+  restarted = JobManager(EventBus(), db=db)
+  counter = _Counter(restarted)
+  await restarted.restore()
+  await asyncio.sleep(0.01)
+  assert counter.started_from == [1]      # resumed automatically
+  await restarted.close()
+
+
+async def test_ad_hoc_jobs_are_owned_but_not_persisted(db):
+  jobs = JobManager(EventBus(), db=db)
+  release = asyncio.Event()
+
+  async def run(job):
+    await release.wait()
+    return "ok"
+
+  job = jobs.start("compact", "Summarising", run=run)
+  await asyncio.sleep(0)
+  assert await jobs.pause(job.id) and job.id not in jobs._tasks
+  assert job.status == JobStatus.PAUSED and await _rows(db) == []
+  release.set()
+  assert jobs.resume(job.id)
+  await asyncio.sleep(0.01)
+  assert job.status == JobStatus.COMPLETED and job.message == "ok"
+  with pytest.raises(ValueError):
+    jobs.start("unknown", "t")
+
+  never_ran = jobs.start("compact", "Summarising", run=run)
+  assert await jobs.cancel(never_ran.id)          # cancelled before its task started
+  assert never_ran.status == JobStatus.CANCELLED and not jobs._tasks
+
+
+async def test_reindex_checkpoints_and_resumes_after_path(db, tmp_path):
+  docs = tmp_path / "docs"
+  docs.mkdir()
+  for i in range(30):
+    (docs / f"note{i:02}.md").write_text(f"note number {i}\n")
+  jobs = JobManager(EventBus(), db=db)
+  indexer = WorkspaceIndexer(db, jobs, workers=0)
+
+  async def indexed() -> int:
+    async with db.get_session() as session:
+      return await session.scalar(
+        select(func.count()).select_from(IndexedDocument).where(IndexedDocument.workspace_id == 9500)
+      )
+
+  try:
+    # Resuming a run that had persisted everything up to note14.md.
+    job = jobs.create("index", "t")
+    job.checkpoint = {"path": str(docs / "note14.md")}
+    await indexer.reindex(9500, [str(docs)], job)
+    assert await indexed() == 15 and job.current == 30
+
+    # A fresh run picks up the skipped files and checkpoints the last one.
+    job = jobs.create("index", "t")
+    await indexer.reindex(9500, [str(docs)], job)
+    assert await indexed() == 30
+    assert job.checkpoint == {"path": str(docs / "note14.md")}
+  finally:
+    indexer.close()
+
+
+async def test_pause_mid_stream_stops_indexing(db, tmp_path, monkeypatch):
+  monkeypatch.setattr(indexing, "_STREAM_BYTES", 1_000)
+  monkeypatch.setattr(indexing, "_STREAM_BUFFER", 2_000)
+  monkeypatch.setattr(extraction, "_TEXT_BLOCK_CHARS", 2_000)
+  iter_chunks = WorkspaceIndexer._iter_chunks
+
+  def slow_chunks(blocks, ext):
+    for batch in iter_chunks(blocks, ext):
+      time.sleep(0.02)
+      yield batch
+
+  monkeypatch.setattr(WorkspaceIndexer, "_iter_chunks", staticmethod(slow_chunks))
+  (tmp_path / "a.md").write_text("# A\n")
+  (tmp_path / "big.md").write_text("".join(f"## Part {i}\n\n" + "words and more words\n" * 40 for i in range(200)))
+  jobs = JobManager(EventBus(), db=db)
+  indexer = WorkspaceIndexer(db, jobs, workers=0)
+
+  async def run(job):
+    await indexer.reindex(9501, [str(tmp_path)], job)
+    return job.message
+
+  async def chunks() -> int:
+    async with db.get_session() as session:
+      return await session.scalar(
+        select(func.count()).select_from(DocumentChunk).where(DocumentChunk.workspace_id == 9501)
+      )
+
+  async def rows() -> list:
+    async with db.get_session() as session:
+      return sorted((await session.execute(
+        select(IndexedDocument.path, IndexedDocument.status).where(IndexedDocument.workspace_id == 9501)
+      )).all())
+
+  jobs.register("index", run)
+  try:
+    job = jobs.start("index", "Indexing", {"workspace_id": 9501})
+    while await chunks() < 4:
+      await asyncio.sleep(0.005)
+    assert await jobs.pause(job.id)                # returns once indexing has stopped
+    assert job.status == JobStatus.PAUSED and job.id not in jobs._tasks
+    stopped_at = await chunks()
+    await asyncio.sleep(0.1)
+    assert await chunks() == stopped_at            # nothing still running behind the pause
+    assert [s for p, s in await rows() if p.endswith("big.md")] == ["indexing"]
+    (saved,) = await _rows(db)
+    assert saved.status == JobStatus.PAUSED
+
+    assert jobs.resume(job.id)
+    while job.status == JobStatus.RUNNING:
+      await asyncio.sleep(0.01)
+    assert job.status == JobStatus.COMPLETED
+    assert [s for _, s in await rows()] == ["indexed", "indexed"]   # one row per path
+  finally:
+    indexer.close()
@@ -0,0 +1,81 @@
+"""
+Tests for rate-limited ``JobManager`` progress events.
+"""
+
+import asyncio
+
+from subconscious.events import EventBus
+from subconscious.jobs import JobManager, JobStatus
+
+
+def _drain(queue) -> list[dict]:
+  out = []
+  while not queue.empty():
+    out.append(queue.get_nowait()["data"])
+  return out
+
+
+async def test_updates_are_coalesced_and_latest_state_flushed():
+  bus = EventBus()
+  queue = bus.subscribe(["job.*"])
+  jobs = JobManager(bus, max_updates_per_sec=20)   # 50 ms window
+  job = jobs.create("index", "t", total=1000)
+  for i in range(1000):
+    jobs.update(job, current=i + 1)
+  await asyncio.sleep(0)
+  immediate = _drain(queue)
+  assert [e["current"] for e in immediate] == [0]   # create opens the first window
+
+  await asyncio.sleep(0.08)
+  trailing = _drain(queue)
+  assert [e["current"] for e in trailing] == [1000]
+
+
+async def test_terminal_states_are_always_emitted():
+  bus = EventBus()
+  queue = bus.subscribe(["job.*"])
+  jobs = JobManager(bus, max_updates_per_sec=1)
+  job = jobs.create("index", "t")
+  jobs.update(job, current=1)
+  jobs.update(job, current=2)
+  jobs.complete(job, "done")
+  await asyncio.sleep(0)
+  statuses = [e["status"] for e in _drain(queue)]
+  assert statuses[-1] == JobStatus.COMPLETED
+  assert jobs._trailing == {}
+
+
+async def test_no_subscribers_means_no_tasks():
+  bus = EventBus()
+  bus.subscribe(["message.*"])
+  jobs = JobManager(bus, max_updates_per_sec=0)   # unthrottled
+  before = len(asyncio.all_tasks())
+  job = jobs.create("index", "t")
+  for i in range(100):
+    jobs.update(job, current=i)
+  jobs.complete(job)
+  assert len(asyncio.all_tasks()) == before
+  assert bus.last_seq == 0
+
+
+async def _progress_events(jobs: JobManager, queue, files: int) -> int:
+  """Report *files* progress updates like the indexer; return the events sent."""
+  job = jobs.create("index", "bench", total=files)
+  for i in range(files):
+    jobs.update(job, current=i + 1, message=f"file_{i}.txt")
+    if i % 1000 == 0:
+      await asyncio.sleep(0)   # the indexer yields on every file's DB write
+  jobs.complete(job)
+  await asyncio.sleep(0)
+  return len(_drain(queue))
+
+
+async def test_throttling_bounds_progress_events_per_job():
+  files = 20_000
+  bus = EventBus(max_queue=files * 2)
+  queue = bus.subscribe(["job.*"])
+
+  # created + one per update + completed
+  assert await _progress_events(JobManager(bus, max_updates_per_sec=0), queue, files) == files + 2
+  # A window longer than the run: only the created and completed states go out.
+  assert await _progress_events(JobManager(bus, max_updates_per_sec=0.001), queue, files) == 2
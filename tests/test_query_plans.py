@@ -0,0 +1,239 @@
+"""
+Query-plan regression suite for the hot engine / API / tool queries.
+
+A file database is migrated to the latest schema, seeded with a realistically
+large data set, and every statement below is run through ``EXPLAIN QUERY
+PLAN``. A test fails if SQLite would answer it with a full table scan or an
+extra sort step, which is what happens when a supporting index is dropped or
+a query stops matching one.
+
+The statements in ``HOT_QUERIES`` mirror the shapes used in ``engine.py``,
+``api/app.py``, ``indexing.py`` and the workspace tools; keep them in sync when
+those queries change. ``RECORDED_QUERIES`` are captured from the real history
+and retrieval code instead, by running it against a session that records each
+statement and returns no rows.
+"""
+
+import asyncio
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+from types import SimpleNamespace
+from contextlib import asynccontextmanager
+from sqlalchemy import select
+from sqlalchemy.dialects import sqlite
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from subconscious import retrieval
+from subconscious.engine import Engine
+from subconscious.history import ThreadCompactor
+from subconscious.db.migrations import migrate
+from subconscious.db.models import (
+  Workspace, Thread, Message, AppState, TodoItem, WorkspaceMemory, Note,
+  Contact, IndexedDocument, DocumentChunk, ThreadSummary,
+)
+
+
+_WORKSPACES = 5
+_THREADS = 500
+_MESSAGES = 50_000
+
+
+@pytest.fixture(scope="module")
+def seeded_db(tmp_path_factory):
+  path = tmp_path_factory.mktemp("plans") / "subconscious.db"
+
+  async def _migrate():
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    await migrate(engine)
+    await engine.dispose()
+
+  asyncio.run(_migrate())
+
+  conn = sqlite3.connect(path)
+  now = datetime(2026, 1, 1)
+  conn.execute("INSERT INTO networks (name, uuid) VALUES ('n', 'net')")
+  conn.executemany(
+    "INSERT INTO workspaces (name, network_id, uuid) VALUES (?, 1, ?)",
+    [(f"ws{i}", f"ws-{i}") for i in range(_WORKSPACES)],
+  )
+  conn.executemany(
+    "INSERT INTO threads (workspace_id, title, uuid, updated_at, created_at) VALUES (?, ?, ?, ?, ?)",
+    [
+      (i % _WORKSPACES + 1, f"t{i}", f"th-{i}", now + timedelta(minutes=i), now)
+      for i in range(_THREADS)
+    ],
+  )
+  conn.executemany(
+    "INSERT INTO messages (thread_id, role, content, uuid, created_at) VALUES (?, ?, ?, ?, ?)",
+    [
+      (i % _THREADS + 1, "user" if i % 2 else "agent", f"message {i}", f"m-{i}", now + timedelta(seconds=i))
+      for i in range(_MESSAGES)
+    ],
+  )
+  conn.executemany(
+    "INSERT INTO app_state (key, value, tag) VALUES (?, ?, ?)",
+    [(f"key{i}", str(i), ("system", "ui_state", "other")[i % 3]) for i in range(3_000)],
+  )
+  conn.executemany(
+    "INSERT INTO workspace_memory (workspace_id, key, value) VALUES (?, ?, ?)",
+    [(i % _WORKSPACES + 1, f"k{i}", "v") for i in range(5_000)],
+  )
+  conn.executemany(
+    "INSERT INTO todo_items (workspace_id, title, status, priority) VALUES (?, ?, ?, 'normal')",
+    [(i % _WORKSPACES + 1, f"todo {i}", ("open", "done")[i % 2]) for i in range(5_000)],
+  )
+  conn.executemany(
+    "INSERT INTO notes (workspace_id, title, content, updated_at) VALUES (?, ?, '', ?)",
+    [(i % _WORKSPACES + 1, f"note {i}", now) for i in range(2_000)],
+  )
+  conn.executemany(
+    "INSERT INTO contacts (workspace_id, name) VALUES (?, ?)",
+    [(i % _WORKSPACES + 1, f"person {i}") for i in range(2_000)],
+  )
+  conn.executemany(
+    "INSERT INTO indexed_documents (workspace_id, path, chunk_count, status) VALUES (?, ?, 1, 'indexed')",
+    [(i % _WORKSPACES + 1, f"/docs/{i}.md") for i in range(5_000)],
+  )
+  conn.executemany(
+    "INSERT INTO document_chunks (document_id, workspace_id, ordinal, content) VALUES (?, ?, 0, ?)",
+    [(i + 1, i % _WORKSPACES + 1, f"chunk {i}") for i in range(5_000)],
+  )
+  conn.commit()
+  yield conn
+  conn.close()
+
+
+def _plan(conn: sqlite3.Connection, stmt, params=None) -> list[str]:
+  if params:
+    stmt = stmt.bindparams(**params)
+  sql = str(stmt.compile(dialect=sqlite.dialect(), compile_kwargs={"literal_binds": True}))
+  return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}")]
+
+
+HOT_QUERIES = {
+  # engine.load_thread_messages / GET /threads/{uuid}/messages
+  "thread_messages": select(Message).where(Message.thread_id == 7).order_by(Message.created_at),
+  # GET /workspaces/{uuid}/threads
+  "list_threads": (
+    select(Thread).where(Thread.workspace_id == 2).order_by(Thread.updated_at.desc())
+  ),
+  # history.ThreadCompactor.get_summary
+  "thread_summary": select(ThreadSummary).where(ThreadSummary.thread_id == 7),
+  "thread_by_uuid": select(Thread).where(Thread.uuid == "th-7"),
+  "workspace_by_uuid": select(Workspace).where(Workspace.uuid == "ws-2"),
+  # engine.get_setting / init_settings
+  "get_setting": select(AppState.value).where(AppState.key == "mode", AppState.tag == "system"),
+  # engine.load_ui_state
+  "load_ui_state": select(AppState).where(AppState.tag == "ui_state"),
+  # memory.recall / remember
+  "recall": select(WorkspaceMemory).where(
+    WorkspaceMemory.workspace_id == 2, WorkspaceMemory.key == "k7",
+  ),
+  "list_memories": select(WorkspaceMemory).where(WorkspaceMemory.workspace_id == 2),
+  # todo.list_todos
+  "list_todos": select(TodoItem).where(TodoItem.workspace_id == 2, TodoItem.status == "open"),
+  # notes.list_notes / save_note
+  "list_notes": select(Note).where(Note.workspace_id == 2).order_by(Note.updated_at.desc()),
+  "note_by_title": select(Note).where(Note.workspace_id == 2, Note.title == "note 7"),
+  # contacts.list_contacts
+  "list_contacts": select(Contact).where(Contact.workspace_id == 2).order_by(Contact.name),
+  # indexing._index_file existing-document lookup
+  "indexed_document": select(IndexedDocument).where(
+    IndexedDocument.workspace_id == 2, IndexedDocument.path == "/docs/7.md",
+  ),
+  "document_chunks": select(DocumentChunk).where(DocumentChunk.document_id == 7),
+}
+
+
+class _RecordingSession:
+  """ Records every statement it is asked to run and returns no rows """
+
+  def __init__(self):
+    self.statements: list = []
+
+  async def execute(self, stmt, params=None):
+    self.statements.append((stmt, params))
+    return SimpleNamespace(all=lambda: [])
+
+  async def scalars(self, stmt, params=None):
+    return await self.execute(stmt, params)
+
+  async def scalar(self, stmt, params=None):
+    self.statements.append((stmt, params))
+
+
+def _recorded(run) -> list:
+  """ The statements the coroutine ``run(session, db)`` issues """
+  session = _RecordingSession()
+
+  @asynccontextmanager
+  async def get_session():
+    yield session
+
+  asyncio.run(run(session, SimpleNamespace(get_session=get_session)))
+  return session.statements
+
+
+_CURSOR = (datetime(2026, 1, 1, 0, 10), 600)
+_SUMMARY = ThreadSummary(thread_id=7, until_created_at=datetime(2026, 1, 1, 0, 1), until_message_id=60)
+_HIT = retrieval.ChunkHit(
+  chunk_id=7, document_id=7, path="/docs/6.md", ordinal=0, start_line=1, end_line=1,
+  match_start_line=1, match_end_line=1, score=1.0, snippet="", content="chunk 6",
+)
+
+
+def _history_window(session, db):
+  # engine.load_history_window, resuming from a keyset cursor
+  return Engine.load_history_window(SimpleNamespace(db=db, _HISTORY_PAGE_SIZE=64), 7, before=_CURSOR)
+
+
+def _compactor_segment(session, db):
+  # history.ThreadCompactor._next_segment over _range, past an existing summary
+  return ThreadCompactor(db, None)._next_segment(7, _SUMMARY, _CURSOR)
+
+
+def _fts_search(session, db):
+  return retrieval.search_chunks(session, 2, "chunk 7")
+
+
+def _neighbours(session, db):
+  return retrieval.expand_neighbours(session, [_HIT], radius=2)
+
+
+def _fetch_chunks(session, db):
+  return retrieval.fetch_chunks(session, [3, 7, 11])
+
+
+RECORDED_QUERIES = {
+  name if i == 0 else f"{name}_{i}": statement
+  for name, run in {
+    "history_window": _history_window,
+    "compactor_segment": _compactor_segment,
+    "fts_search": _fts_search,
+    "expand_neighbours": _neighbours,
+    "fetch_chunks": _fetch_chunks,
+  }.items()
+  for i, statement in enumerate(_recorded(run))
+}
+
+# bm25() ranks are computed per match, so ordering by them always sorts.
+_SORT_ALLOWED = {"fts_search"}
+
+
+def _assert_indexed(name: str, plan: list[str]) -> None:
+  full_scans = [line for line in plan if line.startswith("SCAN ") and "INDEX" not in line]
+  sorts = [line for line in plan if "TEMP B-TREE" in line]
+  assert not full_scans, f"{name} does a full table scan: {plan}"
+  assert name in _SORT_ALLOWED or not sorts, f"{name} needs a temp sort: {plan}"
+
+
+@pytest.mark.parametrize("name", sorted(HOT_QUERIES))
+def test_hot_query_uses_index(seeded_db, name):
+  _assert_indexed(name, _plan(seeded_db, HOT_QUERIES[name]))
+
+
+@pytest.mark.parametrize("name", sorted(RECORDED_QUERIES))
+def test_recorded_query_uses_index(seeded_db, name):
+  _assert_indexed(name, _plan(seeded_db, *RECORDED_QUERIES[name]))
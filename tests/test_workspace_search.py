@@ -0,0 +1,228 @@
+"""
+Tests for FTS5-backed workspace retrieval (``subconscious.retrieval``).
+"""
+
+import asyncio
+
+import pytest
+from sqlalchemy import delete, event, insert, update
+
+from subconscious.db.models import IndexedDocument, DocumentChunk
+from subconscious.engine import Engine
+from subconscious.retrieval import ChunkHit, build_match_query, content_query, search_chunks, retrieve, SNIPPET_OPEN
+
+
+_WS = 9300
+
+
+@pytest.fixture
+async def corpus(db):
+  chunks = [
+    ("/proj/readme.md", 1, "Subconscious is a local-first agent.\nIt indexes workspace directories\nfor retrieval."),
+    ("/proj/indexer.py", 10, "def reindex(workspace_id):\n  walk the tree\n  extract text and chunk it"),
+    ("/proj/notes.txt", 5, "Shopping list: coffee, milk.\nRemember the quarterly report."),
+    ("/proj/other.md", 1, "Retrieval augmented generation with a local index."),
+  ]
+  async with db.write_session() as session:
+    await session.execute(delete(DocumentChunk).where(DocumentChunk.workspace_id.in_([_WS, _WS + 1])))
+    await session.execute(delete(IndexedDocument).where(IndexedDocument.workspace_id.in_([_WS, _WS + 1])))
+    for i, (path, start, content) in enumerate(chunks):
+      doc_id = (await session.execute(
+        insert(IndexedDocument).values(workspace_id=_WS, path=path, chunk_count=1, status="indexed")
+        .returning(IndexedDocument.id)
+      )).scalar_one()
+      await session.execute(insert(DocumentChunk).values(
+        document_id=doc_id, workspace_id=_WS, ordinal=0, content=content,
+        start_line=start, end_line=start + content.count("\n"),
+      ))
+    # Same text in another workspace must never leak into results.
+    await session.execute(insert(DocumentChunk).values(
+      document_id=doc_id, workspace_id=_WS + 1, ordinal=0, content="retrieval retrieval retrieval",
+    ))
+    await session.commit()
+  return db
+
+
+@pytest.mark.parametrize("query, expected", [
+  ("local index", '"local" OR "index"'),
+  ('"quarterly report" milk', '"quarterly report" OR "milk"'),
+  ("retriev*", '"retriev"*'),
+  ('NEAR(a b) OR -x', '"NEAR" OR "a" OR "b" OR "OR" OR "x"'),
+  ('  "" ** ', ""),
+])
+def test_build_match_query(query, expected):
+  assert build_match_query(query) == expected
+
+
+async def test_multi_word_query_is_ranked(corpus):
+  async with corpus.get_session() as session:
+    results = await search_chunks(session, _WS, "local retrieval index")
+  paths = [r.path for r in results]
+  assert paths[0] == "/proj/other.md"          # matches all three words
+  assert set(paths) == {"/proj/other.md", "/proj/readme.md"}
+  assert results[0].score >= results[1].score
+
+
+async def test_phrase_prefix_snippet_and_match_lines(corpus):
+  async with corpus.get_session() as session:
+    [hit] = await search_chunks(session, _WS, '"quarterly report"')
+    assert hit.path == "/proj/notes.txt"
+    assert f"{SNIPPET_OPEN}quarterly report{SNIPPET_OPEN}" in hit.snippet
+    assert (hit.match_start_line, hit.match_end_line) == (6, 6)
+
+    [hit] = await search_chunks(session, _WS, "chunk*")
+    assert hit.path == "/proj/indexer.py" and hit.match_start_line == 12
+
+
+async def test_index_follows_chunk_updates_and_deletes(corpus):
+  async with corpus.write_session() as session:
+    await session.execute(
+      update(DocumentChunk).where(DocumentChunk.workspace_id == _WS, DocumentChunk.content.like("Shopping%"))
+      .values(content="Groceries: tea")
+    )
+    await session.execute(delete(DocumentChunk).where(DocumentChunk.workspace_id == _WS, DocumentChunk.start_line == 10))
+    await session.commit()
+  async with corpus.get_session() as session:
+    assert await search_chunks(session, _WS, "milk") == []
+    assert [r.path for r in await search_chunks(session, _WS, "tea")] == ["/proj/notes.txt"]
+    assert await search_chunks(session, _WS, "reindex") == []
+
+
+async def test_retrieve_joins_documents_and_expands_neighbours(db, async_engine):
+  ws = _WS + 3
+  async with db.write_session() as session:
+    await session.execute(delete(DocumentChunk).where(DocumentChunk.workspace_id == ws))
+    doc_id = (await session.execute(
+      insert(IndexedDocument).values(workspace_id=ws, path="/proj/guide.md", chunk_count=4)
+      .returning(IndexedDocument.id)
+    )).scalar_one()
+    await session.execute(insert(DocumentChunk), [
+      {"document_id": doc_id, "workspace_id": ws, "ordinal": i, "content": text,
+       "start_line": i * 10 + 1, "end_line": i * 10 + 9}
+      for i, text in enumerate(["intro", "setup steps", "the zephyr option", "faq"])
+    ])
+    await session.commit()
+
+  statements = []
+
+  def record(conn, cursor, statement, *args):
+    statements.append(statement)
+
+  event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+  try:
+    [hit] = await retrieve(db, ws, "zephyr", limit=5, neighbours=1)
+  finally:
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+  assert len(statements) == 2          # joined search + one neighbour query, whatever the hit count
+  assert (hit.path, hit.document_id, hit.ordinal) == ("/proj/guide.md", doc_id, 2)
+  assert hit.context == "setup steps\nthe zephyr option\nfaq"
+  assert (hit.context_start_line, hit.context_end_line) == (11, 39)
+  assert (await retrieve(db, ws, "zephyr"))[0].context is None
+  assert await retrieve(db, ws, "   ") == []
+
+
+async def test_large_workspace_search_is_one_ranked_fts_query(db, async_engine):
+  ws, chunks = _WS + 2, 2_000
+  vocab = [f"term{i}" for i in range(2000)]
+  async with db.write_session() as session:
+    await session.execute(delete(DocumentChunk).where(DocumentChunk.workspace_id == ws))
+    doc_id = (await session.execute(
+      insert(IndexedDocument).values(workspace_id=ws, path="/bench.txt", chunk_count=chunks)
+      .returning(IndexedDocument.id)
+    )).scalar_one()
+    await session.execute(insert(DocumentChunk), [
+      {"document_id": doc_id, "workspace_id": ws, "ordinal": i,
+       "content": " ".join(vocab[(i * 7 + k) % len(vocab)] for k in range(60))}
+      for i in range(chunks)
+    ])
+    await session.commit()
+
+  statements = []
+
+  def record(conn, cursor, statement, *args):
+    statements.append(statement)
+
+  event.listen(async_engine.sync_engine, "before_cursor_execute", record)
+  try:
+    async with db.get_session() as session:
+      for q in ("term42 term7", '"term100 term101"', "term19*"):
+        hits = await search_chunks(session, ws, q, limit=10)
+        assert len(hits) == 10
+        assert [h.score for h in hits] == sorted((h.score for h in hits), reverse=True)
+  finally:
+    event.remove(async_engine.sync_engine, "before_cursor_execute", record)
+  # One indexed MATCH per query; never the substring-scan fallback.
+  assert len(statements) == 3
+  assert all("document_chunks_fts MATCH" in s and "LIKE" not in s for s in statements)
+
+
+def test_workspace_context_preamble():
+  hit = ChunkHit(
+    chunk_id=1, document_id=1, path="/proj/guide.md", ordinal=2, start_line=21, end_line=29,
+    match_start_line=22, match_end_line=22, score=1.0, snippet="", content="the zephyr option",
+    context="setup\nthe zephyr option\nfaq", context_start_line=11, context_end_line=39,
+  )
+  prompt = Engine._build_prompt_with_workspace_context("what is zephyr?", [hit])
+  assert "### Excerpt: /proj/guide.md (lines 11–39)" in prompt
+  assert "setup\nthe zephyr option\nfaq" in prompt and prompt.endswith("---\n\nwhat is zephyr?")
+  assert Engine._build_prompt_with_workspace_context("hi", []) == "hi"
+
+
+class _ContextEngine(Engine):
+  """Just enough of an Engine for ``_add_workspace_context``."""
+
+  def __init__(self, search):
+    self.search_workspace = search
+    self._workspace_context = True
+
+
+async def test_workspace_context_left_out_when_disabled_or_failing(monkeypatch):
+  def chunk(chunk_id, bm25):
+    return ChunkHit(
+      chunk_id=chunk_id, document_id=1, path=f"/proj/{chunk_id}.md", ordinal=0, start_line=1, end_line=1,
+      match_start_line=1, match_end_line=1, score=bm25, snippet="", content="zephyr", bm25=bm25,
+    )
+
+  strong, weak = chunk(1, 2.5), chunk(2, 0.2)
+  calls = []
+
+  async def found(workspace_id, query, **kw):
+    calls.append((query, kw))
+    return [strong, weak]
+
+  async def broken(workspace_id, query, **kw):
+    raise RuntimeError("index unavailable")
+
+  abandoned = []
+
+  async def slow(workspace_id, query, **kw):
+    try:
+      await asyncio.Event().wait()            # never answers
+    except asyncio.CancelledError:
+      abandoned.append(query)
+      raise
+
+  assert Engine._workspace_context is False                 # off unless the user opts in
+
+  engine = _ContextEngine(found)
+  prompt = await engine._add_workspace_context(1, "What does the zephyr option do?", "q")
+  assert "/proj/1.md" in prompt and "/proj/2.md" not in prompt   # weak hit dropped
+  assert calls == [("zephyr option", {"limit": 4, "neighbours": 1, "build_index": False})]
+
+  assert await engine._add_workspace_context(1, "thanks, what about the other one?", "q") == "q"
+  assert len(calls) == 1                                    # small talk: no lookup at all
+
+  engine._workspace_context = False
+  assert await engine._add_workspace_context(1, "zephyr?", "zephyr?") == "zephyr?"
+  assert len(calls) == 1                                    # not even looked up
+
+  monkeypatch.setattr(Engine, "_WORKSPACE_CONTEXT_TIMEOUT", 0.05)
+  for search in (broken, slow):
+    engine = _ContextEngine(search)
+    assert await engine._add_workspace_context(1, "zephyr?", "zephyr?") == "zephyr?"
+  assert abandoned == ["zephyr"]                            # the timeout gave up on it
+
+
+def test_content_query_keeps_only_content_words():
+  assert content_query("Thanks, what about the other one?") == ""
+  assert content_query("How do I configure the Zephyr option? zephyr!") == "configure zephyr option"
@@ -0,0 +1,112 @@
+"""
+Tests for ``WorkspaceWatcher``: native and polling watch modes feeding
+debounced changes into the indexer.
+"""
+
+import time
+import asyncio
+
+import pytest
+from sqlalchemy import select
+
+from subconscious.config import Config
+from subconscious.db.session import Database
+from subconscious.db.models import IndexedDocument
+from subconscious.events import EventBus
+from subconscious.jobs import JobManager, JobStatus
+from subconscious.indexing import WorkspaceIndexer
+from subconscious import watcher as watcher_module
+from subconscious.watcher import WorkspaceWatcher
+
+
+pytest.importorskip("watchfiles")
+
+
+@pytest.fixture
+async def db(tmp_path_factory):
+  database = Database(Config(data_dir=tmp_path_factory.mktemp("data")))
+  await database.init_models()
+  yield database
+  await database.close()
+
+
+async def _indexed(db, workspace_id: int) -> set[str]:
+  async with db.get_session() as session:
+    rows = await session.scalars(select(IndexedDocument.path).where(IndexedDocument.workspace_id == workspace_id))
+    return set(rows.all())
+
+
+async def _until(predicate, timeout: float = 8.0) -> None:
+  deadline = time.monotonic() + timeout
+  while not await predicate():
+    assert time.monotonic() < deadline, "timed out waiting for the watcher"
+    await asyncio.sleep(0.05)
+
+
+@pytest.mark.parametrize("force_polling", [False, True])
+async def test_watcher_indexes_changes_and_prunes_deletions(db, tmp_path, force_polling):
+  workspace_id = 9200 + force_polling
+  (tmp_path / "keep.md").write_text("already here")
+  indexer = WorkspaceIndexer(db, JobManager(EventBus()), workers=0)
+  await indexer.reindex(workspace_id, [str(tmp_path)])
+  watcher = WorkspaceWatcher(indexer, debounce_ms=100, force_polling=force_polling)
+  watcher.watch(workspace_id, [str(tmp_path)])
+  try:
+    await asyncio.sleep(0.3)   # let the watcher start
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "sub" / "new.md").write_text("fresh")
+    await _until(lambda: _contains(db, workspace_id, tmp_path / "sub" / "new.md"))
+
+    (tmp_path / "keep.md").unlink()
+    await _until(lambda: _lacks(db, workspace_id, tmp_path / "keep.md"))
+  finally:
+    await watcher.close()
+  assert not watcher.is_watching(workspace_id)
+
+
+async def _contains(db, workspace_id, path) -> bool:
+  return str(path) in await _indexed(db, workspace_id)
+
+
+async def _lacks(db, workspace_id, path) -> bool:
+  return str(path) not in await _indexed(db, workspace_id)
+
+
+async def test_rescan_fallback_runs_as_index_jobs(db, tmp_path, monkeypatch):
+  monkeypatch.setattr(watcher_module, "watchfiles", None)
+  monkeypatch.setattr(WorkspaceWatcher, "_RESCAN_INTERVAL", 0.05)
+  (tmp_path / "a.md").write_text("hello")
+  jobs = JobManager(EventBus())
+  indexer = WorkspaceIndexer(db, jobs, workers=0)
+  held = asyncio.Event()
+
+  async def user_reindex(job):
+    await held.wait()
+    return "done"
+
+  # While a re-index of the workspace is unfinished, passes are skipped.
+  user = jobs.start("index", "Indexing", {"workspace_id": 9203}, run=user_reindex)
+  watcher = WorkspaceWatcher(indexer)
+  watcher.watch(9203, [str(tmp_path)])
+  try:
+    await asyncio.sleep(0.2)
+    assert [j["id"] for j in jobs.list()] == [user.id]
+    held.set()
+    await _until(lambda: _contains(db, 9203, tmp_path / "a.md"))
+    rescans = [j for j in jobs.list() if j["id"] != user.id]
+    assert rescans and all(j["type"] == "index" for j in rescans)
+  finally:
+    await watcher.close()
+    await _until(_no_running(jobs))
+
+
+def _no_running(jobs):
+  async def check() -> bool:
+    return all(j["status"] != JobStatus.RUNNING for j in jobs.list())
+  return check
+
+
+def test_debounce_resolution(monkeypatch):
+  monkeypatch.setenv("SUBCONSCIOUS_WATCH_DEBOUNCE_MS", "250")
+  assert WorkspaceWatcher(None).debounce_ms == 250
+  assert WorkspaceWatcher(None, debounce_ms=10).debounce_ms == 10